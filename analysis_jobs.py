@@ -0,0 +1,301 @@
+import os
+import json
+import sqlite3
+import secrets
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import streamlit as st
+
+from media_store import STORE_ROOT, current_session_id
+from analysis_runner import analyze_media, merge_results
+from model_pool import MODEL_MEMORY_BUDGET, set_model_budget
+
+# Analysis runs as jobs in a process pool. Job state and per-file results live in
+# <STORE_ROOT>/jobs.db, so a run outlives page navigation, browser refreshes and reruns.
+JOBS_PATH = os.path.join(STORE_ROOT, 'jobs.db')
+JOB_WORKERS = int(os.environ.get('FLYSCOPE_JOB_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+POLL_INTERVAL = 1.0
+# Each worker and the server (which runs live feeds) keep their own model pool, so the
+# node-wide model memory budget is split between them
+PROCESS_MODEL_BUDGET = MODEL_MEMORY_BUDGET // (JOB_WORKERS + 1)
+set_model_budget(PROCESS_MODEL_BUDGET)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_executor_lock = threading.Lock()
+_executor = None
+_recovered = False
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def get_conn():
+    conn = sqlite3.connect(JOBS_PATH, check_same_thread=False, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_jobs():
+    os.makedirs(STORE_ROOT, exist_ok=True)
+    conn = get_conn()
+    cur = conn.cursor()
+    # Workers write while the UI polls; WAL keeps readers from blocking them
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0,
+            current TEXT,
+            settings TEXT NOT NULL,
+            stats TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        );
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_results (
+            job_id TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            result TEXT NOT NULL,
+            PRIMARY KEY (job_id, idx)
+        );
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        # NumPy scalars
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serialisable")
+
+
+def _decode_result(text: str) -> Dict:
+    result = json.loads(text)
+    if isinstance(result.get('analysis_time'), str):
+        result['analysis_time'] = datetime.fromisoformat(result['analysis_time'])
+    return result
+
+
+def _update(job_id: str, **fields):
+    conn = get_conn()
+    assignments = ", ".join(f"{key} = ?" for key in fields)
+    conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+    conn.commit()
+    conn.close()
+
+
+def _run_job(job_id: str, file_infos: List[Dict], settings: Dict):
+    """Worker-process entry point"""
+    conn = get_conn()
+
+    def on_result(index, result):
+        conn.execute(
+            "INSERT OR REPLACE INTO job_results (job_id, idx, result) VALUES (?, ?, ?)",
+            (job_id, index, json.dumps(result, default=_encode)),
+        )
+        conn.commit()
+
+    def on_progress(done, total, name):
+        status = conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()['status']
+        if status == CANCELLED:
+            raise JobCancelled()
+        conn.execute("UPDATE jobs SET done = ?, current = ? WHERE job_id = ?", (done, name, job_id))
+        conn.commit()
+
+    try:
+        if get_job(job_id)['status'] == CANCELLED:
+            # Cancelled while still waiting for a free worker
+            raise JobCancelled()
+        _update(job_id, status=RUNNING, started_at=datetime.utcnow().isoformat())
+        _, stats = analyze_media(file_infos, settings, on_progress, on_result)
+        _update(job_id, status=DONE, stats=json.dumps(stats, default=_encode), finished_at=datetime.utcnow().isoformat())
+    except JobCancelled:
+        _update(job_id, finished_at=datetime.utcnow().isoformat())
+    except Exception as e:
+        _update(job_id, status=FAILED, error=str(e), finished_at=datetime.utcnow().isoformat())
+    finally:
+        conn.close()
+
+
+def _on_done(job_id: str, executor: ProcessPoolExecutor, future):
+    # The worker records its own outcome; this only catches a worker process that died
+    if future.cancelled():
+        # Still queued when a dead worker's pool was shut down; it never started
+        if get_job(job_id)['status'] not in FINISHED:
+            _update(job_id, status=FAILED, error="Analysis workers restarted", finished_at=datetime.utcnow().isoformat())
+        return
+    error = future.exception()
+    if error is not None:
+        _update(job_id, status=FAILED, error=str(error) or type(error).__name__, finished_at=datetime.utcnow().isoformat())
+        if isinstance(error, BrokenProcessPool):
+            _discard_executor(executor)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Process-wide pool; jobs left unfinished by a previous server process are marked failed"""
+    global _executor, _recovered
+    with _executor_lock:
+        if _executor is None:
+            if not _recovered:
+                conn = get_conn()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ? WHERE status IN (?, ?)",
+                    (FAILED, "Interrupted by a server restart", QUEUED, RUNNING),
+                )
+                conn.commit()
+                conn.close()
+                _recovered = True
+            # Spawned workers do not inherit the Streamlit server's threads and locks
+            _executor = ProcessPoolExecutor(
+                max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                initializer=set_model_budget, initargs=(PROCESS_MODEL_BUDGET,),
+            )
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """Drop a pool whose worker died, so the next submit starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_job(file_infos: Sequence[Dict], settings: Dict, session_id: str) -> str:
+    # Started before the job row exists, so restart recovery cannot mark this job failed
+    get_executor()
+    job_id = secrets.token_hex(8)
+    conn = get_conn()
+    conn.execute(
+        "INSERT INTO jobs (job_id, session_id, status, total, settings, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (job_id, session_id, QUEUED, len(file_infos), json.dumps(settings), datetime.utcnow().isoformat()),
+    )
+    conn.commit()
+    conn.close()
+    payload = [dict(f) for f in file_infos]
+    for attempt in range(2):
+        executor = get_executor()
+        try:
+            future = executor.submit(_run_job, job_id, payload, settings)
+        except BrokenProcessPool as e:
+            # A worker died since the last job; retry once on a fresh pool
+            _discard_executor(executor)
+            if attempt:
+                _update(job_id, status=FAILED, error=f"Analysis workers unavailable: {e}",
+                        finished_at=datetime.utcnow().isoformat())
+                return job_id
+            continue
+        future.add_done_callback(lambda f, executor=executor: _on_done(job_id, executor, f))
+        return job_id
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    conn = get_conn()
+    row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    job = dict(row)
+    job['settings'] = json.loads(job['settings'])
+    job['stats'] = json.loads(job['stats']) if job['stats'] else None
+    return job
+
+
+def job_results(job_id: str) -> List[Dict]:
+    """Per-file results recorded so far, in input order"""
+    conn = get_conn()
+    rows = conn.execute("SELECT result FROM job_results WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+    conn.close()
+    return [_decode_result(row['result']) for row in rows]
+
+
+def cancel_job(job_id: str):
+    conn = get_conn()
+    conn.execute("UPDATE jobs SET status = ? WHERE job_id = ? AND status IN (?, ?)", (CANCELLED, job_id, QUEUED, RUNNING))
+    conn.commit()
+    conn.close()
+
+
+init_jobs()
+
+
+# Streamlit helpers
+
+def start_analysis_job(file_infos: Sequence[Dict], settings: Dict) -> str:
+    """Submit a job for this session; its ID also goes into the URL so a refresh can reattach"""
+    job_id = submit_job(file_infos, settings, current_session_id())
+    st.session_state.analysis_job = job_id
+    st.query_params['job'] = job_id
+    return job_id
+
+
+def active_job_id() -> Optional[str]:
+    """This session's job; a job ID from the URL is only taken up if this session submitted it
+
+    The store session survives a refresh through the URL too (see current_session_id), so
+    a reloaded page reattaches to the job it started.
+    """
+    job_id = st.session_state.get('analysis_job')
+    if job_id:
+        return job_id
+    job_id = st.query_params.get('job')
+    if not job_id:
+        return None
+    job = get_job(job_id)
+    if job is None or job['session_id'] != current_session_id():
+        st.query_params.pop('job', None)
+        return None
+    st.session_state.analysis_job = job_id
+    return job_id
+
+
+def collect_finished_job() -> Optional[Dict]:
+    """Merge a finished job's results into analysis_results exactly once; returns the job when collected
+
+    A file analysed again replaces its earlier result, so re-running never duplicates entries.
+    """
+    job_id = active_job_id()
+    if not job_id:
+        return None
+    job = get_job(job_id)
+    if job is None:
+        st.session_state.pop('analysis_job', None)
+        st.query_params.pop('job', None)
+        return None
+    if job['status'] not in FINISHED:
+        return None
+    if 'analysis_results' not in st.session_state:
+        st.session_state.analysis_results = []
+    # A cancelled job keeps whatever files it finished
+    job['results'] = job_results(job_id)
+    st.session_state.analysis_results = merge_results(st.session_state.analysis_results, job['results'])
+    st.session_state.pop('analysis_job', None)
+    st.query_params.pop('job', None)
+    st.session_state.last_analysis_job = job
+    return job
@@ -0,0 +1,75 @@
+from typing import Dict, Sequence
+
+from inference_engine import AUG_HFLIP, AUG_VFLIP
+
+# What each Analysis Mode actually runs. Quick Scan trades resolution for speed, Detailed
+# runs every model at its native input from a full-quality decode, Comprehensive slides
+# every model over the full-resolution image and averages flipped views of each window.
+# The first two put the image-level gate (gating.py) in front of the models; Comprehensive
+# runs every model on everything.
+QUICK_SCAN = "Quick Scan"
+DETAILED = "Detailed Analysis"
+COMPREHENSIVE = "Comprehensive Report"
+DEFAULT_MODE = DETAILED
+
+ANALYSIS_PLANS = {
+    QUICK_SCAN: {
+        'description': "Single pass at half the model input size on a reduced JPEG decode",
+        'input_scale': 0.5,
+        'draft_decode': True,
+        'tiling': 'none',
+        'augmentations': (),
+        'gating': True,
+        'latency_budget_ms': 50,
+    },
+    DETAILED: {
+        'description': "Single pass at each model's native input size from a full-resolution decode; "
+                       "models chosen under Tiled Inference run tile by tile",
+        'input_scale': 1.0,
+        'draft_decode': False,
+        'tiling': 'selected',
+        'augmentations': (),
+        'gating': True,
+        'latency_budget_ms': 250,
+    },
+    COMPREHENSIVE: {
+        'description': "Every model runs tile by tile at full resolution with flip test-time augmentation",
+        'input_scale': 1.0,
+        'draft_decode': False,
+        'tiling': 'all',
+        'augmentations': (AUG_HFLIP, AUG_VFLIP),
+        # Every model sees every image, however unlikely a hit
+        'gating': False,
+        'latency_budget_ms': 2000,
+    },
+}
+
+
+def resolve_plan(settings: Dict) -> Dict:
+    """The execution plan for a settings dict: its mode's plan with tiled models and latency budget filled in"""
+    mode = settings.get('mode', DEFAULT_MODE)
+    plan = dict(ANALYSIS_PLANS.get(mode, ANALYSIS_PLANS[DEFAULT_MODE]))
+    plan['mode'] = mode if mode in ANALYSIS_PLANS else DEFAULT_MODE
+    models: Sequence[str] = settings.get('models', ())
+    if plan['tiling'] == 'all':
+        plan['tiled_models'] = list(models)
+    elif plan['tiling'] == 'selected':
+        plan['tiled_models'] = [m for m in settings.get('tiling', {}).get('models', ()) if m in models]
+    else:
+        plan['tiled_models'] = []
+    if settings.get('latency_budget_ms'):
+        plan['latency_budget_ms'] = float(settings['latency_budget_ms'])
+    return plan
+
+
+def format_latency_stats(stats: Dict) -> str:
+    """'38 ms/image mean, 61 ms p95 against a 50 ms budget (92% within)'"""
+    latency = stats.get('latency')
+    if not latency or not latency.get('images'):
+        return ""
+    text = f"{latency['mean_ms']:.0f} ms/image mean, {latency['p95_ms']:.0f} ms p95"
+    if latency.get('budget_ms'):
+        text += f" against a {latency['budget_ms']:.0f} ms budget ({latency['within_budget'] * 100:.0f}% within)"
+    if latency.get('augmentations_dropped_after'):
+        text += f"; test-time augmentation dropped after {latency['augmentations_dropped_after']} image(s) to stay in budget"
+    return text
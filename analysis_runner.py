@@ -0,0 +1,407 @@
+import json
+import time
+import hashlib
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image
+import streamlit as st
+
+from exif_meta import geo_from_meta
+from tiled_reader import open_raster, is_large_raster, tile_origins
+from detectors import model_version
+from postprocess import NMS_IOU, fuse_frames, merge_seams
+from inference_engine import (
+    InferenceEngine, DEFAULT_BATCH_SIZE, DEFAULT_TILE_SIZE, DEFAULT_TILE_OVERLAP, CV2_AVAILABLE, STAGE_DECODE,
+    SEAM_MERGE_OVERLAP, scale_boxes, offset_boxes, combine_stats,
+)
+from analysis_plans import DEFAULT_MODE, QUICK_SCAN, resolve_plan
+from defect_tracker import DefectTracker
+from thumbnails import save_crop
+from model_pool import model_pool
+from near_duplicates import DEFAULT_HAMMING, cluster_near_duplicates
+from result_cache import CacheKey, cache_key, lookup, store
+
+if CV2_AVAILABLE:
+    import cv2
+    from video_engine import VideoAnalysisEngine, SAMPLING_STRIDE, SAMPLING_SCENE
+
+# Analysis of a set of media items, independent of the page that triggers it. Plain images
+# from every file share batches; rasters are batched tile by tile; videos keyframe by keyframe.
+
+ProgressFn = Callable[[int, int, str], None]
+ResultFn = Callable[[int, Dict], None]
+
+
+def new_result(file_info: Dict) -> Dict:
+    return {
+        'file_name': file_info['name'],
+        'file_path': file_info['path'],
+        'sha256': file_info.get('sha256'),
+        'geo': geo_from_meta(file_info),
+        'analysis_time': datetime.now(),
+        'detections': []
+    }
+
+
+def load_image(path: str, max_side: int = 0) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """Decode once, as small as the largest model input allows; returns (rgb, original (w, h))"""
+    with Image.open(path) as img:
+        size = img.size
+        if max_side:
+            # JPEG draft mode decodes at 1/2..1/8 scale, never below the requested size
+            img.draft('RGB', (max_side, max_side))
+        return np.asarray(img.convert('RGB')), size
+
+
+def _is_video(file_info: Dict) -> bool:
+    return not str(file_info.get('type', '')).startswith('image')
+
+
+def analyze_large_raster(engine: InferenceEngine, file_info: Dict) -> List[Dict]:
+    """Batch the tiles of a large raster through the models and map boxes back to image coordinates
+
+    Tiles overlap by the configured tiling overlap, and boxes cut by a seam are merged afterwards.
+    """
+    detections = []
+    with open_raster(file_info['path']) as reader:
+        tiles = (((x, y), tile) for x, y, tile in reader.iter_tiles(engine.tile_size, engine.tile_overlap))
+        for (x, y), tile_detections in engine.run(tiles):
+            offset_boxes(tile_detections, x, y)
+            detections.extend(tile_detections)
+        origins = tile_origins(reader.width, reader.height, engine.tile_size, engine.tile_overlap)
+    return merge_seams(detections, origins, engine.tile_size, SEAM_MERGE_OVERLAP)
+
+
+def analyze_video(engine: InferenceEngine, file_info: Dict, sampling: Dict) -> Dict:
+    """Decode a video on a background thread and detect defects on its keyframes
+
+    Unless tracking is switched off, each defect is reported once as a track, with its
+    best-frame crop written next to the video's thumbnails.
+    """
+    video_engine = VideoAnalysisEngine(
+        mode=SAMPLING_SCENE if sampling.get('mode') == 'scene' else SAMPLING_STRIDE,
+        stride=sampling.get('stride', 30),
+        scene_threshold=sampling.get('scene_threshold', 0.25)
+    )
+    tracker = None
+    if sampling.get('track', True):
+        def on_track(track, crop):
+            if crop is not None and crop.size and file_info.get('sha256'):
+                track['crop_path'] = save_crop(file_info['sha256'], track['track_id'], crop[:, :, ::-1])
+
+        tracker = DefectTracker(on_track=on_track)
+    return video_engine.run(
+        file_info['path'],
+        lambda frames: engine.infer([cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]),
+        tracker=tracker,
+        batch_size=engine.batch_size,
+    )
+
+
+def analysis_variant(settings: Dict, model: str, video: bool = False, raster: bool = False) -> str:
+    """The analysis mode plus every setting besides threshold and sensitivity that changes a model's output"""
+    plan = resolve_plan(settings)
+    tiling = settings.get('tiling', {})
+    postprocessing = settings.get('postprocessing', {})
+    parts = [plan['mode']]
+    # Large rasters are always read in tiles, whatever the plan does for other images
+    if raster or model in plan['tiled_models']:
+        parts.append(f"tiles {tiling.get('tile_size', DEFAULT_TILE_SIZE)}/{tiling.get('overlap', DEFAULT_TILE_OVERLAP)}")
+    parts.append(f"nms {postprocessing.get('nms_iou', NMS_IOU)}")
+    if video:
+        parts.append("video " + json.dumps(settings.get('video_sampling', {}), sort_keys=True))
+    return "; ".join(parts)
+
+
+def analysis_signature(settings: Dict) -> str:
+    """Identifies everything that shapes a run's results; a result whose signature differs is stale"""
+    plan = resolve_plan(settings)
+    relevant = {
+        'models': sorted(settings['models']),
+        'versions': {model: model_version(model) for model in settings['models']},
+        'confidence_threshold': round(float(settings.get('confidence_threshold', 0.7)), 4),
+        'sensitivity': settings.get('sensitivity', 'Medium'),
+        'mode': plan['mode'],
+        'tiled_models': sorted(plan['tiled_models']),
+        'tiling': settings.get('tiling', {}) if plan['tiled_models'] else {},
+        'postprocessing': settings.get('postprocessing', {}),
+        'video_sampling': settings.get('video_sampling', {}),
+        'near_duplicates': near_duplicate_settings(settings),
+    }
+    relevant['tiling'] = {k: v for k, v in relevant['tiling'].items() if k != 'models'}
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def near_duplicate_settings(settings: Dict) -> Dict:
+    """{} when near-duplicate frames are analysed individually"""
+    near_duplicates = settings.get('near_duplicates', {})
+    if not near_duplicates.get('enabled'):
+        return {}
+    return {'threshold': int(near_duplicates.get('threshold', DEFAULT_HAMMING))}
+
+
+def link_duplicate(result: Dict, representative: Dict, distance: int):
+    """Give a near-duplicate frame its cluster representative's detections"""
+    result['detections'] = [dict(det) for det in representative['detections']]
+    result['duplicate_of'] = representative['file_name']
+    result['duplicate_sha256'] = representative.get('sha256')
+    result['duplicate_distance'] = distance
+    if 'error' in representative:
+        result['error'] = representative['error']
+    if representative.get('degraded'):
+        result['degraded'] = True
+
+
+def result_keys(file_info: Dict, settings: Dict) -> Dict[str, CacheKey]:
+    """Cache key per selected model for one file; files without a content hash are never cached"""
+    if not file_info.get('sha256'):
+        return {}
+    video = _is_video(file_info)
+    raster = is_large_raster(file_info.get('header'))
+    return {
+        model: cache_key(
+            file_info['sha256'], model, model_version(model),
+            settings.get('confidence_threshold', 0.7), settings.get('sensitivity', 'Medium'),
+            analysis_variant(settings, model, video, raster),
+        )
+        for model in settings['models']
+    }
+
+
+def build_engine(settings: Dict, models: Sequence[str]) -> InferenceEngine:
+    """An engine running the selected Analysis Mode's plan for the given models"""
+    plan = resolve_plan(settings)
+    tiling = settings.get('tiling', {})
+    postprocessing = settings.get('postprocessing', {})
+    return InferenceEngine(
+        models,
+        confidence_threshold=settings.get('confidence_threshold', 0.7),
+        sensitivity=settings.get('sensitivity', 'Medium'),
+        batch_size=settings.get('batch_size', DEFAULT_BATCH_SIZE),
+        tiled_models=plan['tiled_models'],
+        tile_size=tiling.get('tile_size', DEFAULT_TILE_SIZE),
+        tile_overlap=tiling.get('overlap', DEFAULT_TILE_OVERLAP),
+        nms_iou=postprocessing.get('nms_iou', NMS_IOU),
+        # Models are fused once their cached and fresh detections are together
+        fuse_models=False,
+        input_scale=plan['input_scale'],
+        augmentations=plan['augmentations'],
+        latency_budget=plan['latency_budget_ms'] / 1000.0,
+        gating=plan['gating'],
+    )
+
+
+def live_detector(settings: Dict) -> Callable[[np.ndarray], List[Dict]]:
+    """Per-frame detector for a live feed; it always runs the Quick Scan plan, whatever mode stored media use"""
+    live_settings = dict(settings, mode=QUICK_SCAN, latency_budget_ms=None)
+    engine = build_engine(live_settings, live_settings['models'])
+    postprocessing = settings.get('postprocessing', {})
+
+    def detect(frame: np.ndarray) -> List[Dict]:
+        detections = engine.infer([cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)])[0]
+        return fuse_frames(detections, postprocessing.get('nms_iou', NMS_IOU),
+                           fuse=postprocessing.get('fuse_models', True))
+
+    # The feed releases the engine's models when it stops
+    detect.close = engine.close
+    return detect
+
+
+def run_engine(engine: InferenceEngine, file_infos: Sequence[Dict], indices: Sequence[int],
+               settings: Dict, results: List[Dict], finish: Callable[[int, List[Dict]], None]):
+    """Analyse the given files with one engine; finish(i, detections) is called as each one completes"""
+    # Ordinary images from all files are decoded lazily and share batches
+    plain = [i for i in indices if not _is_video(file_infos[i]) and not is_large_raster(file_infos[i].get('header'))]
+    # Only the quick plan decodes JPEGs at reduced scale
+    max_side = engine.max_input_size if resolve_plan(settings)['draft_decode'] else 0
+
+    scales = {}
+
+    def decoded():
+        for i in plain:
+            started = time.perf_counter()
+            try:
+                image, (width, height) = load_image(file_infos[i]['path'], max_side)
+            except Exception as e:
+                results[i]['error'] = str(e)
+                finish(i, [])
+                continue
+            engine.timings[STAGE_DECODE] += time.perf_counter() - started
+            scales[i] = (width / image.shape[1], height / image.shape[0])
+            yield i, image
+
+    for i, detections in engine.run(decoded()):
+        # Boxes come back in decoded pixels; report them in the original image's pixels
+        scale_boxes(detections, *scales.pop(i))
+        finish(i, detections)
+
+    for i in indices:
+        if i in plain:
+            continue
+        file_info = file_infos[i]
+        detections = []
+        try:
+            if not _is_video(file_info):
+                # Orthomosaics are analysed window by window, never loaded whole
+                detections = analyze_large_raster(engine, file_info)
+            elif CV2_AVAILABLE:
+                video = analyze_video(engine, file_info, settings.get('video_sampling', {}))
+                detections = video['detections']
+                results[i]['video_stats'] = video['stats']
+                if 'error' in video['stats']:
+                    results[i]['error'] = video['stats']['error']
+            else:
+                results[i]['error'] = "OpenCV is required to analyse video files"
+        except Exception as e:
+            results[i]['error'] = str(e)
+        finish(i, detections)
+
+
+def analyze_media(file_infos: Sequence[Dict], settings: Dict,
+                  on_progress: Optional[ProgressFn] = None,
+                  on_result: Optional[ResultFn] = None) -> Tuple[List[Dict], Dict]:
+    """One result per file, in input order, plus engine and cache stats; on_result sees each file as it finishes
+
+    Per-model results are looked up in the result cache first. Files are grouped by the models
+    still missing for them and only those (file, model) pairs go through an engine. With
+    near-duplicate linking on, frames that are not fully cached and sit in a cluster of
+    near-identical frames take their representative's result instead of being analysed.
+    """
+    models = list(settings['models'])
+    postprocessing = settings.get('postprocessing', {})
+    results = [new_result(file_info) for file_info in file_infos]
+    signature = analysis_signature(settings)
+    for result in results:
+        # Lets the next run tell which items are already up to date
+        result['models'] = models
+        result['analysis_signature'] = signature
+    keys = [result_keys(file_info, settings) for file_info in file_infos]
+    cached = lookup(key for file_keys in keys for key in file_keys.values())
+    by_model = [{} for _ in file_infos]
+    pending = {}
+    for i, file_keys in enumerate(keys):
+        for model in models:
+            if file_keys.get(model) in cached:
+                by_model[i][model] = cached[file_keys[model]]
+        missing = tuple(m for m in models if m not in by_model[i])
+        if missing:
+            pending.setdefault(missing, []).append(i)
+    hits = sum(len(found) for found in by_model)
+    # Representative index -> [(member index, distance)] for members that still need a result
+    linked = {}
+    duplicates = near_duplicate_settings(settings)
+    if duplicates:
+        for rep, members in cluster_near_duplicates(file_infos, duplicates['threshold']).items():
+            members = [(m, distance) for m, distance in members if len(by_model[m]) < len(models)]
+            if members:
+                linked[rep] = members
+        skip = {m for members in linked.values() for m, _ in members}
+        pending = {missing: [i for i in indices if i not in skip] for missing, indices in pending.items()}
+        pending = {missing: indices for missing, indices in pending.items() if indices}
+    cache_stats = {'hits': hits, 'misses': sum(len(missing) * len(indices) for missing, indices in pending.items())}
+    total = len(file_infos)
+    done = 0
+
+    def progress(i):
+        nonlocal done
+        done += 1
+        detections = [det for model in models for det in by_model[i].get(model, [])]
+        results[i]['detections'] = fuse_frames(detections, postprocessing.get('nms_iou', NMS_IOU),
+                                               fuse=postprocessing.get('fuse_models', True))
+        if on_result:
+            on_result(i, results[i])
+        if on_progress:
+            on_progress(done, total, file_infos[i]['name'])
+        for member, distance in linked.get(i, ()):
+            link_duplicate(results[member], results[i], distance)
+            done += 1
+            if on_result:
+                on_result(member, results[member])
+            if on_progress:
+                on_progress(done, total, file_infos[member]['name'])
+
+    for i in range(total):
+        if all(m in by_model[i] for m in models):
+            results[i]['cached'] = True
+            progress(i)
+
+    engine_stats = []
+    for missing, indices in pending.items():
+        engine = build_engine(settings, missing)
+
+        def finish(i, detections, missing=missing, engine=engine):
+            fresh = {model: [] for model in missing}
+            for det in detections:
+                fresh[det['model']].append(det)
+            by_model[i].update(fresh)
+            if engine.degraded:
+                # Load-dependent output is never cached as the plan's full result
+                results[i]['degraded'] = True
+            elif 'error' not in results[i]:
+                # Failed files are retried next time rather than cached as empty
+                store({keys[i][model]: fresh[model] for model in missing if model in keys[i]})
+            progress(i)
+
+        with engine:
+            run_engine(engine, file_infos, indices, settings, results, finish)
+        engine_stats.append(engine.stats())
+    stats = combine_stats(engine_stats)
+    stats['cache'] = cache_stats
+    stats['degraded'] = sum(1 for result in results if result.get('degraded'))
+    stats['model_pool'] = model_pool().stats()
+    if duplicates:
+        stats['near_duplicates'] = {
+            'threshold': duplicates['threshold'],
+            'clusters': len(linked),
+            'linked': sum(len(members) for members in linked.values()),
+        }
+    return results, stats
+
+
+def result_identity(item: Dict) -> str:
+    """The media a result (or an uploaded file's info) refers to"""
+    return item.get('sha256') or item.get('file_path') or item['path']
+
+
+def pending_media(file_infos: Sequence[Dict], results: Sequence[Dict], settings: Dict) -> List[Dict]:
+    """Files with no result for these settings yet: new, analysed with other settings or models, failed,
+    or analysed without the plan's test-time augmentation because the latency budget ran out
+    """
+    signature = analysis_signature(settings)
+    current = {
+        result_identity(result) for result in results
+        if result.get('analysis_signature') == signature and 'error' not in result and not result.get('degraded')
+    }
+    return [file_info for file_info in file_infos if result_identity(file_info) not in current]
+
+
+def merge_results(existing: List[Dict], new: Sequence[Dict]) -> List[Dict]:
+    """Results of a new run replace earlier results for the same media rather than being appended"""
+    position = {result_identity(result): index for index, result in enumerate(existing)}
+    merged = list(existing)
+    for result in new:
+        index = position.get(result_identity(result))
+        if index is None:
+            position[result_identity(result)] = len(merged)
+            merged.append(result)
+        else:
+            merged[index] = result
+    return merged
+
+
+# Streamlit helpers
+
+def settings_from_session() -> Dict:
+    """Analysis settings chosen on the AI Analysis page"""
+    return {
+        'models': list(st.session_state.get('selected_models', [])),
+        'confidence_threshold': float(st.session_state.get('confidence_threshold', 0.7)),
+        'sensitivity': st.session_state.get('detection_sensitivity', 'Medium'),
+        'mode': st.session_state.get('analysis_mode', DEFAULT_MODE),
+        'latency_budget_ms': st.session_state.get('latency_budget_ms'),
+        'video_sampling': dict(st.session_state.get('video_sampling', {})),
+        'tiling': dict(st.session_state.get('tiling', {})),
+        'postprocessing': dict(st.session_state.get('postprocessing', {})),
+        'near_duplicates': dict(st.session_state.get('near_duplicates', {})),
+    }
@@ -10,6 +10,8 @@ from components.analysis_page import show_analysis_page
 from components.annotation_page import show_annotation_page
 from components.admin_panel import show_admin_panel
 from components._login import show_login_page
+from storage_manager import track_session
+from analysis_jobs import collect_finished_job
 
 # Page config and modern design system
 st.set_page_config(
@@ -187,6 +189,11 @@ st.markdown(
 if 'page' not in st.session_state:
     st.session_state.page = 'home'
 
+# Keeps this session's media references alive and runs the store sweeper
+track_session()
+# Results of a background analysis job land in this session whichever page is open
+collect_finished_job()
+
 # Render the custom sidebar and top navigation
 render_sidebar_navigation()
 render_top_nav()
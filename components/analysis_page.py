@@ -1,22 +1,22 @@
 import streamlit as st
-try:
-    import cv2
-    CV2_AVAILABLE = True
-except ImportError:
-    CV2_AVAILABLE = False
-
-try:
-    import numpy as np
-    NUMPY_AVAILABLE = True
-except ImportError:
-    NUMPY_AVAILABLE = False
-
-from PIL import Image
 import pandas as pd
-from datetime import datetime
-import random
 from auth import require_login, current_user
 from ui import render_top_nav
+from analysis_runner import settings_from_session, pending_media
+from inference_engine import CV2_AVAILABLE, format_engine_stats, format_stage_timings
+from result_cache import format_cache_stats
+from model_pool import format_pool_stats
+from gating import format_gating_stats
+from near_duplicates import DEFAULT_HAMMING, MAX_HAMMING, format_duplicate_stats
+from detection_table import session_detection_table
+from analysis_plans import ANALYSIS_PLANS, format_latency_stats
+from analysis_jobs import (
+    start_analysis_job, active_job_id, collect_finished_job, get_job, cancel_job,
+    POLL_INTERVAL, QUEUED, DONE, CANCELLED, FINISHED,
+)
+
+if CV2_AVAILABLE:
+    from video_engine import format_video_stats
 
 def show_analysis_page():
     st.markdown('<h2 class="section-header">🤖 AI Analysis</h2>', unsafe_allow_html=True)
@@ -27,6 +27,10 @@ def show_analysis_page():
         st.caption(f"Logged in as @{user['username']} ({user['email']})")
     st.divider()
     
+    # A running job keeps polling here; it was submitted by an earlier rerun or another visit
+    show_analysis_job()
+    show_last_job_summary()
+    
     # Check if media is uploaded
     if 'uploaded_media' not in st.session_state or not st.session_state.uploaded_media:
         st.warning("⚠️ Please upload media files first in the Media Upload section.")
@@ -129,202 +133,175 @@ def show_analysis_controls():
     with col3:
         analysis_mode = st.selectbox(
             "Analysis Mode",
-            ["Quick Scan", "Detailed Analysis", "Comprehensive Report"],
+            list(ANALYSIS_PLANS),
             index=1,
             help="Choose analysis depth vs speed trade-off"
         )
         st.session_state.analysis_mode = analysis_mode
+        st.caption(ANALYSIS_PLANS[analysis_mode]['description'])
+        # Keyed per mode, so switching modes brings up that plan's own default
+        latency_budget = st.number_input(
+            "Latency budget (ms per image)",
+            min_value=1,
+            max_value=60000,
+            value=ANALYSIS_PLANS[analysis_mode]['latency_budget_ms'],
+            step=10,
+            key=f"latency_budget_{analysis_mode}",
+            help="Test-time augmentation is dropped when the running mean goes over budget"
+        )
+        st.session_state.latency_budget_ms = float(latency_budget)
+    
+    with st.expander("🎥 Video Sampling"):
+        vcol1, vcol2, vcol3 = st.columns(3)
+        with vcol1:
+            sampling_mode = st.radio(
+                "Keyframe sampling",
+                ["Fixed stride", "Scene change"],
+                help="Analyse every Nth frame, or only frames where the scene changes"
+            )
+        with vcol2:
+            stride = st.number_input("Frame stride", min_value=1, max_value=600, value=30, step=1)
+        with vcol3:
+            scene_threshold = st.slider(
+                "Scene change threshold",
+                min_value=0.05,
+                max_value=0.9,
+                value=0.25,
+                step=0.05,
+                help="Mean frame difference (0-1) that counts as a new scene"
+            )
+        track = st.checkbox("Track defects across keyframes", value=True,
+                            help="Report a defect that stays in view once, with its first/last frame and best crop")
+        st.session_state.video_sampling = {
+            'mode': 'scene' if sampling_mode == "Scene change" else 'stride',
+            'stride': int(stride),
+            'scene_threshold': float(scene_threshold),
+            'track': track
+        }
+    
+    with st.expander("🧩 Tiled Inference"):
+        tiled_models = st.multiselect(
+            "Run these models tile by tile",
+            st.session_state.get('selected_models', []),
+            help="Sliding-window inference at full resolution; finds hairline defects a downsized frame loses"
+        )
+        tcol1, tcol2 = st.columns(2)
+        with tcol1:
+            tile_size = st.number_input("Tile size (px)", min_value=256, max_value=4096, value=1024, step=128)
+        with tcol2:
+            tile_overlap = st.number_input("Tile overlap (px)", min_value=0, max_value=1024, value=128, step=32,
+                                           help="Defects crossing a seam are merged back into one box")
+        st.session_state.tiling = {
+            'models': tiled_models,
+            'tile_size': int(tile_size),
+            'overlap': int(tile_overlap)
+        }
+    
+    with st.expander("🧮 Duplicate Suppression"):
+        pcol1, pcol2 = st.columns(2)
+        with pcol1:
+            nms_iou = st.slider("Per-model NMS IoU", min_value=0.1, max_value=0.9, value=0.5, step=0.05,
+                                help="Boxes from one model overlapping more than this are reduced to the strongest")
+        with pcol2:
+            fuse_models = st.checkbox("Fuse overlapping detections across models", value=True,
+                                      help="One weighted box when several models flag the same defect type in the same region")
+        st.session_state.postprocessing = {'nms_iou': float(nms_iou), 'fuse_models': fuse_models}
+    
+    with st.expander("🧬 Near-Duplicate Frames"):
+        dcol1, dcol2 = st.columns(2)
+        with dcol1:
+            link_duplicates = st.checkbox("Analyse near-duplicate frames once", value=False,
+                                          help="Hover shots and bursts: one representative frame is analysed "
+                                               "and its result is shared with the rest of its cluster")
+        with dcol2:
+            hamming_threshold = st.slider("Hamming threshold (of 64 bits)", min_value=0, max_value=MAX_HAMMING,
+                                          value=DEFAULT_HAMMING, disabled=not link_duplicates,
+                                          help="Largest pHash and dHash distance from the representative")
+        st.session_state.near_duplicates = {'enabled': link_duplicates, 'threshold': int(hamming_threshold)}
 
 def run_inspection_analysis():
-    """Run the AI inspection analysis on uploaded media"""
+    """Submit the AI inspection analysis on uploaded media as a background job"""
     
     if 'selected_models' not in st.session_state or not st.session_state.selected_models:
         st.error("Please select at least one AI model for analysis.")
         return
     
-    st.subheader("🔍 Analysis in Progress...")
-    
-    # Progress tracking
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    # Initialize results storage
-    if 'analysis_results' not in st.session_state:
-        st.session_state.analysis_results = []
-    
-    total_files = len(st.session_state.uploaded_media)
-    
-    for i, file_info in enumerate(st.session_state.uploaded_media):
-        status_text.text(f"Analyzing {file_info['name']}...")
-        progress_bar.progress((i + 1) / total_files)
-        
-        # Simulate analysis for each model
-        file_results = analyze_single_file(file_info)
-        st.session_state.analysis_results.append(file_results)
-    
-    status_text.text("Analysis completed!")
-    st.success("✅ Inspection analysis completed successfully!")
-    
-    # Display results summary
-    display_analysis_summary()
-
-def analyze_single_file(file_info):
-    """Analyze a single file with selected models"""
-    
-    results = {
-        'file_name': file_info['name'],
-        'file_path': file_info['path'],
-        'analysis_time': datetime.now(),
-        'detections': []
-    }
-    
-    # Load image for analysis
-    try:
-        if file_info['type'].startswith('image'):
-            if CV2_AVAILABLE:
-                img = cv2.imread(file_info['path'])
-                if img is not None:
-                    results['detections'] = simulate_defect_detection(img, file_info['name'])
-            else:
-                # Use PIL as fallback
-                pil_img = Image.open(file_info['path'])
-                results['detections'] = simulate_defect_detection_pil(pil_img, file_info['name'])
-        else:
-            # For video files, simulate frame-by-frame analysis
-            results['detections'] = simulate_video_analysis(file_info['path'])
-    except Exception as e:
-        st.error(f"Error analyzing {file_info['name']}: {str(e)}")
-    
-    return results
-
-def simulate_defect_detection_pil(pil_img, filename):
-    """Simulate AI defect detection on a PIL image (fallback when cv2 not available)"""
-    
-    detections = []
-    width, height = pil_img.size
+    if active_job_id():
+        st.info("An analysis job is already running for this session.")
+        return
     
-    # Simulate detections based on selected models
-    for model_name in st.session_state.selected_models:
-        # Generate random detections based on model type
-        num_detections = random.randint(0, 2)  # Fewer detections in fallback mode
-        
-        for _ in range(num_detections):
-            # Random bounding box
-            x1 = random.randint(0, width // 2)
-            y1 = random.randint(0, height // 2)
-            x2 = random.randint(x1 + 50, min(x1 + 200, width))
-            y2 = random.randint(y1 + 50, min(y1 + 200, height))
-            
-            # Random confidence score
-            confidence = random.uniform(
-                st.session_state.confidence_threshold,
-                1.0
-            )
-            
-            # Determine defect type and severity
-            defect_info = get_defect_info(model_name, confidence)
-            
-            detection = {
-                'model': model_name,
-                'defect_type': defect_info['type'],
-                'confidence': confidence,
-                'bbox': [x1, y1, x2, y2],
-                'severity': defect_info['severity'],
-                'description': defect_info['description']
-            }
-            
-            detections.append(detection)
+    settings = settings_from_session()
+    # Only media without a result for the current settings and models are scheduled
+    pending = pending_media(st.session_state.uploaded_media, st.session_state.get('analysis_results', []), settings)
+    if not pending:
+        st.info(f"All {len(st.session_state.uploaded_media)} file(s) are already analysed with these settings.")
+        return
+    st.session_state.analysis_up_to_date = len(st.session_state.uploaded_media) - len(pending)
     
-    return detections
+    # Runs in a worker process; the page polls the job instead of blocking this rerun
+    start_analysis_job(pending, settings)
+    st.rerun()
 
-def simulate_defect_detection(img, filename):
-    """Simulate AI defect detection on an image"""
-    
-    detections = []
-    height, width = img.shape[:2]
-    
-    # Simulate detections based on selected models
-    for model_name in st.session_state.selected_models:
-        # Generate random detections based on model type
-        num_detections = random.randint(0, 3)
-        
-        for _ in range(num_detections):
-            # Random bounding box
-            x1 = random.randint(0, width // 2)
-            y1 = random.randint(0, height // 2)
-            x2 = random.randint(x1 + 50, min(x1 + 200, width))
-            y2 = random.randint(y1 + 50, min(y1 + 200, height))
-            
-            # Random confidence score
-            confidence = random.uniform(
-                st.session_state.confidence_threshold,
-                1.0
-            )
-            
-            # Determine defect type and severity
-            defect_info = get_defect_info(model_name, confidence)
-            
-            detection = {
-                'model': model_name,
-                'defect_type': defect_info['type'],
-                'confidence': confidence,
-                'bbox': [x1, y1, x2, y2],
-                'severity': defect_info['severity'],
-                'description': defect_info['description']
-            }
-            
-            detections.append(detection)
+@st.fragment(run_every=POLL_INTERVAL)
+def show_analysis_job():
+    """Progress of the active analysis job, refreshed without rerunning the whole page"""
+    job_id = active_job_id()
+    if not job_id:
+        return
+    job = get_job(job_id)
+    if job is None or job['status'] in FINISHED:
+        if collect_finished_job():
+            st.rerun(scope="app")
+        return
     
-    return detections
+    st.subheader("🔍 Analysis in Progress...")
+    st.progress(job['done'] / max(job['total'], 1))
+    if job['status'] == QUEUED:
+        st.text("Waiting for a free analysis worker...")
+    else:
+        st.text(f"Analyzed {job['current'] or '...'} ({job['done']}/{job['total']})")
+    st.caption(f"Job {job_id} keeps running if you leave this page.")
+    if st.button("⏹️ Cancel Analysis"):
+        cancel_job(job_id)
 
-def get_defect_info(model_name, confidence):
-    """Get defect information based on model and confidence"""
-    
-    defect_types = {
-        "Crack Detection": {
-            'type': 'Structural Crack',
-            'description': 'Crack detected in structural surface',
-            'severity': 'High' if confidence > 0.8 else 'Medium'
-        },
-        "Corrosion Detection": {
-            'type': 'Metal Corrosion',
-            'description': 'Rust or corrosion detected on metal surface',
-            'severity': 'Critical' if confidence > 0.9 else 'High'
-        },
-        "Thermal Anomaly": {
-            'type': 'Thermal Hotspot',
-            'description': 'Abnormal temperature detected',
-            'severity': 'Critical' if confidence > 0.85 else 'Medium'
-        },
-        "Vegetation Risk": {
-            'type': 'Vegetation Growth',
-            'description': 'Vegetation encroachment detected',
-            'severity': 'Medium' if confidence > 0.7 else 'Low'
-        },
-        "Structural Damage": {
-            'type': 'Structural Defect',
-            'description': 'General structural damage detected',
-            'severity': 'High' if confidence > 0.8 else 'Medium'
-        }
-    }
+def show_last_job_summary():
+    """Outcome of the job collected on this rerun"""
+    job = st.session_state.pop('last_analysis_job', None)
+    if not job:
+        return
+    for file_results in job['results']:
+        if 'error' in file_results:
+            st.error(f"Error analyzing {file_results['file_name']}: {file_results['error']}")
+        if 'video_stats' in file_results:
+            st.caption(f"🎥 {file_results['file_name']}: {format_video_stats(file_results['video_stats'])}")
+    if job['status'] == DONE:
+        st.caption(f"⚡ {format_engine_stats(job['stats'])}")
+        # Decode and preprocessing happen once per image, however many models are selected
+        st.caption(f"⏱️ Stage timings: {format_stage_timings(job['stats'])}")
+        if format_latency_stats(job['stats']):
+            st.caption(f"🎯 {job['settings'].get('mode')}: {format_latency_stats(job['stats'])}")
+        if job['stats'].get('degraded'):
+            st.warning(f"{job['stats']['degraded']} file(s) were analysed without test-time augmentation to stay "
+                       f"within the latency budget. Their results are not cached and they will be analysed again next run.")
+        up_to_date = st.session_state.pop('analysis_up_to_date', 0)
+        if up_to_date:
+            st.caption(f"♻️ {up_to_date} file(s) already up to date were skipped; {job['total']} analysed.")
+        if 'cache' in job['stats']:
+            st.caption(f"🗃️ Result cache: {format_cache_stats(job['stats']['cache'])}")
+        if format_gating_stats(job['stats']):
+            st.caption(f"🚦 Gating: {format_gating_stats(job['stats'])}")
+        if 'near_duplicates' in job['stats']:
+            st.caption(f"🧬 {format_duplicate_stats(job['stats']['near_duplicates'])}")
+        if 'model_pool' in job['stats']:
+            st.caption(f"🧠 Model pool: {format_pool_stats(job['stats']['model_pool'])}")
+        st.success("✅ Inspection analysis completed successfully!")
+    elif job['status'] == CANCELLED:
+        st.warning(f"Analysis cancelled after {len(job['results'])} of {job['total']} file(s).")
+    else:
+        st.error(f"Analysis failed: {job['error']}")
     
-    return defect_types.get(model_name, {
-        'type': 'Unknown Defect',
-        'description': 'Unspecified defect detected',
-        'severity': 'Medium'
-    })
-
-def simulate_video_analysis(video_path):
-    """Simulate video analysis (placeholder)"""
-    # For now, return sample detections for video files
-    return [{
-        'model': 'Video Analysis',
-        'defect_type': 'Motion Detected Defect',
-        'confidence': 0.85,
-        'bbox': [100, 100, 200, 200],
-        'severity': 'Medium',
-        'description': 'Defect detected in video frame analysis'
-    }]
+    # Display results summary
+    display_analysis_summary()
 
 def display_analysis_summary():
     """Display summary of analysis results"""
@@ -335,39 +312,24 @@ def display_analysis_summary():
     st.subheader("📈 Analysis Summary")
     
     # Calculate summary statistics
-    total_detections = sum(len(result['detections']) for result in st.session_state.analysis_results)
-    files_with_defects = sum(1 for result in st.session_state.analysis_results if result['detections'])
+    table = session_detection_table()
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Files Analyzed", len(st.session_state.analysis_results))
+        st.metric("Total Files Analyzed", table.n_files)
     
     with col2:
-        st.metric("Files with Defects", files_with_defects)
+        st.metric("Files with Defects", table.files_with_detections())
     
     with col3:
-        st.metric("Total Detections", total_detections)
+        st.metric("Total Detections", len(table))
     
     with col4:
-        avg_confidence = 0
-        if total_detections > 0:
-            all_confidences = []
-            for result in st.session_state.analysis_results:
-                for detection in result['detections']:
-                    all_confidences.append(detection['confidence'])
-            avg_confidence = sum(all_confidences) / len(all_confidences)
-        
-        st.metric("Avg Confidence", f"{avg_confidence:.2f}")
+        st.metric("Avg Confidence", f"{table.mean_confidence():.2f}")
     
     # Severity breakdown
-    severity_counts = {'Critical': 0, 'High': 0, 'Medium': 0, 'Low': 0}
-    
-    for result in st.session_state.analysis_results:
-        for detection in result['detections']:
-            severity = detection['severity']
-            if severity in severity_counts:
-                severity_counts[severity] += 1
+    severity_counts = table.severity_counts()
     
     # Display charts in columns
     chart_col1, chart_col2 = st.columns(2)
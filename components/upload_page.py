@@ -12,11 +12,27 @@ try:
 except ImportError:
     NUMPY_AVAILABLE = False
 
+import pandas as pd
 from PIL import Image
-import tempfile
-import os
+import io
 from auth import require_login, current_user
 from ui import render_top_nav
+from media_store import put_bytes, add_to_session, remove_from_session, session_media_index, current_session_id
+from storage_manager import check_session_quota
+from thumbnails import get_thumbnail
+from quality import compute_quality_batch, quality_caption
+from ingest_pipeline import item_from_upload, run_ingest_with_progress
+from exif_meta import geo_from_meta
+from workload import SyntheticWorkload, ingest_workload, DEFAULT_DETECTIONS, DEFAULT_SEED
+from analysis_runner import settings_from_session, live_detector
+
+if CV2_AVAILABLE:
+    from live_feed import (
+        LIVE_BUFFER_SIZE, LIVE_REFRESH, annotate, format_live_stats,
+        live_session, open_stream, replay_source, start_live_session, stop_live_session,
+    )
+else:
+    LIVE_REFRESH = None
 
 def show_upload_page():
     st.markdown('<h2 class="section-header">📤 Media Upload</h2>', unsafe_allow_html=True)
@@ -45,58 +61,135 @@ def handle_file_upload():
     
     uploaded_files = st.file_uploader(
         "Choose files",
-        type=['jpg', 'jpeg', 'png', 'mp4', 'avi', 'mov'],
+        type=['jpg', 'jpeg', 'png', 'tif', 'tiff', 'mp4', 'avi', 'mov'],
         accept_multiple_files=True,
-        help="Supported formats: JPG, PNG, MP4, AVI, MOV"
+        help="Supported formats: JPG, PNG, TIFF/GeoTIFF, MP4, AVI, MOV"
     )
     
     if uploaded_files:
         st.success(f"Uploaded {len(uploaded_files)} file(s)")
         
-        # Store uploaded files in session state
-        if 'uploaded_media' not in st.session_state:
-            st.session_state.uploaded_media = []
+        # Uploads already stored this session, keyed by uploader file id, so reruns skip re-hashing
+        upload_digests = st.session_state.setdefault('upload_digests', {})
         
+        new_uploads = []
         for uploaded_file in uploaded_files:
-            # Check if file already exists to prevent duplicates
-            file_exists = any(
-                existing_file['name'] == uploaded_file.name and 
-                existing_file['size'] == uploaded_file.size
-                for existing_file in st.session_state.uploaded_media
-            )
-            
-            if not file_exists:
-                # Save file temporarily
-                with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-                    tmp_file.write(uploaded_file.getvalue())
-                    file_path = tmp_file.name
-                
-                file_info = {
-                    'name': uploaded_file.name,
-                    'path': file_path,
-                    'type': uploaded_file.type,
-                    'size': uploaded_file.size
-                }
-                
-                st.session_state.uploaded_media.append(file_info)
+            upload_key = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+            sha256 = upload_digests.get(upload_key)
+            # O(1) duplicate check against the session's hash index
+            if sha256 and sha256 in session_media_index():
+                continue
+            item = item_from_upload(uploaded_file)
+            item['upload_key'] = upload_key
+            new_uploads.append(item)
+        
+        if new_uploads:
+            ok, message = check_session_quota(current_session_id(), sum(i['source_size'] for i in new_uploads))
+            if not ok:
+                st.error(message)
+                new_uploads = []
+        
+        # Persist, hash, header, thumbnail, quality and fingerprint stages run concurrently;
+        # identical bytes from any session or user are stored once and previews/metrics are
+        # read from the media record on every later rerun
+        if new_uploads:
+            for item in run_ingest_with_progress(new_uploads):
+                if 'error' in item:
+                    # Only a file that could not be stored or hashed is left out; the rest are
+                    # added even when a later stage failed, with a warning listing what was skipped
+                    continue
+                upload_digests[item['upload_key']] = item['record']['sha256']
+                add_to_session(item['record'], item['name'])
         
         # Display uploaded files
         display_uploaded_files()
 
 def handle_live_camera():
     st.subheader("Live Drone Camera Connection")
-    st.info("🚧 Live camera integration coming soon!")
-    
-    # Drone connection options
-    drone_type = st.selectbox(
-        "Select Drone Type:",
-        ["DJI Tello", "DJI Mini", "Custom Drone", "Simulator"]
-    )
-    
-    if drone_type == "Simulator":
-        st.warning("Using camera simulator mode")
-        if st.button("Start Camera Simulation"):
-            simulate_camera_feed()
+    if not CV2_AVAILABLE:
+        st.error("Live feeds need OpenCV.")
+        return
+
+    if live_session() is None:
+        source_kind = st.radio("Source:", ["Stream URL", "Replay Uploaded Video"], horizontal=True)
+        loop = False
+        if source_kind == "Stream URL":
+            address = st.text_input(
+                "Stream URL",
+                placeholder="rtsp://192.168.1.10:8554/live",
+                help="RTSP, UDP, RTP, SRT or HTTP MJPEG stream from the drone or its ground station"
+            )
+        else:
+            videos = [f for f in st.session_state.get('uploaded_media', []) if f['type'].startswith('video')]
+            if not videos:
+                st.info("Upload a video to replay it as a live feed at its recorded frame rate.")
+                return
+            video = st.selectbox("Video:", videos, format_func=lambda f: f['name'])
+            address = video.get('sha256')
+            loop = st.checkbox("Loop replay", value=True)
+        buffer_size = st.number_input(
+            "Frame buffer", min_value=1, max_value=32, value=LIVE_BUFFER_SIZE,
+            help="Frames held while detection catches up; when it is full the oldest frame is dropped"
+        )
+        settings = settings_from_session()
+        if not settings['models']:
+            st.warning("Select detection models on the AI Analysis page first.")
+            return
+        st.caption(f"Runs {', '.join(settings['models'])} with the Quick Scan plan on every frame it keeps up with.")
+        if st.button("▶️ Start Live Feed", disabled=not address):
+            try:
+                source = open_stream(address) if source_kind == "Stream URL" else replay_source(address, loop=loop)
+                start_live_session(source, live_detector(settings), buffer_size=int(buffer_size))
+            except Exception as e:
+                st.error(f"Could not start live feed: {e}")
+                return
+            st.rerun()
+        if st.session_state.get('live_stats'):
+            st.caption(f"Last feed: {format_live_stats(st.session_state.live_stats)}")
+        return
+
+    show_live_feed()
+
+@st.fragment(run_every=LIVE_REFRESH)
+def show_live_feed():
+    """Latest analysed frame and feed statistics, refreshed without rerunning the whole page"""
+    ingest = live_session()
+    if ingest is None:
+        return
+    # Each refresh keeps the feed alive; once the tab is gone it times out on its own
+    ingest.touch()
+    stats = ingest.stats()
+    latest = ingest.latest
+    if latest is not None:
+        st.image(annotate(latest['frame'], latest['detections']), channels="BGR",
+                 caption=f"Frame {latest['index']} - {len(latest['detections'])} detection(s), "
+                         f"{latest['latency'] * 1000:.0f} ms glass-to-detection")
+    else:
+        st.text(f"Connecting to {stats['source']}...")
+    st.caption(f"📡 {format_live_stats(stats)}")
+    if 'error' in stats:
+        st.error(f"Live feed error: {stats['error']}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("📸 Capture Frame", disabled=latest is None):
+            ok, encoded = cv2.imencode('.jpg', latest['frame'])
+            if ok:
+                name = f"live_frame_{latest['index']}.jpg"
+                record = put_bytes(encoded.tobytes(), name, 'image/jpeg')
+                add_to_session(record, name, 'image/jpeg')
+                st.success("Frame captured successfully!")
+    with col2:
+        if st.button("⏹️ Stop Live Feed") or not ingest.running:
+            stop_live_session()
+            st.rerun(scope="app")
+    recent, _ = ingest.snapshot()
+    if recent:
+        st.dataframe(pd.DataFrame([
+            {'Frame': d['frame_index'], 'Time (s)': d['timestamp'], 'Defect Type': d['defect_type'],
+             'Confidence': round(d['confidence'], 2), 'Severity': d['severity'], 'Model': d['model']}
+            for d in reversed(recent)
+        ]), height=200)
 
 def handle_sample_images():
     st.subheader("Sample Infrastructure Images")
@@ -115,34 +208,37 @@ def handle_sample_images():
     )
     
     if selected_samples:
-        if 'uploaded_media' not in st.session_state:
-            st.session_state.uploaded_media = []
-        
         for sample_name in selected_samples:
             # Save sample image
             img = sample_images[sample_name]
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
-                img.save(tmp_file.name)
-                
-                file_info = {
-                    'name': f"{sample_name.lower().replace(' ', '_')}.jpg",
-                    'path': tmp_file.name,
-                    'type': 'image/jpeg',
-                    'size': os.path.getsize(tmp_file.name)
-                }
-                
-                # Check if sample image already exists to prevent duplicates
-                sample_exists = any(
-                    existing_file['name'] == file_info['name']
-                    for existing_file in st.session_state.uploaded_media
-                )
-                
-                if not sample_exists:
-                    st.session_state.uploaded_media.append(file_info)
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG')
+            file_name = f"{sample_name.lower().replace(' ', '_')}.jpg"
+            record = put_bytes(buffer.getvalue(), file_name, 'image/jpeg')
+            
+            # Samples are deterministic, so re-selecting one hits the hash index
+            add_to_session(record, file_name, 'image/jpeg')
         
+        compute_quality_batch(st.session_state.uploaded_media)
         st.success(f"Added {len(selected_samples)} sample image(s)")
         display_uploaded_files()
 
+    # Reproducible benchmark data: the same seed always gives the same images and ground truth
+    with st.expander("🧪 Synthetic Workload"):
+        wcol1, wcol2, wcol3, wcol4 = st.columns(4)
+        with wcol1:
+            count = st.number_input("Images", min_value=1, max_value=1000, value=10, step=10)
+        with wcol2:
+            resolution = st.selectbox("Resolution", ["640x480", "1280x720", "1920x1080", "4000x3000"], index=2)
+        with wcol3:
+            detections = st.number_input("Defects per image", min_value=0, max_value=50, value=DEFAULT_DETECTIONS)
+        with wcol4:
+            seed = st.number_input("Seed", min_value=0, value=DEFAULT_SEED, step=1)
+        if st.button("Generate Workload"):
+            width, height = (int(v) for v in resolution.split('x'))
+            added = ingest_workload(SyntheticWorkload(int(count), (width, height), int(detections), int(seed)))
+            st.success(f"Added {added} synthetic image(s)")
+
 def display_uploaded_files():
     if 'uploaded_media' in st.session_state and st.session_state.uploaded_media:
         st.subheader("Uploaded Files")
@@ -156,84 +252,33 @@ def display_uploaded_files():
             with col1:
                 st.write(f"📁 {file_info['name']}")
                 st.write(f"Size: {file_info['size']} bytes")
-                # Image quality metrics
-                if file_info['type'].startswith('image') and CV2_AVAILABLE and NUMPY_AVAILABLE:
-                    try:
-                        img_cv = cv2.imread(file_info['path'])
-                        if img_cv is not None:
-                            gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-                            # Blur estimate via Laplacian variance
-                            fm = cv2.Laplacian(gray, cv2.CV_64F).var()
-                            # Brightness estimate
-                            brightness = float(np.mean(gray))
-                            blur_quality = "Good" if fm > 100.0 else ("OK" if fm > 50.0 else "Blurry")
-                            st.caption(f"Blur score: {fm:.1f} ({blur_quality}) | Brightness: {brightness:.0f}/255")
-                    except Exception:
-                        pass
+                # Image quality metrics, read from the media record computed at ingest
+                caption = quality_caption(file_info)
+                if caption:
+                    st.caption(caption)
                 elif file_info['type'].startswith('image'):
-                    st.caption("Install OpenCV for image quality analysis")
+                    st.caption("Quality metrics unavailable")
+                geo = geo_from_meta(file_info)
+                if geo:
+                    st.caption(f"📍 {geo['lat']:.6f}, {geo['lon']:.6f}")
             
             with col2:
-                if file_info['type'].startswith('image'):
-                    try:
-                        img = Image.open(file_info['path'])
-                        st.image(img, width=100)
-                    except:
-                        st.write("🖼️ Image")
+                thumb = get_thumbnail(file_info.get('sha256'), file_info['path'], 128) if file_info['type'].startswith('image') else None
+                if thumb:
+                    st.image(thumb, width=100)
+                elif file_info['type'].startswith('image'):
+                    st.write("🖼️ Image")
                 else:
                     st.write("🎥 Video")
             
             with col3:
-                # Use unique key based on file path instead of index
-                unique_key = f"remove_{file_info['path'].replace('/', '_').replace('\\', '_')}"
+                # Use unique key based on content hash instead of index
+                unique_key = f"remove_{file_info.get('sha256') or file_info['path']}"
                 if st.button(f"Remove", key=unique_key):
-                    # Remove the specific file from the list
-                    try:
-                        # Clean up the temporary file
-                        if os.path.exists(file_info['path']):
-                            os.unlink(file_info['path'])
-                    except Exception:
-                        pass  # File might already be deleted
-                    
-                    # Remove from session state using the actual file_info object
-                    if file_info in st.session_state.uploaded_media:
-                        st.session_state.uploaded_media.remove(file_info)
+                    # The blob is shared through the media store, so only this session's reference goes
+                    remove_from_session(file_info)
                     st.rerun()
 
-def simulate_camera_feed():
-    st.subheader("Camera Simulation")
-    
-    # Create a simple camera simulation
-    camera_placeholder = st.empty()
-    
-    # Simulate camera frames
-    for i in range(5):
-        # Create a simple simulated frame
-        frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
-        frame = cv2.putText(frame, f"Drone Camera - Frame {i+1}", (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        
-        camera_placeholder.image(frame, channels="BGR", caption=f"Live Feed - Frame {i+1}")
-        
-        if i == 4:  # Last frame
-            if st.button("Capture Frame"):
-                # Save captured frame
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
-                    cv2.imwrite(tmp_file.name, frame)
-                    
-                    file_info = {
-                        'name': f"captured_frame.jpg",
-                        'path': tmp_file.name,
-                        'type': 'image/jpeg',
-                        'size': os.path.getsize(tmp_file.name)
-                    }
-                    
-                    if 'uploaded_media' not in st.session_state:
-                        st.session_state.uploaded_media = []
-                    
-                    st.session_state.uploaded_media.append(file_info)
-                    st.success("Frame captured successfully!")
-
 def create_sample_image(image_type):
     """Create sample images for demonstration"""
     # Import PIL Image at the top of function to avoid scope issues
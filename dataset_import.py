@@ -0,0 +1,123 @@
+import os
+import zipfile
+import mimetypes
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+import streamlit as st
+
+from media_store import add_to_session, current_session_id
+from storage_manager import check_session_quota
+from ingest_pipeline import run_ingest_with_progress
+
+# Bulk import of archived missions: ZIP members and directory trees are streamed straight
+# into the ingest pipeline, never extracted to a scratch directory first.
+IMPORT_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.mp4', '.avi', '.mov'}
+# Server-side paths are only importable from below this directory; unset, only uploads are
+IMPORT_ROOT = os.environ.get('FLYSCOPE_IMPORT_ROOT') or None
+
+
+def _is_media(name: str) -> bool:
+    base = os.path.basename(name)
+    # Skip macOS resource forks and hidden files that archivers like to include
+    if base.startswith('.') or '__MACOSX' in name:
+        return False
+    return os.path.splitext(base)[1].lower() in IMPORT_EXTENSIONS
+
+
+def _guess_mime(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+@contextmanager
+def zip_items(source: Union[str, BinaryIO]) -> Iterator[List[Dict]]:
+    """Pipeline items for every media member of a ZIP; each opens as a decompressing stream
+
+    The archive stays open for the duration of the with block and is closed on leaving it.
+    """
+    archive = zipfile.ZipFile(source)
+    try:
+        items = []
+        for info in archive.infolist():
+            if info.is_dir() or not _is_media(info.filename):
+                continue
+            items.append({
+                'name': info.filename,
+                'mime': _guess_mime(info.filename),
+                # ZipFile serialises reads on its shared handle, so members can be opened from worker threads
+                'open': lambda info=info: archive.open(info),
+                'source_size': info.file_size,
+            })
+        yield items
+    finally:
+        archive.close()
+
+
+def _walk(root: str) -> Iterator[os.DirEntry]:
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                # Symlinked files are skipped like symlinked directories, so a walk stays inside its root
+                elif entry.is_file(follow_symlinks=False) and _is_media(entry.name):
+                    yield entry
+
+
+def directory_items(root: str) -> List[Dict]:
+    """Pipeline items for every media file under a directory tree"""
+    items = []
+    for entry in _walk(root):
+        items.append({
+            'name': os.path.relpath(entry.path, root),
+            'mime': _guess_mime(entry.name),
+            'open': lambda path=entry.path: open(path, 'rb'),
+            'source_size': entry.stat().st_size,
+        })
+    return items
+
+
+def resolve_import_path(path: str, root: Optional[str] = IMPORT_ROOT) -> str:
+    """Absolute path of a server-side dataset, which must lie below the import root"""
+    if not root:
+        raise ValueError("Importing from server paths is disabled; set FLYSCOPE_IMPORT_ROOT to allow it")
+    root = os.path.realpath(root)
+    # Relative paths are taken from the root; symlinks and '..' are resolved before the check
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"{path} is outside the import root {root}")
+    return resolved
+
+
+@contextmanager
+def items_for_source(source: Union[str, BinaryIO]) -> Iterator[List[Dict]]:
+    """Items for a ZIP or directory below the import root, or for an uploaded ZIP file object"""
+    if isinstance(source, str):
+        source = resolve_import_path(source)
+        if os.path.isdir(source):
+            yield directory_items(source)
+            return
+        if not zipfile.is_zipfile(source):
+            raise ValueError(f"{source} is neither a directory nor a ZIP archive")
+    with zip_items(source) as items:
+        yield items
+
+
+# Streamlit helpers
+
+def run_dataset_import(source: Union[str, BinaryIO]) -> int:
+    """Import a dataset into the media store and this session's analysis queue"""
+    with items_for_source(source) as items:
+        if not items:
+            st.warning("No supported media files found in the dataset.")
+            return 0
+        ok, message = check_session_quota(current_session_id(), sum(item['source_size'] for item in items))
+        if not ok:
+            st.error(message)
+            return 0
+        st.write(f"Importing {len(items)} file(s)...")
+        imported = 0
+        for item in run_ingest_with_progress(items):
+            if 'error' not in item and add_to_session(item['record'], item['name']):
+                imported += 1
+        return imported
@@ -0,0 +1,158 @@
+from typing import Callable, Dict, List, Optional
+import numpy as np
+
+from detectors import defect_info
+
+# Cross-frame association for video keyframes. A defect that stays in view is reported once,
+# as a track, instead of once per sampled frame. Only open tracks are held in memory; a track
+# is closed and handed on as soon as it has gone unmatched for a few keyframes, so memory
+# depends on how many defects are in view at once, not on the length of the video.
+TRACK_IOU = 0.3
+# A detection whose centre is this share of the track box diagonal from the track's centre still
+# continues it, for keyframes far enough apart that the boxes no longer overlap
+TRACK_CENTROID = 0.5
+# Keyframes a track may go unmatched (a missed detection, brief occlusion) before it is closed
+TRACK_MAX_GAP = 2
+# Longest side of the best-frame crop kept per track
+CROP_SIZE = 160
+
+TrackFn = Callable[[Dict, Optional[np.ndarray]], None]
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Dense (len(a), len(b)) IoU; open tracks and one frame's detections are only a handful each"""
+    iw = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    ih = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def centroid_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Centre distance of every pair, in units of the diagonal of the box from `a`"""
+    ca = (a[:, :2] + a[:, 2:]) / 2.0
+    cb = (b[:, :2] + b[:, 2:]) / 2.0
+    diag = np.hypot(a[:, 2] - a[:, 0], a[:, 3] - a[:, 1])
+    return np.hypot(ca[:, None, 0] - cb[None, :, 0], ca[:, None, 1] - cb[None, :, 1]) / np.maximum(diag[:, None], 1e-9)
+
+
+def _crop(frame: np.ndarray, bbox: List[int]) -> np.ndarray:
+    x1, y1, x2, y2 = (max(0, int(v)) for v in bbox)
+    region = frame[y1:y2, x1:x2]
+    # Strided decimation is enough for a preview and keeps only a small copy
+    step = max(1, -(-max(region.shape[:2]) // CROP_SIZE))
+    return region[::step, ::step].copy()
+
+
+class DefectTracker:
+    """Greedy per-model association of keyframe detections into tracks, by IoU or centroid distance"""
+
+    def __init__(self, iou_threshold: float = TRACK_IOU, centroid_threshold: float = TRACK_CENTROID,
+                 max_gap: int = TRACK_MAX_GAP, on_track: Optional[TrackFn] = None):
+        self.iou_threshold = iou_threshold
+        self.centroid_threshold = centroid_threshold
+        self.max_gap = max_gap
+        # Receives each closed track and its best-frame crop; the crop is not kept afterwards
+        self.on_track = on_track
+        self.open: List[Dict] = []
+        self.closed: List[Dict] = []
+        self.keyframes = 0
+        self.detections = 0
+        self._next_id = 0
+
+    def _start(self, det: Dict, frame_index: int, timestamp: float, frame: Optional[np.ndarray]) -> Dict:
+        track = {
+            'track_id': self._next_id,
+            'model': det['model'],
+            'det': det,
+            'bbox': det['bbox'],
+            'first_frame': frame_index,
+            'first_timestamp': timestamp,
+            'frames': 0,
+            'crop': None,
+        }
+        self._next_id += 1
+        self._extend(track, det, frame_index, timestamp, frame, best=True)
+        return track
+
+    def _extend(self, track: Dict, det: Dict, frame_index: int, timestamp: float,
+                frame: Optional[np.ndarray], best: bool = False):
+        track['bbox'] = det['bbox']
+        track['last_frame'] = frame_index
+        track['last_timestamp'] = timestamp
+        track['last_keyframe'] = self.keyframes
+        track['frames'] += 1
+        if best or det['confidence'] > track['det']['confidence']:
+            track['det'] = det
+            track['best_frame'] = frame_index
+            track['best_timestamp'] = timestamp
+            if frame is not None:
+                track['crop'] = _crop(frame, det['bbox'])
+
+    def update(self, frame_index: int, timestamp: float, detections: List[Dict],
+               frame: Optional[np.ndarray] = None):
+        """Associate one keyframe's detections with the open tracks, then close tracks that went stale"""
+        self.keyframes += 1
+        self.detections += len(detections)
+        for model in {det['model'] for det in detections}:
+            dets = [det for det in detections if det['model'] == model]
+            tracks = [track for track in self.open if track['model'] == model]
+            matched_dets = set()
+            if tracks:
+                track_boxes = np.array([t['bbox'] for t in tracks], dtype=np.float64)
+                det_boxes = np.array([d['bbox'] for d in dets], dtype=np.float64)
+                iou = box_iou(track_boxes, det_boxes)
+                dist = centroid_distance(track_boxes, det_boxes)
+                eligible = (iou >= self.iou_threshold) | (dist <= self.centroid_threshold)
+                # Overlap first; among non-overlapping candidates the nearer centre wins
+                priority = np.where(eligible, iou + (1.0 - np.minimum(dist, 1.0)) * 1e-3, -1.0)
+                matched_tracks = set()
+                for flat in np.argsort(-priority, axis=None):
+                    t, d = divmod(int(flat), len(dets))
+                    if priority[t, d] < 0:
+                        break
+                    if t in matched_tracks or d in matched_dets:
+                        continue
+                    matched_tracks.add(t)
+                    matched_dets.add(d)
+                    self._extend(tracks[t], dets[d], frame_index, timestamp, frame)
+            for d, det in enumerate(dets):
+                if d not in matched_dets:
+                    self.open.append(self._start(det, frame_index, timestamp, frame))
+        stale = [t for t in self.open if self.keyframes - t['last_keyframe'] > self.max_gap]
+        if stale:
+            self.open = [t for t in self.open if self.keyframes - t['last_keyframe'] <= self.max_gap]
+            for track in stale:
+                self._close(track)
+
+    def _close(self, track: Dict):
+        det = dict(track['det'])
+        det.update({
+            'track_id': track['track_id'],
+            'first_frame': track['first_frame'],
+            'last_frame': track['last_frame'],
+            'first_timestamp': round(track['first_timestamp'], 3),
+            'last_timestamp': round(track['last_timestamp'], 3),
+            'track_frames': track['frames'],
+            # The track is reported at its most confident sighting
+            'frame_index': track['best_frame'],
+            'timestamp': round(track['best_timestamp'], 3),
+            'severity': defect_info(det['model'], det['confidence'])['severity'],
+        })
+        if self.on_track:
+            self.on_track(det, track['crop'])
+        self.closed.append(det)
+
+    def finish(self) -> List[Dict]:
+        """Close every open track; returns all tracks in the order they started"""
+        for track in self.open:
+            self._close(track)
+        self.open = []
+        return sorted(self.closed, key=lambda det: det['track_id'])
+
+    def stats(self) -> Dict:
+        return {
+            'raw_detections': self.detections,
+            'tracks': len(self.closed) + len(self.open),
+        }
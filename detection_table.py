@@ -0,0 +1,136 @@
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Columnar view of analysis results: one row per detection in a NumPy structured array, with
+# strings stored once as category codes. Built in a single pass over the nested results, after
+# which KPIs, filters and exports are array operations rather than loops over dicts.
+SEVERITIES = ('Low', 'Medium', 'High', 'Critical')
+SEVERITY_CODES = {name: code for code, name in enumerate(SEVERITIES)}
+
+DETECTION_DTYPE = np.dtype([
+    ('file', np.int32),         # index into DetectionTable.files
+    ('model', np.int16),        # index into DetectionTable.models
+    ('cls', np.int16),          # defect type, index into DetectionTable.classes
+    ('confidence', np.float64),
+    ('bbox', np.int32, (4,)),   # x1, y1, x2, y2 in source pixels
+    ('severity', np.int8),      # index into SEVERITIES
+    ('lat', np.float64),        # NaN without a GPS fix
+    ('lon', np.float64),
+    ('altitude', np.float64),
+])
+
+
+class DetectionTable:
+    """Detections of a set of analysis results as typed columns; per-file fields live in `files`"""
+
+    def __init__(self, rows: np.ndarray, files: pd.DataFrame, models: Sequence[str],
+                 classes: Sequence[str], descriptions: Sequence[str]):
+        self.rows = rows
+        self.files = files
+        self.models = list(models)
+        self.classes = list(classes)
+        self.descriptions = list(descriptions)
+
+    @classmethod
+    def from_results(cls, results: Sequence[Dict]) -> 'DetectionTable':
+        models, classes, descriptions = {}, {}, []
+        rows = []
+        for index, result in enumerate(results):
+            geo = result.get('geo') or {}
+            lat, lon = geo.get('lat', np.nan), geo.get('lon', np.nan)
+            altitude = geo.get('relative_altitude', geo.get('altitude', np.nan))
+            for det in result['detections']:
+                model = models.setdefault(det['model'], len(models))
+                if det['defect_type'] not in classes:
+                    classes[det['defect_type']] = len(classes)
+                    descriptions.append(det.get('description', ''))
+                rows.append((
+                    index, model, classes[det['defect_type']], det['confidence'], det['bbox'],
+                    SEVERITY_CODES.get(det['severity'], SEVERITY_CODES['Medium']), lat, lon, altitude,
+                ))
+        files = pd.DataFrame({
+            'name': [r['file_name'] for r in results],
+            'path': [r['file_path'] for r in results],
+            'sha256': [r.get('sha256') for r in results],
+            'analysis_time': pd.to_datetime([r.get('analysis_time') for r in results]),
+        })
+        return cls(np.array(rows, dtype=DETECTION_DTYPE), files, models, classes, descriptions)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def n_files(self) -> int:
+        return len(self.files)
+
+    def select(self, mask: np.ndarray) -> 'DetectionTable':
+        """The rows where mask is true; files and categories are shared with this table"""
+        return DetectionTable(self.rows[mask], self.files, self.models, self.classes, self.descriptions)
+
+    def where(self, models: Optional[Sequence[str]] = None, severities: Optional[Sequence[str]] = None,
+              min_confidence: Optional[float] = None, geotagged: Optional[bool] = None) -> 'DetectionTable':
+        mask = np.ones(len(self.rows), dtype=bool)
+        if models is not None:
+            mask &= np.isin(self.rows['model'], [self.models.index(m) for m in models if m in self.models])
+        if severities is not None:
+            mask &= np.isin(self.rows['severity'], [SEVERITY_CODES[s] for s in severities])
+        if min_confidence is not None:
+            mask &= self.rows['confidence'] >= min_confidence
+        if geotagged is not None:
+            mask &= self.geotagged() == geotagged
+        return self.select(mask)
+
+    def geotagged(self) -> np.ndarray:
+        return ~np.isnan(self.rows['lat'])
+
+    def counts_per_file(self) -> np.ndarray:
+        return np.bincount(self.rows['file'], minlength=self.n_files)
+
+    def files_with_detections(self) -> int:
+        return int(np.count_nonzero(self.counts_per_file()))
+
+    def mean_confidence(self) -> float:
+        return float(self.rows['confidence'].mean()) if len(self.rows) else 0.0
+
+    def severity_counts(self) -> Dict[str, int]:
+        """Most severe first, every level present"""
+        counts = np.bincount(self.rows['severity'], minlength=len(SEVERITIES))
+        return {name: int(counts[code]) for code, name in reversed(list(enumerate(SEVERITIES)))}
+
+    def class_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.rows['cls'], minlength=len(self.classes))
+        return {name: int(count) for name, count in zip(self.classes, counts) if count}
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per detection with readable columns, strings rebuilt from codes"""
+        rows = self.rows
+        return pd.DataFrame({
+            'File': self.files['name'].to_numpy()[rows['file']],
+            'Defect Type': pd.Categorical.from_codes(rows['cls'], self.classes),
+            'Confidence': rows['confidence'],
+            'Severity': pd.Categorical.from_codes(rows['severity'], SEVERITIES, ordered=True),
+            'Model': pd.Categorical.from_codes(rows['model'], self.models),
+            'x1': rows['bbox'][:, 0], 'y1': rows['bbox'][:, 1], 'x2': rows['bbox'][:, 2], 'y2': rows['bbox'][:, 3],
+            'Latitude': rows['lat'], 'Longitude': rows['lon'], 'Altitude': rows['altitude'],
+        })
+
+    def file_ranges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(order, starts): rows grouped by file are rows[order[starts[f]:starts[f + 1]]]"""
+        order = np.argsort(self.rows['file'], kind='stable')
+        starts = np.searchsorted(self.rows['file'][order], np.arange(self.n_files + 1))
+        return order, starts
+
+
+# Streamlit helpers
+
+def session_detection_table() -> DetectionTable:
+    """Table for analysis_results, rebuilt only when a new results list has been stored"""
+    results = st.session_state.get('analysis_results', [])
+    cached = st.session_state.get('detection_table')
+    # Results are replaced, never mutated in place, so identity tells whether they changed
+    if cached is None or cached[0] is not results:
+        cached = (results, DetectionTable.from_results(results))
+        st.session_state.detection_table = cached
+    return cached[1]
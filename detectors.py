@@ -0,0 +1,233 @@
+from typing import Callable, Dict, List, Optional, Tuple, Type
+import numpy as np
+
+from gating import textured
+
+# Detector registry: every model is registered per backend, so a GPU/ONNX backend can be
+# dropped in next to the NumPy reference implementation without touching the UI.
+DEFAULT_BACKEND = 'numpy'
+MODEL_INPUT_SIZE = 512
+# The NumPy backend scores square cells of the model input and reports the strongest ones
+CELL_SIZE = 32
+MAX_DETECTIONS_PER_MODEL = 5
+
+SENSITIVITY_GAIN = {'Low': 0.85, 'Medium': 1.0, 'High': 1.2}
+
+DEFECT_INFO = {
+    "Crack Detection": {
+        'type': 'Structural Crack',
+        'description': 'Crack detected in structural surface',
+        'severity': lambda c: 'High' if c > 0.8 else 'Medium',
+    },
+    "Corrosion Detection": {
+        'type': 'Metal Corrosion',
+        'description': 'Rust or corrosion detected on metal surface',
+        'severity': lambda c: 'Critical' if c > 0.9 else 'High',
+    },
+    "Thermal Anomaly": {
+        'type': 'Thermal Hotspot',
+        'description': 'Abnormal temperature detected',
+        'severity': lambda c: 'Critical' if c > 0.85 else 'Medium',
+    },
+    "Vegetation Risk": {
+        'type': 'Vegetation Growth',
+        'description': 'Vegetation encroachment detected',
+        'severity': lambda c: 'Medium' if c > 0.7 else 'Low',
+    },
+    "Structural Damage": {
+        'type': 'Structural Defect',
+        'description': 'General structural damage detected',
+        'severity': lambda c: 'High' if c > 0.8 else 'Medium',
+    },
+}
+
+_REGISTRY: Dict[Tuple[str, str], Type['Detector']] = {}
+
+
+def defect_info(model_name: str, confidence: float) -> Dict:
+    """Defect type, description and severity for a model's detection at a given confidence"""
+    info = DEFECT_INFO.get(model_name)
+    if info is None:
+        return {'type': 'Unknown Defect', 'description': 'Unspecified defect detected', 'severity': 'Medium'}
+    return {'type': info['type'], 'description': info['description'], 'severity': info['severity'](confidence)}
+
+
+def register_detector(model_name: str, backend: str = DEFAULT_BACKEND) -> Callable:
+    """Class decorator adding a detector implementation to the registry"""
+    def decorator(cls):
+        cls.name = model_name
+        cls.backend = backend
+        _REGISTRY[(model_name, backend)] = cls
+        return cls
+    return decorator
+
+
+def available_models(backend: str = DEFAULT_BACKEND) -> List[str]:
+    return [name for name, b in _REGISTRY if b == backend]
+
+
+def create_detector(model_name: str, backend: str = DEFAULT_BACKEND) -> 'Detector':
+    try:
+        return _REGISTRY[(model_name, backend)]()
+    except KeyError:
+        raise ValueError(f"No {backend} detector registered for {model_name}") from None
+
+
+def model_version(model_name: str, backend: str = DEFAULT_BACKEND) -> str:
+    """Version of a registered detector without instantiating it; cached results carry it"""
+    try:
+        return _REGISTRY[(model_name, backend)].version
+    except KeyError:
+        raise ValueError(f"No {backend} detector registered for {model_name}") from None
+
+
+class Detector:
+    """A model that scores a whole batch of preprocessed images in one call; the batch is read-only and shared"""
+
+    name = ''
+    backend = ''
+    version = '1.0'
+    input_size = MODEL_INPUT_SIZE
+
+    def load(self):
+        """Read weights; the model pool calls this once, before the first batch"""
+
+    def unload(self):
+        """Release weights when the model pool evicts this model"""
+
+    def memory_bytes(self) -> int:
+        """Resident size once loaded, counted against the model pool's budget"""
+        return sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray))
+
+    def gate(self, features: Dict[str, np.ndarray]) -> Optional[np.ndarray]:
+        """(N,) mask of the images worth running on, from gating.frame_features; None runs on all"""
+        return None
+
+    def detect_batch(self, batch: np.ndarray, confidence_threshold: float,
+                     sensitivity: str = 'Medium') -> List[List[Dict]]:
+        """batch is (N, 3, S, S) planar RGB float32 in 0..1; returns per-image detections with boxes in batch pixels"""
+        raise NotImplementedError
+
+    def _detection(self, confidence: float, bbox: List[int]) -> Dict:
+        info = defect_info(self.name, confidence)
+        return {
+            'model': self.name,
+            'defect_type': info['type'],
+            'confidence': confidence,
+            'bbox': bbox,
+            'severity': info['severity'],
+            'description': info['description'],
+        }
+
+
+def _pool(values: np.ndarray, cell: int) -> np.ndarray:
+    """Mean over non-overlapping cell x cell blocks of an (N, S, S) array"""
+    n, h, w = values.shape
+    return values.reshape(n, h // cell, cell, w // cell, cell).mean(axis=(2, 4))
+
+
+class NumpyDetector(Detector):
+    """CPU reference backend: hand-built colour/texture cues, vectorised over the whole batch"""
+
+    def cell_scores(self, rgb: np.ndarray) -> np.ndarray:
+        """(N, 3, S, S) float32 in 0..1 -> (N, G, G) scores in 0..1"""
+        raise NotImplementedError
+
+    def detect_batch(self, batch, confidence_threshold, sensitivity='Medium'):
+        scores = np.clip(self.cell_scores(batch) * SENSITIVITY_GAIN.get(sensitivity, 1.0), 0.0, 0.99)
+        n, grid_h, grid_w = scores.shape
+        flat = scores.reshape(n, -1)
+        k = min(MAX_DETECTIONS_PER_MODEL, flat.shape[1])
+        # Strongest k cells per image, then the threshold, all in one pass over the batch
+        top = np.argpartition(-flat, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(flat, top, axis=1)
+        keep = top_scores >= confidence_threshold
+        results = [[] for _ in range(n)]
+        for i, j in zip(*np.nonzero(keep)):
+            cell = int(top[i, j])
+            cy, cx = divmod(cell, grid_w)
+            bbox = [cx * CELL_SIZE, cy * CELL_SIZE, (cx + 1) * CELL_SIZE, (cy + 1) * CELL_SIZE]
+            results[i].append(self._detection(float(top_scores[i, j]), bbox))
+        return results
+
+
+def _luma(rgb: np.ndarray) -> np.ndarray:
+    return 0.299 * rgb[:, 0] + 0.587 * rgb[:, 1] + 0.114 * rgb[:, 2]
+
+
+@register_detector("Crack Detection")
+class CrackDetector(NumpyDetector):
+    """Dark, high-gradient lines: the strongest row or column of dark edges in each cell"""
+
+    # Hairline cracks need twice the resolution of the colour cues
+    input_size = MODEL_INPUT_SIZE * 2
+
+    def gate(self, features):
+        return textured(features)
+
+    def cell_scores(self, rgb):
+        luma = _luma(rgb)
+        grad = np.zeros_like(luma)
+        grad[:, :, 1:] += np.abs(np.diff(luma, axis=2))
+        grad[:, 1:, :] += np.abs(np.diff(luma, axis=1))
+        dark_edges = grad * (luma < 0.45)
+        n, h, w = dark_edges.shape
+        cells = dark_edges.reshape(n, h // CELL_SIZE, CELL_SIZE, w // CELL_SIZE, CELL_SIZE)
+        # A line crossing a cell fills one row (or column) of it, however thin it is
+        rows = cells.mean(axis=4).max(axis=2)
+        cols = cells.mean(axis=2).max(axis=3)
+        return np.maximum(rows, cols) * 2.0
+
+
+@register_detector("Corrosion Detection")
+class CorrosionDetector(NumpyDetector):
+    """Share of rust-coloured pixels: red over green over blue"""
+
+    def gate(self, features):
+        return features['rust_share'] > 0
+
+    def cell_scores(self, rgb):
+        r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+        rust = (r > 0.3) & (r > g * 1.15) & (g > b)
+        return _pool(rust.astype(np.float32) * (r - b), CELL_SIZE) * 3.0
+
+
+@register_detector("Thermal Anomaly")
+class ThermalDetector(NumpyDetector):
+    """Saturated hot-palette pixels well above the frame's own brightness"""
+
+    def gate(self, features):
+        # A plain RGB frame has no hot-palette pixels at all
+        return features['hot_share'] > 0
+
+    def cell_scores(self, rgb):
+        luma = _luma(rgb)
+        frame_mean = luma.mean(axis=(1, 2), keepdims=True)
+        hot = (rgb[:, 0] > 0.85) & (luma > frame_mean + 0.25)
+        return _pool(hot.astype(np.float32), CELL_SIZE) * 2.0
+
+
+@register_detector("Vegetation Risk")
+class VegetationDetector(NumpyDetector):
+    """Excess-green index"""
+
+    def gate(self, features):
+        return features['green_share'] > 0
+
+    def cell_scores(self, rgb):
+        exg = 2.0 * rgb[:, 1] - rgb[:, 0] - rgb[:, 2]
+        return _pool(np.maximum(exg, 0.0), CELL_SIZE) * 3.0
+
+
+@register_detector("Structural Damage")
+class StructuralDetector(NumpyDetector):
+    """Local contrast: luminance standard deviation per cell"""
+
+    def gate(self, features):
+        return textured(features)
+
+    def cell_scores(self, rgb):
+        luma = _luma(rgb)
+        mean = _pool(luma, CELL_SIZE)
+        var = _pool(luma * luma, CELL_SIZE) - mean * mean
+        return np.sqrt(np.maximum(var, 0.0)) * 4.0
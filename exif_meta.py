@@ -0,0 +1,268 @@
+import io
+import re
+import struct
+from datetime import datetime
+from typing import BinaryIO, Dict, List, Optional
+
+# Header-only metadata parser: walks JPEG marker segments / TIFF IFDs and stops before
+# any entropy-coded pixel data, so a whole mission costs milliseconds per file.
+
+# TIFF field types -> (struct code, size in bytes)
+TIFF_TYPES = {
+    1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('I', 4), 5: ('II', 8), 6: ('b', 1),
+    7: ('s', 1), 8: ('h', 2), 9: ('i', 4), 10: ('ii', 8), 11: ('f', 4), 12: ('d', 8),
+    16: ('Q', 8), 17: ('q', 8), 18: ('Q', 8),
+}
+
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_GPS_IFD = 0x8825
+TAG_DATETIME_ORIGINAL = 0x9003
+
+GPS_LAT_REF = 1
+GPS_LAT = 2
+GPS_LON_REF = 3
+GPS_LON = 4
+GPS_ALT_REF = 5
+GPS_ALT = 6
+
+XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+EXIF_HEADER = b'Exif\x00\x00'
+
+# drone-dji XMP fields -> metadata keys (DJI firmware spells "Longtitude" on some models)
+DJI_XMP_FIELDS = {
+    'GpsLatitude': 'lat',
+    'GpsLongitude': 'lon',
+    'GpsLongtitude': 'lon',
+    'AbsoluteAltitude': 'altitude',
+    'RelativeAltitude': 'relative_altitude',
+    'GimbalPitchDegree': 'gimbal_pitch',
+    'GimbalYawDegree': 'gimbal_yaw',
+    'GimbalRollDegree': 'gimbal_roll',
+    'FlightPitchDegree': 'flight_pitch',
+    'FlightYawDegree': 'flight_yaw',
+    'FlightRollDegree': 'flight_roll',
+}
+_XMP_ATTR = re.compile(rb'drone-dji:(\w+)\s*=\s*"([^"]*)"')
+_XMP_ELEM = re.compile(rb'<drone-dji:(\w+)>([^<]*)</drone-dji:\1>')
+
+
+class TiffReader:
+    """Reads IFD entries from a TIFF stream (classic or BigTIFF) by seeking, never loading strips"""
+
+    def __init__(self, fh: BinaryIO, base: int = 0):
+        self.fh = fh
+        self.base = base
+        fh.seek(base)
+        head = fh.read(16)
+        self.endian = '<' if head[:2] == b'II' else '>'
+        magic = struct.unpack(self.endian + 'H', head[2:4])[0]
+        self.big = magic == 43
+        if self.big:
+            self.first_ifd = struct.unpack(self.endian + 'Q', head[8:16])[0]
+        elif magic == 42:
+            self.first_ifd = struct.unpack(self.endian + 'I', head[4:8])[0]
+        else:
+            raise ValueError("Not a TIFF stream")
+
+    def _read(self, offset: int, size: int) -> bytes:
+        self.fh.seek(self.base + offset)
+        return self.fh.read(size)
+
+    def _value(self, ftype: int, count: int, raw: bytes):
+        if ftype not in TIFF_TYPES:
+            return None
+        code, size = TIFF_TYPES[ftype]
+        if ftype in (2, 7):
+            return raw[:count].rstrip(b'\x00') if ftype == 2 else raw[:count]
+        if ftype in (5, 10):
+            nums = struct.unpack(f"{self.endian}{code[0] * 2 * count}", raw[:size * count])
+            values = [n / d if d else 0.0 for n, d in zip(nums[::2], nums[1::2])]
+        else:
+            values = list(struct.unpack(f"{self.endian}{code * count}", raw[:size * count]))
+        return values[0] if count == 1 else values
+
+    def read_ifd(self, offset: int) -> Dict[int, object]:
+        """Tag -> value for one IFD; out-of-line values are fetched with a single seek each"""
+        count_fmt, entry_size, inline = ('Q', 20, 8) if self.big else ('H', 12, 4)
+        count_size = 8 if self.big else 2
+        n = struct.unpack(self.endian + count_fmt, self._read(offset, count_size))[0]
+        block = self._read(offset + count_size, n * entry_size)
+        tags = {}
+        for i in range(n):
+            entry = block[i * entry_size:(i + 1) * entry_size]
+            if self.big:
+                tag, ftype, count = struct.unpack(self.endian + 'HHQ', entry[:12])
+                payload = entry[12:20]
+            else:
+                tag, ftype, count = struct.unpack(self.endian + 'HHI', entry[:8])
+                payload = entry[8:12]
+            if ftype not in TIFF_TYPES:
+                continue
+            length = TIFF_TYPES[ftype][1] * count
+            if length > inline:
+                ptr = struct.unpack(self.endian + ('Q' if self.big else 'I'), payload)[0]
+                raw = self._read(ptr, length)
+            else:
+                raw = payload
+            tags[tag] = self._value(ftype, count, raw)
+        return tags
+
+    def ifd_offsets(self) -> List[int]:
+        """Offsets of every top-level IFD (one per page / overview level)"""
+        offsets = []
+        offset = self.first_ifd
+        count_fmt, entry_size, count_size, ptr_fmt = ('Q', 20, 8, 'Q') if self.big else ('H', 12, 2, 'I')
+        while offset and offset not in offsets:
+            offsets.append(offset)
+            n = struct.unpack(self.endian + count_fmt, self._read(offset, count_size))[0]
+            ptr_size = struct.calcsize(ptr_fmt)
+            offset = struct.unpack(self.endian + ptr_fmt, self._read(offset + count_size + n * entry_size, ptr_size))[0]
+        return offsets
+
+
+def _text(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace').strip() or None
+    return None
+
+
+def _dms(value) -> Optional[float]:
+    if isinstance(value, list) and len(value) == 3:
+        return value[0] + value[1] / 60.0 + value[2] / 3600.0
+    return None
+
+
+def _timestamp(value) -> Optional[str]:
+    text = _text(value)
+    if not text:
+        return None
+    try:
+        return datetime.strptime(text, '%Y:%m:%d %H:%M:%S').isoformat()
+    except ValueError:
+        return None
+
+
+def parse_exif(reader: TiffReader) -> Dict:
+    """Camera, timestamp and GPS fields from IFD0 and its EXIF/GPS sub-IFDs"""
+    meta = {}
+    ifd0 = reader.read_ifd(reader.first_ifd)
+    meta['make'] = _text(ifd0.get(TAG_MAKE))
+    meta['model'] = _text(ifd0.get(TAG_MODEL))
+    meta['timestamp'] = _timestamp(ifd0.get(TAG_DATETIME))
+    if TAG_EXIF_IFD in ifd0:
+        exif = reader.read_ifd(ifd0[TAG_EXIF_IFD])
+        meta['timestamp'] = _timestamp(exif.get(TAG_DATETIME_ORIGINAL)) or meta['timestamp']
+    if TAG_GPS_IFD in ifd0:
+        gps = reader.read_ifd(ifd0[TAG_GPS_IFD])
+        lat, lon = _dms(gps.get(GPS_LAT)), _dms(gps.get(GPS_LON))
+        if lat is not None and lon is not None:
+            if _text(gps.get(GPS_LAT_REF)) == 'S':
+                lat = -lat
+            if _text(gps.get(GPS_LON_REF)) == 'W':
+                lon = -lon
+            meta['lat'], meta['lon'] = lat, lon
+        if isinstance(gps.get(GPS_ALT), float):
+            meta['altitude'] = -gps[GPS_ALT] if gps.get(GPS_ALT_REF) == 1 else gps[GPS_ALT]
+    return {k: v for k, v in meta.items() if v is not None}
+
+
+def parse_dji_xmp(packet: bytes) -> Dict:
+    """drone-dji:* fields, written either as attributes or as elements"""
+    meta = {}
+    for field, value in _XMP_ATTR.findall(packet) + _XMP_ELEM.findall(packet):
+        key = DJI_XMP_FIELDS.get(field.decode('ascii'))
+        if key:
+            try:
+                meta[key] = float(value)
+            except ValueError:
+                pass
+    return meta
+
+
+def read_jpeg_header(fh: BinaryIO) -> Dict:
+    """Walk JPEG markers up to start-of-scan; pixel data is never read"""
+    header = {'format': 'JPEG'}
+    exif, xmp = {}, {}
+    if fh.read(2) != b'\xff\xd8':
+        raise ValueError("Not a JPEG stream")
+    while True:
+        marker = fh.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            break
+        code = marker[1]
+        if code == 0xFF:
+            # Fill byte; step back one so the next read starts on the marker
+            fh.seek(-1, io.SEEK_CUR)
+            continue
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue
+        if code in (0xDA, 0xD9):
+            break
+        length = struct.unpack('>H', fh.read(2))[0]
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            sof = fh.read(5)
+            header['height'], header['width'] = struct.unpack('>HH', sof[1:5])
+            fh.seek(length - 2 - 5, io.SEEK_CUR)
+            # Frame header is the last thing we need before the scan
+            break
+        if code == 0xE1:
+            segment = fh.read(length - 2)
+            if segment.startswith(EXIF_HEADER):
+                try:
+                    exif = parse_exif(TiffReader(io.BytesIO(segment[len(EXIF_HEADER):])))
+                except (ValueError, struct.error):
+                    exif = {}
+            elif segment.startswith(XMP_HEADER):
+                xmp = parse_dji_xmp(segment[len(XMP_HEADER):])
+            continue
+        fh.seek(length - 2, io.SEEK_CUR)
+    # XMP carries the RTK-corrected position and gimbal angles on DJI aircraft, so it wins
+    exif.update(xmp)
+    header['exif'] = exif
+    return header
+
+
+def read_png_header(fh: BinaryIO) -> Dict:
+    head = fh.read(24)
+    width, height = struct.unpack('>II', head[16:24])
+    return {'format': 'PNG', 'width': width, 'height': height, 'exif': {}}
+
+
+def read_tiff_header(fh: BinaryIO) -> Dict:
+    reader = TiffReader(fh)
+    ifd0 = reader.read_ifd(reader.first_ifd)
+    header = {'format': 'TIFF', 'width': ifd0.get(256), 'height': ifd0.get(257)}
+    try:
+        header['exif'] = parse_exif(reader)
+    except (ValueError, struct.error):
+        header['exif'] = {}
+    return header
+
+
+def read_header(path: str) -> Optional[Dict]:
+    """Dimensions plus EXIF/XMP GPS, altitude, gimbal and timestamp fields, from the header only"""
+    with open(path, 'rb') as fh:
+        magic = fh.read(8)
+        fh.seek(0)
+        try:
+            if magic.startswith(b'\xff\xd8'):
+                return read_jpeg_header(fh)
+            if magic.startswith(b'\x89PNG'):
+                return read_png_header(fh)
+            if magic[:4] in (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+'):
+                return read_tiff_header(fh)
+        except (ValueError, struct.error):
+            return None
+    return None
+
+
+def geo_from_meta(meta: Dict) -> Optional[Dict]:
+    """Position/attitude fields worth carrying onto analysis results, or None without a GPS fix"""
+    exif = meta.get('exif') or {}
+    if 'lat' not in exif or 'lon' not in exif:
+        return None
+    keys = ('lat', 'lon', 'altitude', 'relative_altitude', 'gimbal_pitch', 'gimbal_yaw', 'timestamp')
+    return {k: exif[k] for k in keys if k in exif}
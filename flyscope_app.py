@@ -10,15 +10,34 @@ import plotly.graph_objects as go
 from datetime import datetime
 import io
 import base64
-import tempfile
 import os
-import random
 from folium.plugins import MarkerCluster, HeatMap
 import zipfile
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
-from reportlab.lib.styles import getSampleStyleSheet
+from media_store import put_bytes, add_to_session, remove_from_session, session_media_index, current_session_id, clear_session_media
+from storage_manager import check_session_quota, track_session, store_usage, sweep, GLOBAL_QUOTA_BYTES, GB
+from thumbnails import get_thumbnail
+from quality import compute_quality_batch, quality_caption
+from ingest_pipeline import item_from_upload, run_ingest_with_progress
+from exif_meta import geo_from_meta
+from workload import SyntheticWorkload, ingest_workload, DEFAULT_DETECTIONS, DEFAULT_SEED
+from dataset_import import IMPORT_ROOT, run_dataset_import
+from analysis_runner import settings_from_session, pending_media, live_detector
+from inference_engine import format_engine_stats, format_stage_timings
+from result_cache import format_cache_stats
+from model_pool import format_pool_stats
+from gating import format_gating_stats
+from near_duplicates import DEFAULT_HAMMING, MAX_HAMMING, format_duplicate_stats, duplicate_caption
+from detection_table import session_detection_table
+from analysis_plans import ANALYSIS_PLANS, format_latency_stats
+from live_feed import (
+    LIVE_BUFFER_SIZE, LIVE_REFRESH, annotate, format_live_stats,
+    live_session, open_stream, replay_source, start_live_session, stop_live_session,
+)
+from reports import build_pdf_report, detections_csv, fault_locations
+from analysis_jobs import (
+    start_analysis_job, active_job_id, collect_finished_job, get_job, cancel_job,
+    POLL_INTERVAL, QUEUED, DONE, CANCELLED, FINISHED,
+)
 
 # All page functions are now included in this file
 
@@ -62,6 +81,10 @@ def apply_theme():
 
 def main():
     apply_theme()
+    # Keeps this session's media references alive and runs the store sweeper
+    track_session()
+    # Results of a background analysis job land in this session whichever page is open
+    collect_finished_job()
     st.markdown('<h1 class="main-header">🚁 FLYSCOPE</h1>', unsafe_allow_html=True)
     st.markdown('<p style="text-align: center; font-size: 1.2rem; color: #7f8c8d;">AI-Powered Drone Inspection System for Safer Infrastructure Monitoring</p>', unsafe_allow_html=True)
     
@@ -103,13 +126,11 @@ def show_home_page():
     # KPI metrics
     k1, k2, k3, k4 = st.columns(4)
     total_uploads = len(st.session_state.get('uploaded_media', []))
-    total_results = len(st.session_state.get('analysis_results', []))
-    total_detections = sum(len(r['detections']) for r in st.session_state.get('analysis_results', []))
-    critical = sum(1 for r in st.session_state.get('analysis_results', []) for d in r['detections'] if d.get('severity') == 'Critical')
+    table = session_detection_table()
     with k1: st.metric("Uploads", total_uploads)
-    with k2: st.metric("Analyses", total_results)
-    with k3: st.metric("Detections", total_detections)
-    with k4: st.metric("Critical", critical)
+    with k2: st.metric("Analyses", table.n_files)
+    with k3: st.metric("Detections", len(table))
+    with k4: st.metric("Critical", table.severity_counts()['Critical'])
 
     col1, col2 = st.columns([2,1])
     
@@ -174,10 +195,10 @@ def show_home_page():
             c = st.columns(3)
             for idx, item in enumerate(row):
                 with c[idx]:
-                    try:
-                        img = Image.open(item['path'])
-                        st.image(img, caption=item['name'], use_column_width=True)
-                    except Exception:
+                    thumb = get_thumbnail(item.get('sha256'), item['path'], 512)
+                    if thumb:
+                        st.image(thumb, caption=item['name'], use_column_width=True)
+                    else:
                         st.write(item['name'])
 
 def show_upload_page():
@@ -201,33 +222,45 @@ def handle_file_upload():
     
     uploaded_files = st.file_uploader(
         "Choose files",
-        type=['jpg', 'jpeg', 'png', 'mp4', 'avi', 'mov'],
+        type=['jpg', 'jpeg', 'png', 'tif', 'tiff', 'mp4', 'avi', 'mov'],
         accept_multiple_files=True,
-        help="Supported formats: JPG, PNG, MP4, AVI, MOV"
+        help="Supported formats: JPG, PNG, TIFF/GeoTIFF, MP4, AVI, MOV"
     )
     
     if uploaded_files:
         st.success(f"Uploaded {len(uploaded_files)} file(s)")
         
-        # Store uploaded files in session state
-        if 'uploaded_media' not in st.session_state:
-            st.session_state.uploaded_media = []
+        # Uploads already stored this session, keyed by uploader file id, so reruns skip re-hashing
+        upload_digests = st.session_state.setdefault('upload_digests', {})
         
+        new_uploads = []
         for uploaded_file in uploaded_files:
-            # Save file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                file_path = tmp_file.name
-            
-            file_info = {
-                'name': uploaded_file.name,
-                'path': file_path,
-                'type': uploaded_file.type,
-                'size': uploaded_file.size
-            }
-            
-            if file_info not in st.session_state.uploaded_media:
-                st.session_state.uploaded_media.append(file_info)
+            upload_key = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+            sha256 = upload_digests.get(upload_key)
+            # O(1) duplicate check against the session's hash index
+            if sha256 and sha256 in session_media_index():
+                continue
+            item = item_from_upload(uploaded_file)
+            item['upload_key'] = upload_key
+            new_uploads.append(item)
+        
+        if new_uploads:
+            ok, message = check_session_quota(current_session_id(), sum(i['source_size'] for i in new_uploads))
+            if not ok:
+                st.error(message)
+                new_uploads = []
+        
+        # Persist, hash, header, thumbnail, quality and fingerprint stages run concurrently;
+        # identical bytes from any session or user are stored once and previews/metrics are
+        # read from the media record on every later rerun
+        if new_uploads:
+            for item in run_ingest_with_progress(new_uploads):
+                if 'error' in item:
+                    # Only a file that could not be stored or hashed is left out; the rest are
+                    # added even when a later stage failed, with a warning listing what was skipped
+                    continue
+                upload_digests[item['upload_key']] = item['record']['sha256']
+                add_to_session(item['record'], item['name'])
         
         # Display uploaded files
         display_uploaded_files()
@@ -249,39 +282,118 @@ def handle_sample_images():
     )
     
     if selected_samples:
-        if 'uploaded_media' not in st.session_state:
-            st.session_state.uploaded_media = []
-        
         for sample_name in selected_samples:
             # Create sample image
             img = create_sample_image(sample_images[sample_name])
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
-                img.save(tmp_file.name)
-                
-                file_info = {
-                    'name': f"{sample_name.lower().replace(' ', '_')}.jpg",
-                    'path': tmp_file.name,
-                    'type': 'image/jpeg',
-                    'size': os.path.getsize(tmp_file.name)
-                }
-                
-                if file_info not in st.session_state.uploaded_media:
-                    st.session_state.uploaded_media.append(file_info)
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG')
+            file_name = f"{sample_name.lower().replace(' ', '_')}.jpg"
+            record = put_bytes(buffer.getvalue(), file_name, 'image/jpeg')
+            add_to_session(record, file_name, 'image/jpeg')
         
+        compute_quality_batch(st.session_state.uploaded_media)
         st.success(f"Added {len(selected_samples)} sample image(s)")
         display_uploaded_files()
 
+    # Reproducible benchmark data: the same seed always gives the same images and ground truth
+    with st.expander("🧪 Synthetic Workload"):
+        wcol1, wcol2, wcol3, wcol4 = st.columns(4)
+        with wcol1:
+            count = st.number_input("Images", min_value=1, max_value=1000, value=10, step=10)
+        with wcol2:
+            resolution = st.selectbox("Resolution", ["640x480", "1280x720", "1920x1080", "4000x3000"], index=2)
+        with wcol3:
+            detections = st.number_input("Defects per image", min_value=0, max_value=50, value=DEFAULT_DETECTIONS)
+        with wcol4:
+            seed = st.number_input("Seed", min_value=0, value=DEFAULT_SEED, step=1)
+        if st.button("Generate Workload"):
+            width, height = (int(v) for v in resolution.split('x'))
+            added = ingest_workload(SyntheticWorkload(int(count), (width, height), int(detections), int(seed)))
+            st.success(f"Added {added} synthetic image(s)")
+
 def handle_live_camera():
     st.subheader("Live Drone Camera Connection")
-    st.info("🚧 Live camera integration coming soon!")
-    
-    drone_type = st.selectbox(
-        "Select Drone Type:",
-        ["DJI Tello", "DJI Mini", "Custom Drone", "Simulator"]
-    )
-    
-    if drone_type == "Simulator":
-        st.warning("Using camera simulator mode")
+
+    if live_session() is None:
+        source_kind = st.radio("Source:", ["Stream URL", "Replay Uploaded Video"], horizontal=True)
+        loop = False
+        if source_kind == "Stream URL":
+            address = st.text_input(
+                "Stream URL",
+                placeholder="rtsp://192.168.1.10:8554/live",
+                help="RTSP, UDP, RTP, SRT or HTTP MJPEG stream from the drone or its ground station"
+            )
+        else:
+            videos = [f for f in st.session_state.get('uploaded_media', []) if f['type'].startswith('video')]
+            if not videos:
+                st.info("Upload a video to replay it as a live feed at its recorded frame rate.")
+                return
+            video = st.selectbox("Video:", videos, format_func=lambda f: f['name'])
+            address = video.get('sha256')
+            loop = st.checkbox("Loop replay", value=True)
+        buffer_size = st.number_input(
+            "Frame buffer", min_value=1, max_value=32, value=LIVE_BUFFER_SIZE,
+            help="Frames held while detection catches up; when it is full the oldest frame is dropped"
+        )
+        settings = settings_from_session()
+        if not settings['models']:
+            st.warning("Select detection models on the AI Analysis page first.")
+            return
+        st.caption(f"Runs {', '.join(settings['models'])} with the Quick Scan plan on every frame it keeps up with.")
+        if st.button("▶️ Start Live Feed", disabled=not address):
+            try:
+                source = open_stream(address) if source_kind == "Stream URL" else replay_source(address, loop=loop)
+                start_live_session(source, live_detector(settings), buffer_size=int(buffer_size))
+            except Exception as e:
+                st.error(f"Could not start live feed: {e}")
+                return
+            st.rerun()
+        if st.session_state.get('live_stats'):
+            st.caption(f"Last feed: {format_live_stats(st.session_state.live_stats)}")
+        return
+
+    show_live_feed()
+
+@st.fragment(run_every=LIVE_REFRESH)
+def show_live_feed():
+    """Latest analysed frame and feed statistics, refreshed without rerunning the whole page"""
+    ingest = live_session()
+    if ingest is None:
+        return
+    # Each refresh keeps the feed alive; once the tab is gone it times out on its own
+    ingest.touch()
+    stats = ingest.stats()
+    latest = ingest.latest
+    if latest is not None:
+        st.image(annotate(latest['frame'], latest['detections']), channels="BGR",
+                 caption=f"Frame {latest['index']} - {len(latest['detections'])} detection(s), "
+                         f"{latest['latency'] * 1000:.0f} ms glass-to-detection")
+    else:
+        st.text(f"Connecting to {stats['source']}...")
+    st.caption(f"📡 {format_live_stats(stats)}")
+    if 'error' in stats:
+        st.error(f"Live feed error: {stats['error']}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("📸 Capture Frame", disabled=latest is None):
+            ok, encoded = cv2.imencode('.jpg', latest['frame'])
+            if ok:
+                name = f"live_frame_{latest['index']}.jpg"
+                record = put_bytes(encoded.tobytes(), name, 'image/jpeg')
+                add_to_session(record, name, 'image/jpeg')
+                st.success("Frame captured successfully!")
+    with col2:
+        if st.button("⏹️ Stop Live Feed") or not ingest.running:
+            stop_live_session()
+            st.rerun(scope="app")
+    recent, _ = ingest.snapshot()
+    if recent:
+        st.dataframe(pd.DataFrame([
+            {'Frame': d['frame_index'], 'Time (s)': d['timestamp'], 'Defect Type': d['defect_type'],
+             'Confidence': round(d['confidence'], 2), 'Severity': d['severity'], 'Model': d['model']}
+            for d in reversed(recent)
+        ]), height=200)
 
 def display_uploaded_files():
     if 'uploaded_media' in st.session_state and st.session_state.uploaded_media:
@@ -293,20 +405,25 @@ def display_uploaded_files():
             with col1:
                 st.write(f"📁 {file_info['name']}")
                 st.write(f"Size: {file_info['size']} bytes")
+                caption = quality_caption(file_info)
+                if caption:
+                    st.caption(caption)
+                geo = geo_from_meta(file_info)
+                if geo:
+                    st.caption(f"📍 {geo['lat']:.6f}, {geo['lon']:.6f}")
             
             with col2:
-                if file_info['type'].startswith('image'):
-                    try:
-                        img = Image.open(file_info['path'])
-                        st.image(img, width=100)
-                    except:
-                        st.write("🖼️ Image")
+                thumb = get_thumbnail(file_info.get('sha256'), file_info['path'], 128) if file_info['type'].startswith('image') else None
+                if thumb:
+                    st.image(thumb, width=100)
+                elif file_info['type'].startswith('image'):
+                    st.write("🖼️ Image")
                 else:
                     st.write("🎥 Video")
             
             with col3:
-                if st.button(f"Remove", key=f"remove_{i}"):
-                    st.session_state.uploaded_media.pop(i)
+                if st.button(f"Remove", key=f"remove_{file_info.get('sha256', i)}"):
+                    remove_from_session(file_info)
                     st.rerun()
 
 def create_sample_image(image_type):
@@ -338,6 +455,10 @@ def create_sample_image(image_type):
 def show_analysis_page():
     st.markdown('<h2 class="section-header">🤖 AI Analysis</h2>', unsafe_allow_html=True)
     
+    # A running job keeps polling here; it was submitted by an earlier rerun or another visit
+    show_analysis_job()
+    show_last_job_summary()
+    
     # Check if media is uploaded
     if 'uploaded_media' not in st.session_state or not st.session_state.uploaded_media:
         st.warning("⚠️ Please upload media files first in the Media Upload section.")
@@ -416,74 +537,173 @@ def show_analysis_controls():
     with col3:
         analysis_mode = st.selectbox(
             "Analysis Mode",
-            ["Quick Scan", "Detailed Analysis", "Comprehensive Report"],
+            list(ANALYSIS_PLANS),
             index=1
         )
         st.session_state.analysis_mode = analysis_mode
+        st.caption(ANALYSIS_PLANS[analysis_mode]['description'])
+        # Keyed per mode, so switching modes brings up that plan's own default
+        latency_budget = st.number_input(
+            "Latency budget (ms per image)",
+            min_value=1,
+            max_value=60000,
+            value=ANALYSIS_PLANS[analysis_mode]['latency_budget_ms'],
+            step=10,
+            key=f"latency_budget_{analysis_mode}",
+            help="Test-time augmentation is dropped when the running mean goes over budget"
+        )
+        st.session_state.latency_budget_ms = float(latency_budget)
+    
+    with st.expander("🎥 Video Sampling"):
+        vcol1, vcol2, vcol3 = st.columns(3)
+        with vcol1:
+            sampling_mode = st.radio(
+                "Keyframe sampling",
+                ["Fixed stride", "Scene change"],
+                help="Analyse every Nth frame, or only frames where the scene changes"
+            )
+        with vcol2:
+            stride = st.number_input("Frame stride", min_value=1, max_value=600, value=30, step=1)
+        with vcol3:
+            scene_threshold = st.slider(
+                "Scene change threshold",
+                min_value=0.05,
+                max_value=0.9,
+                value=0.25,
+                step=0.05,
+                help="Mean frame difference (0-1) that counts as a new scene"
+            )
+        track = st.checkbox("Track defects across keyframes", value=True,
+                            help="Report a defect that stays in view once, with its first/last frame and best crop")
+        st.session_state.video_sampling = {
+            'mode': 'scene' if sampling_mode == "Scene change" else 'stride',
+            'stride': int(stride),
+            'scene_threshold': float(scene_threshold),
+            'track': track
+        }
+    
+    with st.expander("🧩 Tiled Inference"):
+        tiled_models = st.multiselect(
+            "Run these models tile by tile",
+            st.session_state.get('selected_models', []),
+            help="Sliding-window inference at full resolution; finds hairline defects a downsized frame loses"
+        )
+        tcol1, tcol2 = st.columns(2)
+        with tcol1:
+            tile_size = st.number_input("Tile size (px)", min_value=256, max_value=4096, value=1024, step=128)
+        with tcol2:
+            tile_overlap = st.number_input("Tile overlap (px)", min_value=0, max_value=1024, value=128, step=32,
+                                           help="Defects crossing a seam are merged back into one box")
+        st.session_state.tiling = {
+            'models': tiled_models,
+            'tile_size': int(tile_size),
+            'overlap': int(tile_overlap)
+        }
+    
+    with st.expander("🧮 Duplicate Suppression"):
+        pcol1, pcol2 = st.columns(2)
+        with pcol1:
+            nms_iou = st.slider("Per-model NMS IoU", min_value=0.1, max_value=0.9, value=0.5, step=0.05,
+                                help="Boxes from one model overlapping more than this are reduced to the strongest")
+        with pcol2:
+            fuse_models = st.checkbox("Fuse overlapping detections across models", value=True,
+                                      help="One weighted box when several models flag the same defect type in the same region")
+        st.session_state.postprocessing = {'nms_iou': float(nms_iou), 'fuse_models': fuse_models}
+    
+    with st.expander("🧬 Near-Duplicate Frames"):
+        dcol1, dcol2 = st.columns(2)
+        with dcol1:
+            link_duplicates = st.checkbox("Analyse near-duplicate frames once", value=False,
+                                          help="Hover shots and bursts: one representative frame is analysed "
+                                               "and its result is shared with the rest of its cluster")
+        with dcol2:
+            hamming_threshold = st.slider("Hamming threshold (of 64 bits)", min_value=0, max_value=MAX_HAMMING,
+                                          value=DEFAULT_HAMMING, disabled=not link_duplicates,
+                                          help="Largest pHash and dHash distance from the representative")
+        st.session_state.near_duplicates = {'enabled': link_duplicates, 'threshold': int(hamming_threshold)}
 
 def run_inspection_analysis():
-    """Run the AI inspection analysis on uploaded media"""
+    """Submit the AI inspection analysis on uploaded media as a background job"""
     
     if 'selected_models' not in st.session_state or not st.session_state.selected_models:
         st.error("Please select at least one AI model for analysis.")
         return
     
-    st.subheader("🔍 Analysis in Progress...")
-    
-    # Progress tracking
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    # Initialize results storage
-    if 'analysis_results' not in st.session_state:
-        st.session_state.analysis_results = []
+    if active_job_id():
+        st.info("An analysis job is already running for this session.")
+        return
     
-    total_files = len(st.session_state.uploaded_media)
+    settings = settings_from_session()
+    # Only media without a result for the current settings and models are scheduled
+    pending = pending_media(st.session_state.uploaded_media, st.session_state.get('analysis_results', []), settings)
+    if not pending:
+        st.info(f"All {len(st.session_state.uploaded_media)} file(s) are already analysed with these settings.")
+        return
+    st.session_state.analysis_up_to_date = len(st.session_state.uploaded_media) - len(pending)
     
-    for i, file_info in enumerate(st.session_state.uploaded_media):
-        status_text.text(f"Analyzing {file_info['name']}...")
-        progress_bar.progress((i + 1) / total_files)
-        
-        # Simulate analysis
-        file_results = analyze_single_file(file_info)
-        st.session_state.analysis_results.append(file_results)
+    # Runs in a worker process; the page polls the job instead of blocking this rerun
+    start_analysis_job(pending, settings)
+    st.rerun()
+
+@st.fragment(run_every=POLL_INTERVAL)
+def show_analysis_job():
+    """Progress of the active analysis job, refreshed without rerunning the whole page"""
+    job_id = active_job_id()
+    if not job_id:
+        return
+    job = get_job(job_id)
+    if job is None or job['status'] in FINISHED:
+        if collect_finished_job():
+            st.rerun(scope="app")
+        return
     
-    status_text.text("Analysis completed!")
-    st.success("✅ Inspection analysis completed successfully!")
+    st.subheader("🔍 Analysis in Progress...")
+    st.progress(job['done'] / max(job['total'], 1))
+    if job['status'] == QUEUED:
+        st.text("Waiting for a free analysis worker...")
+    else:
+        st.text(f"Analyzed {job['current'] or '...'} ({job['done']}/{job['total']})")
+    st.caption(f"Job {job_id} keeps running if you leave this page.")
+    if st.button("⏹️ Cancel Analysis"):
+        cancel_job(job_id)
+
+def show_last_job_summary():
+    """Outcome of the job collected on this rerun"""
+    job = st.session_state.pop('last_analysis_job', None)
+    if not job:
+        return
+    for file_results in job['results']:
+        if 'error' in file_results:
+            st.error(f"Error analyzing {file_results['file_name']}: {file_results['error']}")
+    if job['status'] == DONE:
+        st.caption(f"⚡ {format_engine_stats(job['stats'])}")
+        # Decode and preprocessing happen once per image, however many models are selected
+        st.caption(f"⏱️ Stage timings: {format_stage_timings(job['stats'])}")
+        if format_latency_stats(job['stats']):
+            st.caption(f"🎯 {job['settings'].get('mode')}: {format_latency_stats(job['stats'])}")
+        if job['stats'].get('degraded'):
+            st.warning(f"{job['stats']['degraded']} file(s) were analysed without test-time augmentation to stay "
+                       f"within the latency budget. Their results are not cached and they will be analysed again next run.")
+        up_to_date = st.session_state.pop('analysis_up_to_date', 0)
+        if up_to_date:
+            st.caption(f"♻️ {up_to_date} file(s) already up to date were skipped; {job['total']} analysed.")
+        if 'cache' in job['stats']:
+            st.caption(f"🗃️ Result cache: {format_cache_stats(job['stats']['cache'])}")
+        if format_gating_stats(job['stats']):
+            st.caption(f"🚦 Gating: {format_gating_stats(job['stats'])}")
+        if 'near_duplicates' in job['stats']:
+            st.caption(f"🧬 {format_duplicate_stats(job['stats']['near_duplicates'])}")
+        if 'model_pool' in job['stats']:
+            st.caption(f"🧠 Model pool: {format_pool_stats(job['stats']['model_pool'])}")
+        st.success("✅ Inspection analysis completed successfully!")
+    elif job['status'] == CANCELLED:
+        st.warning(f"Analysis cancelled after {len(job['results'])} of {job['total']} file(s).")
+    else:
+        st.error(f"Analysis failed: {job['error']}")
     
     # Display results summary
     display_analysis_summary()
 
-def analyze_single_file(file_info):
-    """Analyze a single file with selected models"""
-    
-    results = {
-        'file_name': file_info['name'],
-        'file_path': file_info['path'],
-        'analysis_time': datetime.now(),
-        'detections': []
-    }
-    
-    # Simulate detections for each selected model
-    for model_name in st.session_state.selected_models:
-        num_detections = random.randint(0, 2)
-        
-        for _ in range(num_detections):
-            confidence = random.uniform(st.session_state.confidence_threshold, 1.0)
-            
-            detection = {
-                'model': model_name,
-                'defect_type': f"{model_name} Defect",
-                'confidence': confidence,
-                'bbox': [100, 100, 200, 200],
-                'severity': 'High' if confidence > 0.8 else 'Medium',
-                'description': f"Defect detected by {model_name}"
-            }
-            
-            results['detections'].append(detection)
-    
-    return results
-
 def display_analysis_summary():
     """Display summary of analysis results"""
     
@@ -493,30 +713,21 @@ def display_analysis_summary():
     st.subheader("📈 Analysis Summary")
     
     # Calculate summary statistics
-    total_detections = sum(len(result['detections']) for result in st.session_state.analysis_results)
-    files_with_defects = sum(1 for result in st.session_state.analysis_results if result['detections'])
+    table = session_detection_table()
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Files Analyzed", len(st.session_state.analysis_results))
+        st.metric("Total Files Analyzed", table.n_files)
     
     with col2:
-        st.metric("Files with Defects", files_with_defects)
+        st.metric("Files with Defects", table.files_with_detections())
     
     with col3:
-        st.metric("Total Detections", total_detections)
+        st.metric("Total Detections", len(table))
     
     with col4:
-        avg_confidence = 0
-        if total_detections > 0:
-            all_confidences = []
-            for result in st.session_state.analysis_results:
-                for detection in result['detections']:
-                    all_confidences.append(detection['confidence'])
-            avg_confidence = sum(all_confidences) / len(all_confidences)
-        
-        st.metric("Avg Confidence", f"{avg_confidence:.2f}")
+        st.metric("Avg Confidence", f"{table.mean_confidence():.2f}")
 
 def show_results_page():
     st.markdown('<h2 class="section-header">📊 Results & Reports</h2>', unsafe_allow_html=True)
@@ -536,13 +747,17 @@ def show_detailed_results():
     
     for result in st.session_state.analysis_results:
         with st.expander(f"📁 {result['file_name']} - {len(result['detections'])} detections"):
+            if duplicate_caption(result):
+                st.caption(duplicate_caption(result))
+            if result.get('degraded'):
+                st.caption("🎯 Test-time augmentation was dropped for this file to stay within the latency budget")
             
             if result['detections']:
                 # Display image with detections
-                try:
-                    img = Image.open(result['file_path'])
-                    st.image(img, caption=result['file_name'], width=400)
-                except:
+                thumb = get_thumbnail(result.get('sha256'), result['file_path'], 512)
+                if thumb:
+                    st.image(thumb, caption=result['file_name'], width=400)
+                else:
                     st.write("Could not display image")
                 
                 # Detection details
@@ -571,7 +786,7 @@ def show_export_options():
     with col1:
         if st.button("📄 Generate PDF Report"):
             if 'analysis_results' in st.session_state and st.session_state.analysis_results:
-                pdf_bytes = build_pdf_report()
+                pdf_bytes = build_pdf_report(session_detection_table())
                 st.download_button(
                     label="Download Report.pdf",
                     data=pdf_bytes,
@@ -583,21 +798,8 @@ def show_export_options():
     
     with col2:
         if st.button("📊 Export CSV Data"):
-            # Create CSV data
-            csv_data = []
-            for result in st.session_state.analysis_results:
-                for detection in result['detections']:
-                    csv_data.append({
-                        'File': result['file_name'],
-                        'Defect Type': detection['defect_type'],
-                        'Confidence': detection['confidence'],
-                        'Severity': detection['severity'],
-                        'Model': detection['model']
-                    })
-            
-            if csv_data:
-                df = pd.DataFrame(csv_data)
-                csv = df.to_csv(index=False)
+            csv = detections_csv(session_detection_table())
+            if csv:
                 st.download_button(
                     label="Download CSV",
                     data=csv,
@@ -623,78 +825,6 @@ def show_export_options():
             else:
                 st.info("No annotations available yet. Use the Annotation Tool page.")
 
-def build_pdf_report():
-    """Build a PDF report from current session results and return bytes."""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=36, leftMargin=36, topMargin=36, bottomMargin=36)
-    styles = getSampleStyleSheet()
-    story = []
-
-    # Title
-    story.append(Paragraph("FLYSCOPE Inspection Report", styles['Title']))
-    story.append(Spacer(1, 12))
-    story.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
-    story.append(Spacer(1, 12))
-
-    # Summary metrics
-    results = st.session_state.get('analysis_results', [])
-    total_files = len(results)
-    total_detections = sum(len(r['detections']) for r in results)
-    files_with_defects = sum(1 for r in results if r['detections'])
-
-    data = [["Metric", "Value"], ["Total Files Analyzed", str(total_files)], ["Files with Defects", str(files_with_defects)], ["Total Detections", str(total_detections)]]
-    table = Table(data, colWidths=[200, 300])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2563eb')),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-        ('GRID', (0,0), (-1,-1), 0.25, colors.grey),
-        ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f3f4f6')),
-    ]))
-    story.append(table)
-    story.append(Spacer(1, 18))
-
-    # Per-file sections
-    for res in results:
-        story.append(Paragraph(f"File: {res['file_name']}", styles['Heading3']))
-        story.append(Spacer(1, 6))
-        # Thumbnail if image
-        try:
-            if os.path.exists(res['file_path']):
-                # Safely try to include a small thumbnail for images
-                pil = Image.open(res['file_path'])
-                thumb_path = None
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp:
-                    pil.thumbnail((512, 512))
-                    pil.save(tmp.name)
-                    thumb_path = tmp.name
-                story.append(RLImage(thumb_path, width=200, height=200*pil.height/pil.width))
-                story.append(Spacer(1, 6))
-        except Exception:
-            pass
-
-        if res['detections']:
-            det_data = [["Type", "Severity", "Confidence", "Model", "Description"]]
-            for d in res['detections']:
-                det_data.append([d.get('defect_type','-'), d.get('severity','-'), f"{d.get('confidence',0):.2f}", d.get('model','-'), d.get('description','-')])
-            det_table = Table(det_data, colWidths=[120, 70, 70, 100, 240])
-            det_table.setStyle(TableStyle([
-                ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#111827')),
-                ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                ('GRID', (0,0), (-1,-1), 0.25, colors.grey),
-                ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f8fafc')),
-            ]))
-            story.append(det_table)
-        else:
-            story.append(Paragraph("No defects detected.", styles['Italic']))
-        story.append(Spacer(1, 18))
-
-    doc.build(story)
-    buffer.seek(0)
-    return buffer.getvalue()
-
 def show_mapping_page():
     st.markdown('<h2 class="section-header">🗺️ Fault Mapping</h2>', unsafe_allow_html=True)
     
@@ -702,27 +832,24 @@ def show_mapping_page():
         st.warning("⚠️ No analysis results available for mapping.")
         return
     
-    # Create map
-    m = folium.Map(location=[11.1271, 78.6569], zoom_start=7, tiles='cartodbpositron')
+    # Build fault points from the GPS position parsed from each file's EXIF/XMP at ingest
+    table = session_detection_table()
+    locations, missing_gps = fault_locations(table)
     
-    # Build fault points from results (randomized geotags for demo)
-    fault_locations = []
-    for result in st.session_state.analysis_results:
-        for det in result['detections']:
-            # Random demo coordinates around TN center if not provided
-            lat = 10.5 + random.uniform(-1.5, 1.5)
-            lon = 78.0 + random.uniform(-1.5, 1.5)
-            fault_locations.append({
-                "lat": lat,
-                "lon": lon,
-                "fault": det['defect_type'],
-                "severity": det['severity'],
-                "confidence": det['confidence']
-            })
+    if missing_gps:
+        st.info(f"ℹ️ {missing_gps} detection(s) come from media without GPS metadata and are not shown on the map.")
+    
+    # Create map, centred on the mission when any detection is geotagged
+    if locations:
+        mapped = table.where(geotagged=True).rows
+        center = [float(mapped['lat'].mean()), float(mapped['lon'].mean())]
+        m = folium.Map(location=center, zoom_start=16, tiles='cartodbpositron')
+    else:
+        m = folium.Map(location=[11.1271, 78.6569], zoom_start=7, tiles='cartodbpositron')
 
     # Clusters
     cluster = MarkerCluster().add_to(m)
-    for loc in fault_locations:
+    for loc in locations:
         color = "red" if loc["severity"] in ["High", "Critical"] else ("orange" if loc["severity"] == "Medium" else "green")
         folium.CircleMarker(
             [loc["lat"], loc["lon"]],
@@ -730,12 +857,13 @@ def show_mapping_page():
             color=color,
             fill=True,
             fill_opacity=0.8,
-            popup=f"⚠️ {loc['fault']} | Severity: {loc['severity']} | Conf: {loc['confidence']:.2f}"
+            popup=f"⚠️ {loc['fault']} | Severity: {loc['severity']} | Conf: {loc['confidence']:.2f} | {loc['file']}"
+                  + (f" | Alt: {loc['altitude']:.1f} m" if loc['altitude'] is not None else "")
         ).add_to(cluster)
 
     # Heatmap by confidence
-    if fault_locations:
-        heat_data = [[loc['lat'], loc['lon'], float(loc['confidence'])] for loc in fault_locations]
+    if locations:
+        heat_data = [[loc['lat'], loc['lon'], float(loc['confidence'])] for loc in locations]
         HeatMap(heat_data, radius=18, blur=25, min_opacity=0.3).add_to(m)
     
     # Display map
@@ -744,7 +872,7 @@ def show_mapping_page():
     # Fault statistics
     st.subheader("📊 Fault Distribution")
     
-    severity_data = {"Critical": 2, "High": 1, "Medium": 1, "Low": 0}
+    severity_data = table.severity_counts()
     
     col1, col2 = st.columns(2)
     
@@ -759,7 +887,7 @@ def show_mapping_page():
     
     with col2:
         # Fault type breakdown
-        fault_types = {"Thermal": 1, "Vegetation": 1, "Corrosion": 1, "Structural": 1}
+        fault_types = table.class_counts()
         
         fig = px.bar(
             x=list(fault_types.keys()),
@@ -776,16 +904,13 @@ def show_data_management_page():
     
     if 'analysis_results' in st.session_state and st.session_state.analysis_results:
         # Create summary table
-        summary_data = []
-        for result in st.session_state.analysis_results:
-            summary_data.append({
-                'File Name': result['file_name'],
-                'Analysis Time': result['analysis_time'].strftime('%Y-%m-%d %H:%M:%S'),
-                'Detections': len(result['detections']),
-                'Status': 'Completed'
-            })
-        
-        df = pd.DataFrame(summary_data)
+        table = session_detection_table()
+        df = pd.DataFrame({
+            'File Name': table.files['name'],
+            'Analysis Time': table.files['analysis_time'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+            'Detections': table.counts_per_file(),
+            'Status': 'Completed'
+        })
         st.dataframe(df, use_container_width=True)
     else:
         st.info("No inspection data available yet.")
@@ -797,20 +922,50 @@ def show_data_management_page():
     
     with col1:
         if st.button("🗑️ Clear All Data"):
-            if 'uploaded_media' in st.session_state:
-                del st.session_state.uploaded_media
+            # Releases this session's references so the sweeper can reclaim unshared media
+            clear_session_media()
             if 'analysis_results' in st.session_state:
                 del st.session_state.analysis_results
             st.success("All data cleared!")
             st.rerun()
     
     with col2:
-        if st.button("📥 Import Dataset"):
-            st.info("Dataset import feature coming soon!")
+        with st.expander("📥 Import Dataset"):
+            dataset_path = ""
+            if IMPORT_ROOT:
+                dataset_path = st.text_input(
+                    "ZIP archive or directory on the server",
+                    help=f"Relative to {IMPORT_ROOT}; members are streamed into the media store, nothing is extracted to /tmp"
+                )
+            dataset_zip = st.file_uploader("...or upload a ZIP archive" if IMPORT_ROOT else "Upload a ZIP archive", type=['zip'])
+            if st.button("Import"):
+                source = dataset_path.strip() or dataset_zip
+                if not source:
+                    st.warning("Enter a path or upload a ZIP archive.")
+                else:
+                    try:
+                        imported = run_dataset_import(source)
+                        st.success(f"Imported {imported} new file(s) into the analysis queue")
+                    except (OSError, ValueError, zipfile.BadZipFile) as e:
+                        st.error(f"Import failed: {e}")
     
     with col3:
         if st.button("💾 Backup Data"):
             st.info("Data backup feature coming soon!")
+    
+    # Shared media store usage
+    st.subheader("🗄️ Media Storage")
+    s1, s2 = st.columns([3, 1])
+    with s1:
+        usage = store_usage()
+        st.progress(min(usage / GLOBAL_QUOTA_BYTES, 1.0), text=f"{usage / GB:.2f} GB of {GLOBAL_QUOTA_BYTES / GB:.0f} GB used")
+    with s2:
+        if st.button("🧹 Clean Up Now"):
+            stats = sweep()
+            st.success(
+                f"Released {stats['expired_sessions']} idle session(s), removed {stats['orphans']} orphan(s), "
+                f"evicted {stats['evicted']} file(s) ({stats['freed_bytes'] / GB:.2f} GB)"
+            )
 
 def show_settings_page():
     st.markdown('<h2 class="section-header">⚙️ Settings</h2>', unsafe_allow_html=True)
@@ -0,0 +1,379 @@
+import copy
+import os
+import time
+import threading
+import weakref
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+from detectors import DEFAULT_BACKEND
+from model_pool import model_pool
+from tiled_reader import tile_origins
+from gating import GATE_PROBE_SIZE, frame_features, combine_gating
+from postprocess import NMS_IOU, FUSION_IOU, merge_seams, merge_augmented, suppress_and_fuse
+
+DEFAULT_BATCH_SIZE = 8
+
+# Sliding-window inference for models that must see full-resolution detail
+DEFAULT_TILE_SIZE = 1024
+DEFAULT_TILE_OVERLAP = 128
+TILE_WORKERS = os.cpu_count() or 1
+# Same-model boxes meeting across a tile seam are merged when their extents along it have this IoU
+SEAM_MERGE_OVERLAP = 0.5
+
+# Scaled model inputs stay a multiple of this, as cell- and stride-based models expect
+INPUT_SIZE_MULTIPLE = 32
+
+# Test-time augmentations
+AUG_HFLIP = 'hflip'
+AUG_VFLIP = 'vflip'
+
+# Timing buckets besides the per-model ones, in pipeline order
+STAGE_DECODE = 'decode'
+STAGE_PREPROCESS = 'preprocess'
+STAGE_POSTPROCESS = 'postprocess'
+
+
+def resize_rgb(image: np.ndarray, size: int) -> np.ndarray:
+    """Square model input; area averaging keeps thin features visible when shrinking"""
+    if image.shape[0] == size and image.shape[1] == size:
+        return image
+    if CV2_AVAILABLE:
+        return cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA)
+    return np.asarray(Image.fromarray(image).resize((size, size), Image.BILINEAR, reducing_gap=2.0))
+
+
+def flip_view(batch: np.ndarray, augmentation: str) -> np.ndarray:
+    """Flipped view of a planar (N, 3, S, S) batch; no copy, so it stays read-only"""
+    return np.flip(batch, axis=3 if augmentation == AUG_HFLIP else 2)
+
+
+def unflip_boxes(detections: List[Dict], augmentation: str, size: int):
+    """Map boxes found on a flipped view back onto the unflipped input"""
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox']
+        if augmentation == AUG_HFLIP:
+            det['bbox'] = [size - x2, y1, size - x1, y2]
+        else:
+            det['bbox'] = [x1, size - y2, x2, size - y1]
+
+
+def scale_boxes(detections: List[Dict], sx: float, sy: float):
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox']
+        det['bbox'] = [int(x1 * sx), int(y1 * sy), int(x2 * sx), int(y2 * sy)]
+
+
+def offset_boxes(detections: List[Dict], dx: int, dy: int):
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox']
+        det['bbox'] = [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+
+
+def _release_models(pool, keys: List[Tuple[str, str]]):
+    for name, backend in keys:
+        pool.release(name, backend)
+
+
+class InferenceEngine:
+    """Groups images into batches and sends every batch through every selected model once"""
+
+    def __init__(self, models: Sequence[str], confidence_threshold: float = 0.7,
+                 sensitivity: str = 'Medium', batch_size: int = DEFAULT_BATCH_SIZE,
+                 backend: str = DEFAULT_BACKEND, tiled_models: Sequence[str] = (),
+                 tile_size: int = DEFAULT_TILE_SIZE, tile_overlap: int = DEFAULT_TILE_OVERLAP,
+                 tile_workers: int = TILE_WORKERS, nms_iou: float = NMS_IOU,
+                 fuse_models: bool = True, fusion_iou: float = FUSION_IOU, input_scale: float = 1.0,
+                 augmentations: Sequence[str] = (), latency_budget: float = 0.0, gating: bool = False):
+        # Loaded models are shared through the process-wide pool and leased until close()
+        pool = model_pool()
+        self.detectors = [pool.acquire(name, backend) for name in models]
+        self._release = weakref.finalize(self, _release_models, pool, [(name, backend) for name in models])
+        if input_scale != 1.0:
+            # A shallow copy shares the loaded weights but not the input size
+            self.detectors = [copy.copy(d) for d in self.detectors]
+            for d in self.detectors:
+                scaled = int(d.input_size * input_scale) // INPUT_SIZE_MULTIPLE * INPUT_SIZE_MULTIPLE
+                d.input_size = max(INPUT_SIZE_MULTIPLE, scaled)
+        # Models run either once on the whole frame or on every sliding window of it
+        self.frame_detectors = [d for d in self.detectors if d.name not in tiled_models]
+        self.tiled_detectors = [d for d in self.detectors if d.name in tiled_models]
+        self.confidence_threshold = confidence_threshold
+        self.sensitivity = sensitivity
+        self.batch_size = max(1, int(batch_size))
+        self.tile_size = max(64, int(tile_size))
+        self.tile_overlap = min(max(0, int(tile_overlap)), self.tile_size // 2)
+        self.tile_workers = max(1, int(tile_workers))
+        self.nms_iou = nms_iou
+        self.fuse_models = fuse_models
+        self.fusion_iou = fusion_iou
+        # Test-time augmentation: extra flipped views per model, averaged with the plain one
+        self.augmentations = tuple(augmentations)
+        # Seconds per image; augmentation is dropped once the running mean goes over it
+        self.latency_budget = latency_budget
+        self.augmentations_dropped_after = 0
+        self._last_batch_degraded = False
+        # Per-image gate in front of each model; counts are images (or tiles) run and skipped per model
+        self.gating = gating
+        self.gate_counts = defaultdict(lambda: [0, 0])
+        self.gate_seconds = 0.0
+        self.latencies = []
+        self.images = 0
+        self.batches = 0
+        self.tiles = 0
+        self.seconds = 0.0
+        self.tile_seconds = 0.0
+        self.timings = defaultdict(float)
+        self._timings_lock = threading.Lock()
+
+    def close(self):
+        """Release the engine's model leases; an engine nobody closes releases them when collected"""
+        self._release()
+
+    def __enter__(self) -> 'InferenceEngine':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def degraded(self) -> bool:
+        """True when the latest batch ran without the test-time augmentation the engine was built with"""
+        return self._last_batch_degraded
+
+    @property
+    def max_input_size(self) -> int:
+        """Largest frame-level model input, or 0 when a tiled model needs the image at full resolution"""
+        if self.tiled_detectors:
+            return 0
+        return max((d.input_size for d in self.frame_detectors), default=0)
+
+    def _time(self, stage: str, seconds: float):
+        with self._timings_lock:
+            self.timings[stage] += seconds
+
+    def preprocess(self, images: List[np.ndarray], sizes: Sequence[int]) -> Dict[int, np.ndarray]:
+        """Resize and normalise each image once into a read-only planar tensor pyramid shared by all models"""
+        sizes = sorted(set(sizes), reverse=True)
+        pyramid = {size: np.empty((len(images), 3, size, size), dtype=np.float32) for size in sizes}
+        for i, img in enumerate(images):
+            level = img
+            for size in sizes:
+                # Each level is resized from the one above it, not from the full-size source
+                level = resize_rgb(level, size)
+                # Planar layout keeps each colour channel contiguous for the detectors
+                np.multiply(level.transpose(2, 0, 1), 1.0 / 255.0, out=pyramid[size][i])
+        for tensor in pyramid.values():
+            # Every model gets the same buffers, so none of them may write into them
+            tensor.setflags(write=False)
+        return pyramid
+
+    def _detect(self, detectors: List, images: List[np.ndarray]) -> List[List[Dict]]:
+        """Run a group of models over one batch; boxes come back in each image's own pixels"""
+        started = time.perf_counter()
+        sizes = [d.input_size for d in detectors]
+        pyramid = self.preprocess(images, sizes + [GATE_PROBE_SIZE] if self.gating else sizes)
+        t = time.perf_counter()
+        self._time(STAGE_PREPROCESS, t - started)
+        features = None
+        if self.gating:
+            features = frame_features(pyramid[GATE_PROBE_SIZE])
+            gated = time.perf_counter()
+            with self._timings_lock:
+                self.gate_seconds += gated - t
+            t = gated
+        results = [[] for _ in images]
+        for detector in detectors:
+            keep = detector.gate(features) if features is not None else None
+            batch = self._detect_gated(detector, pyramid[detector.input_size], keep)
+            now = time.perf_counter()
+            self._time(detector.name, now - t)
+            for img, out, dets in zip(images, results, batch):
+                scale_boxes(dets, img.shape[1] / detector.input_size, img.shape[0] / detector.input_size)
+                out.extend(dets)
+            t = time.perf_counter()
+            self._time(STAGE_POSTPROCESS, t - now)
+        return results
+
+    def _detect_gated(self, detector, tensor: np.ndarray, keep: Optional[np.ndarray]) -> List[List[Dict]]:
+        """One model over the images its gate lets through; the rest get no detections"""
+        index = np.arange(len(tensor)) if keep is None else np.flatnonzero(keep)
+        with self._timings_lock:
+            counts = self.gate_counts[detector.name]
+            counts[0] += len(index)
+            counts[1] += len(tensor) - len(index)
+        if len(index) == len(tensor):
+            return self._detect_views(detector, tensor)
+        batch = [[] for _ in range(len(tensor))]
+        if len(index):
+            for i, dets in zip(index, self._detect_views(detector, tensor[index])):
+                batch[i] = dets
+        return batch
+
+    def _detect_views(self, detector, tensor: np.ndarray) -> List[List[Dict]]:
+        """One model over a batch, plus its flipped views when test-time augmentation is on"""
+        batch = detector.detect_batch(tensor, self.confidence_threshold, self.sensitivity)
+        augmentations = self.augmentations
+        if not augmentations:
+            return batch
+        views = [batch]
+        for augmentation in augmentations:
+            flipped = detector.detect_batch(flip_view(tensor, augmentation), self.confidence_threshold, self.sensitivity)
+            for dets in flipped:
+                unflip_boxes(dets, augmentation, detector.input_size)
+            views.append(flipped)
+        return [merge_augmented(list(per_image), self.confidence_threshold, self.fusion_iou) for per_image in zip(*views)]
+
+    def _detect_tiled(self, image: np.ndarray, pool: ThreadPoolExecutor) -> List[Dict]:
+        """Sliding-window pass: tile batches run concurrently, boxes go back to image coordinates"""
+        height, width = image.shape[:2]
+        origins = tile_origins(width, height, self.tile_size, self.tile_overlap)
+        chunks = [origins[i:i + self.batch_size] for i in range(0, len(origins), self.batch_size)]
+        # Tiles are views into the decoded image; nothing is copied before resizing
+        futures = [
+            pool.submit(self._detect, self.tiled_detectors,
+                        [image[y:y + self.tile_size, x:x + self.tile_size] for x, y in chunk])
+            for chunk in chunks
+        ]
+        detections = []
+        for chunk, future in zip(chunks, futures):
+            for (x, y), dets in zip(chunk, future.result()):
+                offset_boxes(dets, x, y)
+                detections.extend(dets)
+        self.tiles += len(origins)
+        started = time.perf_counter()
+        merged = merge_seams(detections, origins, self.tile_size, SEAM_MERGE_OVERLAP) if len(origins) > 1 else detections
+        self._time(STAGE_POSTPROCESS, time.perf_counter() - started)
+        return merged
+
+    def infer(self, images: List[np.ndarray]) -> List[List[Dict]]:
+        """Detections per image, with boxes in each image's own pixel coordinates"""
+        if not images:
+            return []
+        started = time.perf_counter()
+        self._last_batch_degraded = bool(self.augmentations_dropped_after)
+        results = self._detect(self.frame_detectors, images) if self.frame_detectors else [[] for _ in images]
+        if self.tiled_detectors:
+            tiled_started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.tile_workers) as pool:
+                for out, img in zip(results, images):
+                    out.extend(self._detect_tiled(img, pool))
+            self.tile_seconds += time.perf_counter() - tiled_started
+        t = time.perf_counter()
+        # Duplicates within a model, then boxes several models put on the same defect
+        results = [suppress_and_fuse(dets, self.nms_iou, self.fusion_iou, self.fuse_models) for dets in results]
+        self._time(STAGE_POSTPROCESS, time.perf_counter() - t)
+        elapsed = time.perf_counter() - started
+        self.images += len(images)
+        self.batches += 1
+        self.seconds += elapsed
+        # Images in a batch finish together, so each is charged an equal share of it
+        self.latencies.extend([elapsed / len(images)] * len(images))
+        if self.augmentations and self.latency_budget and self.seconds / self.images > self.latency_budget:
+            self.augmentations = ()
+            self.augmentations_dropped_after = self.images
+        return results
+
+    def run(self, items: Iterable[Tuple[Hashable, np.ndarray]]) -> Iterator[Tuple[Hashable, List[Dict]]]:
+        """Stream (key, image) pairs through the models; only one batch of images is held at a time"""
+        keys, images = [], []
+        for key, image in items:
+            keys.append(key)
+            images.append(image)
+            if len(images) >= self.batch_size:
+                yield from zip(keys, self.infer(images))
+                keys, images = [], []
+        if images:
+            yield from zip(keys, self.infer(images))
+
+    def stats(self) -> Dict:
+        seconds = max(self.seconds, 1e-6)
+        return {
+            'images': self.images,
+            'batches': self.batches,
+            'seconds': self.seconds,
+            'images_per_s': self.images / seconds if self.images else 0.0,
+            'tiles': self.tiles,
+            'tile_seconds': self.tile_seconds,
+            'tiles_per_s': self.tiles / max(self.tile_seconds, 1e-6) if self.tiles else 0.0,
+            'timings': dict(self.timings),
+            'latency': self.latency_stats(),
+            'gating': self.gating_stats(),
+        }
+
+    def gating_stats(self) -> Dict:
+        """Images run and skipped per model, and the model time the skips saved at each model's mean cost"""
+        if not self.gating:
+            return {}
+        models = {name: {'run': run, 'skipped': skipped} for name, (run, skipped) in self.gate_counts.items()}
+        saved = sum(self.timings[name] / counts['run'] * counts['skipped']
+                    for name, counts in models.items() if counts['run'])
+        return {'seconds': self.gate_seconds, 'saved_seconds': saved, 'models': models}
+
+    def latency_stats(self) -> Dict:
+        latencies = np.array(self.latencies) * 1000.0
+        budget_ms = self.latency_budget * 1000.0
+        return {
+            'images': len(latencies),
+            'mean_ms': float(latencies.mean()) if len(latencies) else 0.0,
+            'p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+            'budget_ms': budget_ms,
+            'within_budget': float((latencies <= budget_ms).mean()) if len(latencies) and budget_ms else 0.0,
+            'augmentations_dropped_after': self.augmentations_dropped_after,
+        }
+
+
+def combine_stats(stats: Sequence[Dict]) -> Dict:
+    """Totals over several engines' stats(); rates are recomputed from the summed counts"""
+    combined = {'images': 0, 'batches': 0, 'seconds': 0.0, 'tiles': 0, 'tile_seconds': 0.0}
+    timings = defaultdict(float)
+    for s in stats:
+        for key in combined:
+            combined[key] += s.get(key, 0)
+        for stage, seconds in s.get('timings', {}).items():
+            timings[stage] += seconds
+    combined['images_per_s'] = combined['images'] / max(combined['seconds'], 1e-6) if combined['images'] else 0.0
+    combined['tiles_per_s'] = combined['tiles'] / max(combined['tile_seconds'], 1e-6) if combined['tiles'] else 0.0
+    combined['timings'] = dict(timings)
+    gating = [s['gating'] for s in stats if s.get('gating')]
+    if gating:
+        combined['gating'] = combine_gating(gating)
+    latencies = [s['latency'] for s in stats if s.get('latency', {}).get('images')]
+    images = sum(l['images'] for l in latencies)
+    combined['latency'] = {
+        'images': images,
+        'mean_ms': sum(l['mean_ms'] * l['images'] for l in latencies) / images if images else 0.0,
+        # Percentiles do not add up; the worst engine's p95 is an upper bound
+        'p95_ms': max((l['p95_ms'] for l in latencies), default=0.0),
+        'budget_ms': max((l['budget_ms'] for l in latencies), default=0.0),
+        'within_budget': sum(l['within_budget'] * l['images'] for l in latencies) / images if images else 0.0,
+        'augmentations_dropped_after': sum(l['augmentations_dropped_after'] for l in latencies),
+    }
+    return combined
+
+
+def format_engine_stats(stats: Dict) -> str:
+    text = (
+        f"{stats['images']} image(s) in {stats['batches']} batch(es), "
+        f"{stats['seconds']:.2f}s inference ({stats['images_per_s']:.1f} images/s)"
+    )
+    if stats.get('tiles'):
+        text += f", {stats['tiles']} tiles ({stats['tiles_per_s']:.1f} tiles/s)"
+    return text
+
+
+def format_stage_timings(stats: Dict) -> str:
+    """'decode 120 ms · preprocess 40 ms · <model> ... · postprocess 1 ms'"""
+    timings = stats.get('timings', {})
+    fixed = (STAGE_DECODE, STAGE_PREPROCESS, STAGE_POSTPROCESS)
+    order = [STAGE_DECODE, STAGE_PREPROCESS] + [k for k in timings if k not in fixed] + [STAGE_POSTPROCESS]
+    return " · ".join(f"{stage} {timings[stage] * 1000:.0f} ms" for stage in order if stage in timings)
@@ -0,0 +1,246 @@
+import os
+import time
+import queue
+import threading
+import contextlib
+from typing import Callable, Dict, List, Optional
+import streamlit as st
+
+from media_store import stage_stream, commit_staged, update_meta
+from thumbnails import build_thumbnails, has_thumbnails
+from quality import compute_quality
+from exif_meta import read_header
+from near_duplicates import compute_fingerprint
+
+# Stage order; each stage runs on its own worker threads and hands items on through a bounded queue
+STAGES = ('persist', 'hash', 'header', 'thumbnail', 'quality', 'fingerprint')
+STAGE_LABELS = {
+    'persist': "💾 Persist",
+    'hash': "#️⃣ Hash & dedupe",
+    'header': "🏷️ Header / EXIF",
+    'thumbnail': "🖼️ Thumbnails",
+    'quality': "🔎 Quality metrics",
+    'fingerprint': "🧬 Perceptual hash",
+}
+# Without stored, hashed bytes there is nothing to add to a session; a failure in any later
+# stage is recorded on the media record and the file is added without that stage's output
+FATAL_STAGES = ('persist', 'hash')
+QUEUE_SIZE = 32
+PROGRESS_INTERVAL = 0.1
+
+_CPUS = os.cpu_count() or 1
+DEFAULT_WORKERS = {
+    'persist': 4,
+    # Index commits are serialised by sqlite anyway
+    'hash': 1,
+    'header': 2,
+    'thumbnail': _CPUS,
+    'quality': _CPUS,
+    'fingerprint': _CPUS,
+}
+
+_DONE = object()
+
+
+def _is_image(item: Dict) -> bool:
+    return str(item['record'].get('mime') or item.get('mime') or '').startswith('image')
+
+
+def _persist(item: Dict):
+    with item['open']() as stream:
+        item['staged'] = stage_stream(stream, item['name'], item.get('mime'))
+
+
+def _hash(item: Dict):
+    item['record'] = commit_staged(item.pop('staged'))
+
+
+def _header(item: Dict):
+    record = item['record']
+    if not _is_image(item) or 'header' in record['meta']:
+        return
+    # Marker/IFD walk only: GPS, altitude, gimbal and timestamps without decoding pixels
+    header = read_header(record['path']) or {}
+    exif = header.pop('exif', {})
+    update_meta(record['sha256'], header=header, exif=exif)
+    record['meta']['header'] = header
+    record['meta']['exif'] = exif
+
+
+def _thumbnail(item: Dict):
+    record = item['record']
+    if _is_image(item) and not has_thumbnails(record['sha256']):
+        build_thumbnails(record['sha256'], record['path'])
+
+
+def _quality(item: Dict):
+    record = item['record']
+    if not _is_image(item) or 'quality' in record['meta']:
+        return
+    quality = compute_quality(record['sha256'], record['path'])
+    if quality:
+        record['meta']['quality'] = quality
+
+
+def _fingerprint(item: Dict):
+    record = item['record']
+    if not _is_image(item) or 'fingerprint' in record['meta']:
+        return
+    fingerprint = compute_fingerprint(record['sha256'], record['path'])
+    if fingerprint:
+        record['meta']['fingerprint'] = fingerprint
+
+
+def _record_stage_error(item: Dict, stage: str, error: Optional[str]):
+    """Set or, with error None, clear a non-fatal stage failure on the item and its media record"""
+    record = item['record']
+    errors = dict(record['meta'].get('ingest_errors', {}))
+    if error is None:
+        errors.pop(stage, None)
+    else:
+        errors[stage] = error
+        item.setdefault('ingest_errors', {})[stage] = error
+    record['meta']['ingest_errors'] = errors
+    update_meta(record['sha256'], ingest_errors=errors)
+
+
+STAGE_FUNCS = {
+    'persist': _persist,
+    'hash': _hash,
+    'header': _header,
+    'thumbnail': _thumbnail,
+    'quality': _quality,
+    'fingerprint': _fingerprint,
+}
+
+
+class IngestPipeline:
+    """Persist -> hash -> header -> thumbnail -> quality -> fingerprint, connected by bounded queues"""
+
+    def __init__(self, workers: Optional[Dict[str, int]] = None, queue_size: int = QUEUE_SIZE):
+        self.workers = dict(DEFAULT_WORKERS, **(workers or {}))
+        self.queue_size = queue_size
+        self.completed = {stage: 0 for stage in STAGES}
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def _run_stage(self, stage: str, inbox: queue.Queue, outbox: queue.Queue, alive: List[int], downstream: int):
+        func = STAGE_FUNCS[stage]
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            started = time.perf_counter()
+            if 'error' not in item:
+                try:
+                    func(item)
+                except Exception as e:
+                    if stage in FATAL_STAGES:
+                        item['error'] = f"{stage}: {e}"
+                    else:
+                        _record_stage_error(item, stage, str(e))
+                else:
+                    if stage in item['record']['meta'].get('ingest_errors', {}):
+                        _record_stage_error(item, stage, None)
+            with self._lock:
+                self.completed[stage] += 1
+                self.stage_seconds[stage] += time.perf_counter() - started
+            outbox.put(item)
+        # The last worker of a stage tells every worker of the next stage to stop
+        with self._lock:
+            alive[0] -= 1
+            last = alive[0] == 0
+        if last:
+            for _ in range(downstream):
+                outbox.put(_DONE)
+
+    def run(self, items: List[Dict], on_progress: Optional[Callable[[Dict[str, int], int], None]] = None) -> List[Dict]:
+        """Ingest items ({'name', 'mime', 'open'}) and return them with 'record' or 'error' set
+
+        Items whose later stages failed keep their 'record' and list the failures in 'ingest_errors'.
+        """
+        total = len(items)
+        if not total:
+            return []
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in STAGES]
+        # The final queue is drained by the caller's thread, so it need not be bounded
+        queues.append(queue.Queue())
+        threads = []
+        for i, stage in enumerate(STAGES):
+            downstream = self.workers[STAGES[i + 1]] if i + 1 < len(STAGES) else 1
+            alive = [self.workers[stage]]
+            for _ in range(self.workers[stage]):
+                t = threading.Thread(
+                    target=self._run_stage,
+                    args=(stage, queues[i], queues[i + 1], alive, downstream),
+                    name=f"ingest-{stage}",
+                    daemon=True,
+                )
+                t.start()
+                threads.append(t)
+
+        def feed():
+            for item in items:
+                item.setdefault('record', {'meta': {}})
+                queues[0].put(item)
+            for _ in range(self.workers[STAGES[0]]):
+                queues[0].put(_DONE)
+
+        threading.Thread(target=feed, name="ingest-feed", daemon=True).start()
+
+        while True:
+            try:
+                item = queues[-1].get(timeout=PROGRESS_INTERVAL)
+            except queue.Empty:
+                item = None
+            if item is _DONE:
+                break
+            if on_progress:
+                with self._lock:
+                    snapshot = dict(self.completed)
+                on_progress(snapshot, total)
+        for t in threads:
+            t.join()
+        if on_progress:
+            on_progress(dict(self.completed), total)
+        # Items are updated in place, so the caller gets them back in submission order
+        return items
+
+
+def item_from_upload(uploaded_file) -> Dict:
+    """Pipeline item for a Streamlit UploadedFile, rewound before it is read"""
+    def open_upload():
+        uploaded_file.seek(0)
+        # The uploader owns the buffer; the pipeline must not close it
+        return contextlib.nullcontext(uploaded_file)
+
+    return {'name': uploaded_file.name, 'mime': uploaded_file.type, 'open': open_upload, 'source_size': uploaded_file.size}
+
+
+# Streamlit helpers
+
+def run_ingest_with_progress(items: List[Dict]) -> List[Dict]:
+    """Run the pipeline with one progress bar per stage, updated from the script thread"""
+    total = len(items)
+    bars = {stage: st.progress(0.0, text=f"{STAGE_LABELS[stage]}: 0/{total}") for stage in STAGES}
+
+    def on_progress(completed: Dict[str, int], total: int):
+        for stage, bar in bars.items():
+            bar.progress(completed[stage] / total, text=f"{STAGE_LABELS[stage]}: {completed[stage]}/{total}")
+
+    started = time.perf_counter()
+    pipeline = IngestPipeline()
+    results = pipeline.run(items, on_progress)
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    megabytes = sum(item['record'].get('size', 0) for item in results if 'error' not in item) / (1024 * 1024)
+    st.caption(
+        f"Ingested {total} file(s), {megabytes:.1f} MB in {elapsed:.2f}s "
+        f"({total / elapsed:.1f} files/s, {megabytes / elapsed:.1f} MB/s)"
+    )
+    for item in results:
+        if 'error' in item:
+            st.error(f"Could not ingest {item['name']}: {item['error']}")
+        elif item.get('ingest_errors'):
+            skipped = "; ".join(f"{STAGE_LABELS[stage]} ({error})" for stage, error in item['ingest_errors'].items())
+            st.warning(f"Added {item['name']} without: {skipped}")
+    return results
@@ -0,0 +1,326 @@
+import time
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+import numpy as np
+import streamlit as st
+import cv2
+
+from media_store import lookup, session_media_index
+
+# Live inspection from a stream (RTSP, UDP, HTTP MJPEG, anything FFmpeg opens) or a local
+# file replayed at its own frame rate. A capture thread reads frames as fast as the source
+# delivers them into a small ring buffer; a detection thread takes the oldest frame still in
+# it. When detection falls behind, the oldest buffered frame is dropped, so the feed never
+# queues up stale video and latency stays bounded by the buffer, not by the backlog.
+LIVE_BUFFER_SIZE = 4
+# Latency samples and detections kept for the stats and the panel
+LATENCY_HISTORY = 2000
+RECENT_DETECTIONS = 200
+LIVE_REFRESH = 0.5
+# A feed nobody has looked at for this long (tab closed, session expired) stops itself
+LIVE_IDLE_TIMEOUT = 30.0
+STREAM_SCHEMES = ('rtsp://', 'rtsps://', 'udp://', 'rtp://', 'http://', 'https://', 'tcp://', 'srt://')
+
+DetectFn = Callable[[np.ndarray], List[Dict]]
+
+
+class FrameRing:
+    """Bounded buffer between capture and detection; a put into a full ring drops its oldest frame"""
+
+    def __init__(self, capacity: int = LIVE_BUFFER_SIZE):
+        self._frames: Deque = deque(maxlen=max(1, int(capacity)))
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self._cond:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+            self._frames.append(item)
+            self._cond.notify()
+
+    def get(self, timeout: float = 0.1):
+        """Oldest buffered frame, or None if nothing arrived within timeout"""
+        with self._cond:
+            if not self._frames and not self.closed:
+                self._cond.wait(timeout)
+            return self._frames.popleft() if self._frames else None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def drained(self) -> bool:
+        with self._cond:
+            return self.closed and not self._frames
+
+
+class StreamSource:
+    """A network stream; a frame's glass time is when the capture thread received it"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.name = url
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.url)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open stream {self.url}")
+        # Keep the decoder's own queue short; buffering is the ring's job
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray], float]:
+        ok, frame = self.cap.read()
+        return ok, frame, time.perf_counter()
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class FileReplaySource:
+    """A local video delivered at its recorded frame rate, standing in for a camera in tests and demos
+
+    A frame's glass time is when it is due on the replay clock, so a replay that cannot keep up
+    shows up as latency rather than as a slower clock.
+    """
+
+    def __init__(self, path: str, loop: bool = False, fps: Optional[float] = None):
+        self.path = path
+        self.name = path
+        self.loop = loop
+        self.fps = fps
+        self.cap = None
+        self._started = 0.0
+        self._frames = 0
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video {self.path}")
+        self.fps = self.fps or self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+        self._started = time.perf_counter()
+        self._frames = 0
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray], float]:
+        ok, frame = self.cap.read()
+        if not ok and self.loop and self._frames:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+        if not ok:
+            return False, None, time.perf_counter()
+        due = self._started + self._frames / self.fps
+        self._frames += 1
+        wait = due - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        return True, frame, due
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+def open_stream(url: str) -> StreamSource:
+    """A StreamSource for a network URL; anything else, local paths included, is refused"""
+    url = url.strip()
+    if not url.lower().startswith(STREAM_SCHEMES):
+        raise ValueError(f"Not a stream URL: {url!r}; expected one of {', '.join(STREAM_SCHEMES)}")
+    return StreamSource(url)
+
+
+class LiveIngest:
+    """Runs a source through a detector on two threads and keeps latency and drop statistics"""
+
+    def __init__(self, source, detect_fn: DetectFn, buffer_size: int = LIVE_BUFFER_SIZE,
+                 history: int = LATENCY_HISTORY, idle_timeout: float = LIVE_IDLE_TIMEOUT):
+        self.source = source
+        self.detect_fn = detect_fn
+        self.ring = FrameRing(buffer_size)
+        self.latencies: Deque[float] = deque(maxlen=history)
+        self.recent: Deque[Dict] = deque(maxlen=RECENT_DETECTIONS)
+        self.captured = 0
+        self.processed = 0
+        self.detections = 0
+        self.error: Optional[str] = None
+        # Last analysed frame and its detections, for display and capture
+        self.latest: Optional[Dict] = None
+        # Guards recent and latencies, which the UI reads while the detect thread appends
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._started = 0.0
+        self._finished: Optional[float] = None
+        # Seconds without touch() before the feed stops itself; 0 runs until stopped
+        self.idle_timeout = idle_timeout
+        self._seen = time.monotonic()
+
+    def touch(self):
+        """Record that someone is still watching the feed"""
+        self._seen = time.monotonic()
+
+    def idle(self) -> bool:
+        return bool(self.idle_timeout) and time.monotonic() - self._seen > self.idle_timeout
+
+    def start(self) -> 'LiveIngest':
+        self._started = time.perf_counter()
+        self._threads = [
+            threading.Thread(target=self._capture, name="live-capture", daemon=True),
+            threading.Thread(target=self._detect, name="live-detect", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until the source ends and every buffered frame has been analysed"""
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _capture(self):
+        try:
+            self.source.open()
+            index = 0
+            while not self._stop.is_set():
+                if self.idle():
+                    self.error = f"Stopped after {self.idle_timeout:.0f} s without a viewer"
+                    break
+                ok, frame, glass = self.source.read()
+                if not ok:
+                    break
+                self.ring.put((index, glass, frame))
+                self.captured += 1
+                index += 1
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.source.close()
+            self.ring.close()
+
+    def _detect(self):
+        try:
+            while not self._stop.is_set():
+                item = self.ring.get()
+                if item is None:
+                    if self.ring.drained():
+                        break
+                    continue
+                index, glass, frame = item
+                detections = self.detect_fn(frame)
+                latency = time.perf_counter() - glass
+                timestamp = round(glass - self._started, 3)
+                for det in detections:
+                    det['frame_index'] = index
+                    det['timestamp'] = timestamp
+                with self._lock:
+                    self.latencies.append(latency)
+                    self.recent.extend(detections)
+                    self.processed += 1
+                    self.detections += len(detections)
+                self.latest = {'index': index, 'frame': frame, 'detections': detections, 'latency': latency}
+        except Exception as e:
+            self.error = str(e)
+            self._stop.set()
+        finally:
+            self._finished = time.perf_counter()
+            close = getattr(self.detect_fn, 'close', None)
+            if close:
+                close()
+
+    def snapshot(self) -> Tuple[List[Dict], List[float]]:
+        """Copies of the recent detections and latency samples, safe to read while the feed runs"""
+        with self._lock:
+            return list(self.recent), list(self.latencies)
+
+    def stats(self) -> Dict:
+        _, latencies = self.snapshot()
+        elapsed = max((self._finished or time.perf_counter()) - self._started, 1e-6)
+        stats = {
+            'source': self.source.name,
+            'captured': self.captured,
+            'processed': self.processed,
+            'dropped': self.ring.dropped,
+            'drop_rate': self.ring.dropped / self.captured if self.captured else 0.0,
+            'capture_fps': self.captured / elapsed,
+            'detect_fps': self.processed / elapsed,
+            'detections': self.detections,
+            'seconds': elapsed,
+        }
+        if latencies:
+            p50, p95, p99 = np.percentile(np.asarray(latencies, dtype=np.float64), [50, 95, 99]) * 1000.0
+            stats['latency_ms'] = {'p50': p50, 'p95': p95, 'p99': p99, 'max': max(latencies) * 1000.0}
+        if self.error:
+            stats['error'] = self.error
+        return stats
+
+
+def format_live_stats(stats: Dict) -> str:
+    """'412 frames captured (30.0 frames/s), 96 analysed, 316 dropped (77%); glass-to-detection p50 ...'"""
+    text = (
+        f"{stats['captured']} frames captured ({stats['capture_fps']:.1f} frames/s), "
+        f"{stats['processed']} analysed ({stats['detect_fps']:.1f} frames/s), "
+        f"{stats['dropped']} dropped ({stats['drop_rate'] * 100:.0f}%)"
+    )
+    latency = stats.get('latency_ms')
+    if latency:
+        text += (f"; glass-to-detection {latency['p50']:.0f} ms p50, {latency['p95']:.0f} ms p95, "
+                 f"{latency['p99']:.0f} ms p99")
+    return text
+
+
+def annotate(frame: np.ndarray, detections: List[Dict]) -> np.ndarray:
+    """Copy of a BGR frame with detection boxes and labels drawn on it"""
+    out = frame.copy()
+    for det in detections:
+        x1, y1, x2, y2 = (int(v) for v in det['bbox'])
+        cv2.rectangle(out, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        cv2.putText(out, f"{det['defect_type']} {det['confidence']:.2f}", (x1, max(12, y1 - 4)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    return out
+
+
+# Streamlit helpers
+
+def replay_source(sha256: str, loop: bool = False) -> FileReplaySource:
+    """Replay of one of this session's own videos, resolved through the media store by hash"""
+    if sha256 not in session_media_index():
+        raise ValueError("Only media added to this session can be replayed")
+    record = lookup(sha256)
+    if record is None:
+        raise ValueError("The video is no longer in the media store")
+    return FileReplaySource(record['path'], loop=loop)
+
+
+def start_live_session(source, detect_fn: DetectFn, buffer_size: int = LIVE_BUFFER_SIZE) -> LiveIngest:
+    """Start a feed for this session, stopping any feed it already had"""
+    stop_live_session()
+    ingest = LiveIngest(source, detect_fn, buffer_size=buffer_size).start()
+    st.session_state.live_ingest = ingest
+    return ingest
+
+
+def stop_live_session() -> Optional[Dict]:
+    """Stop this session's feed and return its final stats"""
+    ingest = st.session_state.pop('live_ingest', None)
+    if ingest is None:
+        return None
+    ingest.stop()
+    st.session_state.live_stats = ingest.stats()
+    return st.session_state.live_stats
+
+
+def live_session() -> Optional[LiveIngest]:
+    return st.session_state.get('live_ingest')
@@ -0,0 +1,345 @@
+import os
+import io
+import json
+import sqlite3
+import hashlib
+import secrets
+import tempfile
+from datetime import datetime
+import streamlit as st
+from typing import Optional, Dict, Tuple, BinaryIO
+
+# Content-addressed media store shared by every session and user.
+# Layout: <STORE_ROOT>/objects/<aa>/<bb>/<sha256><ext>, indexed in <STORE_ROOT>/index.db
+STORE_ROOT = os.environ.get(
+    'FLYSCOPE_STORE_DIR', os.path.join(os.path.dirname(__file__), 'media_store')
+)
+OBJECTS_DIR = os.path.join(STORE_ROOT, 'objects')
+INDEX_PATH = os.path.join(STORE_ROOT, 'index.db')
+STAGING_DIR = os.path.join(STORE_ROOT, 'staging')
+
+# Query parameter carrying the store session across browser refreshes
+SESSION_PARAM = 'sid'
+
+# Uploads are copied in fixed-size chunks so peak memory does not grow with file size
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def get_conn():
+    conn = sqlite3.connect(INDEX_PATH, check_same_thread=False, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_store():
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media (
+            sha256 TEXT PRIMARY KEY,
+            ext TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mime TEXT,
+            created_at TEXT NOT NULL,
+            last_access TEXT NOT NULL,
+            meta TEXT NOT NULL DEFAULT '{}'
+        );
+        """
+    )
+    # Which sessions still reference which blobs; unreferenced blobs are eviction candidates
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS refs (
+            session_id TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (session_id, sha256)
+        );
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            last_seen TEXT NOT NULL
+        );
+        """
+    )
+    # Stores created before ingest-time metadata existed
+    columns = [row['name'] for row in cur.execute("PRAGMA table_info(media)")]
+    if 'meta' not in columns:
+        cur.execute("ALTER TABLE media ADD COLUMN meta TEXT NOT NULL DEFAULT '{}'")
+    conn.commit()
+    conn.close()
+
+
+def object_path(sha256: str, ext: str) -> str:
+    """Location of a blob inside the store (two levels of fan-out keep directories small)"""
+    return os.path.join(OBJECTS_DIR, sha256[:2], sha256[2:4], f"{sha256}{ext}")
+
+
+def normalize_ext(name: str) -> str:
+    ext = os.path.splitext(name)[1].lower()
+    return ext if ext else '.bin'
+
+
+def _record(row) -> Dict:
+    return {
+        'sha256': row['sha256'],
+        'ext': row['ext'],
+        'size': row['size'],
+        'mime': row['mime'],
+        'path': object_path(row['sha256'], row['ext']),
+        'created_at': row['created_at'],
+        'meta': json.loads(row['meta'] or '{}'),
+    }
+
+
+def lookup(sha256: str) -> Optional[Dict]:
+    """Return the index record for a hash, or None if the blob is not stored"""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM media WHERE sha256 = ?", (sha256,))
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return None
+    record = _record(row)
+    if not os.path.exists(record['path']):
+        return None
+    return record
+
+
+def touch(sha256: str):
+    conn = get_conn()
+    conn.execute("UPDATE media SET last_access = ? WHERE sha256 = ?", (datetime.utcnow().isoformat(), sha256))
+    conn.commit()
+    conn.close()
+
+
+def update_meta(sha256: str, **fields):
+    """Merge ingest-time results (quality metrics, EXIF, ...) into a media record"""
+    conn = get_conn()
+    cur = conn.cursor()
+    # BEGIN IMMEDIATE serialises the read-modify-write against other ingest workers
+    cur.execute("BEGIN IMMEDIATE")
+    cur.execute("SELECT meta FROM media WHERE sha256 = ?", (sha256,))
+    row = cur.fetchone()
+    if row:
+        meta = json.loads(row['meta'] or '{}')
+        meta.update(fields)
+        cur.execute("UPDATE media SET meta = ? WHERE sha256 = ?", (json.dumps(meta), sha256))
+    conn.commit()
+    conn.close()
+
+
+def _index(sha256: str, ext: str, size: int, mime: Optional[str]):
+    now = datetime.utcnow().isoformat()
+    conn = get_conn()
+    conn.execute(
+        "INSERT OR IGNORE INTO media (sha256, ext, size, mime, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+        (sha256, ext, size, mime, now, now),
+    )
+    conn.execute("UPDATE media SET last_access = ? WHERE sha256 = ?", (now, sha256))
+    conn.commit()
+    conn.close()
+
+
+def sniff_format(head: bytes) -> Optional[Tuple[str, str]]:
+    """Identify a media container from its leading bytes; returns (ext, mime) or None"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return '.jpg', 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png', 'image/png'
+    if head[:4] in (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+'):
+        return '.tif', 'image/tiff'
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return '.avi', 'video/x-msvideo'
+    if head[4:8] == b'ftyp':
+        if head[8:12] == b'qt  ':
+            return '.mov', 'video/quicktime'
+        return '.mp4', 'video/mp4'
+    return None
+
+
+def stage_stream(stream: BinaryIO, name: str, mime: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> Dict:
+    """Copy a stream to a staging file chunk by chunk, hashing and sniffing the format as it goes"""
+    digest = hashlib.sha256()
+    size = 0
+    sniffed = None
+    fd, staged_path = tempfile.mkstemp(dir=STAGING_DIR, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                if size == 0:
+                    sniffed = sniff_format(chunk[:16])
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.unlink(staged_path)
+        raise
+    ext, sniffed_mime = sniffed if sniffed else (normalize_ext(name), None)
+    return {
+        'staged_path': staged_path,
+        'sha256': digest.hexdigest(),
+        'ext': ext,
+        'size': size,
+        'mime': sniffed_mime or mime,
+    }
+
+
+def commit_staged(staged: Dict) -> Dict:
+    """Move a staged file to its content address, or drop it if the hash is already stored"""
+    sha256 = staged['sha256']
+    try:
+        existing = lookup(sha256)
+        if existing:
+            touch(sha256)
+            return existing
+
+        path = object_path(sha256, staged['ext'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Staging lives on the same filesystem, so the rename is atomic and never exposes a partial blob
+        os.replace(staged['staged_path'], path)
+        _index(sha256, staged['ext'], staged['size'], staged['mime'])
+    finally:
+        if os.path.exists(staged['staged_path']):
+            os.unlink(staged['staged_path'])
+    return lookup(sha256)
+
+
+def put_stream(stream: BinaryIO, name: str, mime: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> Dict:
+    """Stream a file into the store; peak memory is one chunk regardless of file size"""
+    return commit_staged(stage_stream(stream, name, mime, chunk_size))
+
+
+def put_bytes(data: bytes, name: str, mime: Optional[str] = None) -> Dict:
+    """Store an in-memory blob (small generated images such as samples and captured frames)"""
+    return put_stream(io.BytesIO(data), name, mime)
+
+
+def add_ref(session_id: str, sha256: str):
+    conn = get_conn()
+    conn.execute(
+        "INSERT OR IGNORE INTO refs (session_id, sha256, created_at) VALUES (?, ?, ?)",
+        (session_id, sha256, datetime.utcnow().isoformat()),
+    )
+    conn.commit()
+    conn.close()
+
+
+def drop_ref(session_id: str, sha256: str):
+    conn = get_conn()
+    conn.execute("DELETE FROM refs WHERE session_id = ? AND sha256 = ?", (session_id, sha256))
+    conn.commit()
+    conn.close()
+
+
+def drop_session_refs(session_id: str):
+    conn = get_conn()
+    conn.execute("DELETE FROM refs WHERE session_id = ?", (session_id,))
+    conn.commit()
+    conn.close()
+
+
+def heartbeat(session_id: str):
+    conn = get_conn()
+    conn.execute(
+        "INSERT INTO sessions (session_id, last_seen) VALUES (?, ?) "
+        "ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen",
+        (session_id, datetime.utcnow().isoformat()),
+    )
+    conn.commit()
+    conn.close()
+
+
+def known_session(session_id: str) -> bool:
+    """Whether the session has sent a heartbeat and has not expired since"""
+    conn = get_conn()
+    row = conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+    conn.close()
+    return row is not None
+
+
+# Streamlit helpers
+
+def current_session_id() -> str:
+    """Stable id for this browser session, used to track its references into the store
+
+    A refresh starts a new Streamlit session, so the id is also kept in the URL and taken
+    up again from there as long as the store still knows it.
+    """
+    if 'store_session_id' not in st.session_state:
+        session_id = st.query_params.get(SESSION_PARAM)
+        if not session_id or not known_session(session_id):
+            session_id = secrets.token_hex(16)
+            heartbeat(session_id)
+        st.session_state.store_session_id = session_id
+        st.query_params[SESSION_PARAM] = session_id
+    return st.session_state.store_session_id
+
+
+def session_media_index() -> Dict[str, Dict]:
+    """Per-session map of sha256 -> file_info, kept in step with uploaded_media"""
+    if 'uploaded_media' not in st.session_state:
+        st.session_state.uploaded_media = []
+        st.session_state.pop('media_by_hash', None)
+    if 'media_by_hash' not in st.session_state:
+        st.session_state.media_by_hash = {
+            m['sha256']: m for m in st.session_state.uploaded_media if m.get('sha256')
+        }
+    return st.session_state.media_by_hash
+
+
+def file_info_for(record: Dict, name: str, mime: Optional[str] = None) -> Dict:
+    """The file_info dict analysis works on, for a stored blob and the name it was added under"""
+    file_info = {
+        'name': name,
+        'path': record['path'],
+        'type': mime or record['mime'] or 'application/octet-stream',
+        'size': record['size'],
+        'sha256': record['sha256'],
+    }
+    file_info.update(record.get('meta', {}))
+    return file_info
+
+
+def add_to_session(record: Dict, name: str, mime: Optional[str] = None) -> bool:
+    """Add a stored blob to uploaded_media; returns False if it is already there"""
+    index = session_media_index()
+    if record['sha256'] in index:
+        return False
+    file_info = file_info_for(record, name, mime)
+    st.session_state.uploaded_media.append(file_info)
+    index[record['sha256']] = file_info
+    add_ref(current_session_id(), record['sha256'])
+    return True
+
+
+def remove_from_session(file_info: Dict):
+    """Drop a file from this session; the shared blob stays in the store"""
+    index = session_media_index()
+    index.pop(file_info.get('sha256'), None)
+    if file_info in st.session_state.uploaded_media:
+        st.session_state.uploaded_media.remove(file_info)
+    if file_info.get('sha256'):
+        drop_ref(current_session_id(), file_info['sha256'])
+
+
+def clear_session_media():
+    """Forget every upload in this session and release its references into the store"""
+    for key in ['uploaded_media', 'media_by_hash', 'upload_digests']:
+        if key in st.session_state:
+            del st.session_state[key]
+    drop_session_refs(current_session_id())
+
+
+# Initialize store on import
+init_store()
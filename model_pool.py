@@ -0,0 +1,179 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from detectors import DEFAULT_BACKEND, Detector, create_detector
+
+# One pool of loaded models per process, shared by every session, engine and live feed in it.
+# A model is loaded the first time an engine asks for it and stays resident until the pool
+# has to make room: once the resident models exceed the memory budget, the least recently
+# used ones are evicted. Engines hold a lease on each model they use. Evicting a leased model
+# only drops the pool's reference; it is unloaded when its last lease is released, and an
+# engine asking for it before then gets it back without a reload.
+# The budget is node-wide: analysis_jobs splits it between the server and its job workers,
+# each of which runs its own pool.
+GB = 1024 ** 3
+MODEL_MEMORY_BUDGET = int(float(os.environ.get('FLYSCOPE_MODEL_MEMORY_GB', 4)) * GB)
+
+ModelKey = Tuple[str, str]
+
+
+class ModelPool:
+    """LRU cache of loaded detectors, bounded by their reported memory"""
+
+    def __init__(self, budget_bytes: int = MODEL_MEMORY_BUDGET):
+        self.budget_bytes = budget_bytes
+        # Most recently used last; values are (detector, resident bytes)
+        self._models: 'OrderedDict[ModelKey, Tuple[Detector, int]]' = OrderedDict()
+        # Evicted models that engines still lease, unloaded on their last release
+        self._retired: Dict[ModelKey, Tuple[Detector, int]] = {}
+        self._leases: Dict[ModelKey, int] = {}
+        self._lock = threading.Lock()
+        # Two sessions asking for the same cold model wait for one load instead of doing two
+        self._loading: Dict[ModelKey, threading.Lock] = {}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+        self.evict_seconds = 0.0
+        self.timings: Dict[str, Dict] = {}
+
+    def acquire(self, model_name: str, backend: str = DEFAULT_BACKEND) -> Detector:
+        """The loaded detector, leased to the caller until release()"""
+        key = (model_name, backend)
+        with self._lock:
+            detector = self._hit(key)
+            if detector is not None:
+                return detector
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            with self._lock:
+                detector = self._hit(key)
+                if detector is not None:
+                    return detector
+            started = time.perf_counter()
+            detector = create_detector(model_name, backend)
+            detector.load()
+            seconds = time.perf_counter() - started
+            with self._lock:
+                self._models[key] = (detector, detector.memory_bytes())
+                self._leases[key] = self._leases.get(key, 0) + 1
+                self._loading.pop(key, None)
+                self.loads += 1
+                self.load_seconds += seconds
+                timing = self.timings.setdefault(model_name, {'loads': 0, 'load_seconds': 0.0, 'evictions': 0})
+                timing['loads'] += 1
+                timing['load_seconds'] += seconds
+                self._evict_over_budget(keep=key)
+            return detector
+
+    def _hit(self, key: ModelKey) -> Optional[Detector]:
+        if key in self._retired:
+            # Still leased since its eviction; take it back rather than load a second copy
+            self._models[key] = self._retired.pop(key)
+            self._evict_over_budget(keep=key)
+        elif key not in self._models:
+            return None
+        self._models.move_to_end(key)
+        self._leases[key] = self._leases.get(key, 0) + 1
+        self.hits += 1
+        return self._models[key][0]
+
+    def release(self, model_name: str, backend: str = DEFAULT_BACKEND):
+        key = (model_name, backend)
+        with self._lock:
+            leases = self._leases.get(key, 0) - 1
+            if leases > 0:
+                self._leases[key] = leases
+                return
+            self._leases.pop(key, None)
+            if key in self._retired:
+                self._retired.pop(key)[0].unload()
+
+    def _evict_over_budget(self, keep: Optional[ModelKey]):
+        while self.resident_bytes() > self.budget_bytes and len(self._models) > 1:
+            candidates = [k for k in self._models if k != keep]
+            # Evicting an idle model frees its memory now; a leased one only once its engines finish
+            key = next((k for k in candidates if not self._leases.get(k)), candidates[0])
+            self._evict(key)
+
+    def _evict(self, key: ModelKey):
+        started = time.perf_counter()
+        entry = self._models.pop(key)
+        if self._leases.get(key):
+            self._retired[key] = entry
+        else:
+            entry[0].unload()
+        self.evictions += 1
+        self.evict_seconds += time.perf_counter() - started
+        self.timings.setdefault(key[0], {'loads': 0, 'load_seconds': 0.0, 'evictions': 0})['evictions'] += 1
+
+    def evict(self, model_name: str, backend: str = DEFAULT_BACKEND) -> bool:
+        with self._lock:
+            if (model_name, backend) not in self._models:
+                return False
+            self._evict((model_name, backend))
+            return True
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._models):
+                self._evict(key)
+
+    def resident_bytes(self) -> int:
+        return sum(size for _, size in self._models.values())
+
+    def retired_bytes(self) -> int:
+        return sum(size for _, size in self._retired.values())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'resident': [name for name, _ in self._models],
+                'resident_bytes': self.resident_bytes(),
+                'budget_bytes': self.budget_bytes,
+                'leased': sorted(name for name, _ in self._leases),
+                'retired': [name for name, _ in self._retired],
+                'retired_bytes': self.retired_bytes(),
+                'hits': self.hits,
+                'loads': self.loads,
+                'evictions': self.evictions,
+                'load_seconds': self.load_seconds,
+                'evict_seconds': self.evict_seconds,
+                'timings': {name: dict(timing) for name, timing in self.timings.items()},
+            }
+
+
+_pool: Optional[ModelPool] = None
+_pool_lock = threading.Lock()
+
+
+def model_pool() -> ModelPool:
+    """The process-wide pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ModelPool()
+        return _pool
+
+
+def set_model_budget(budget_bytes: int):
+    """Set this process's share of the model memory budget, evicting down to it"""
+    pool = model_pool()
+    with pool._lock:
+        pool.budget_bytes = budget_bytes
+        pool._evict_over_budget(keep=None)
+
+
+def format_pool_stats(stats: Dict) -> str:
+    """'2 model(s) resident (0.8 of 4.0 GB), 3 load(s) in 1.20 s, 1 eviction(s), 14 hit(s)'"""
+    text = (
+        f"{len(stats['resident'])} model(s) resident ({stats['resident_bytes'] / GB:.1f} of "
+        f"{stats['budget_bytes'] / GB:.1f} GB), {stats['loads']} load(s) in {stats['load_seconds']:.2f} s, "
+        f"{stats['evictions']} eviction(s) in {stats['evict_seconds'] * 1000:.0f} ms, {stats['hits']} hit(s)"
+    )
+    if stats.get('retired'):
+        text += f"; {len(stats['retired'])} evicted model(s) still in use ({stats['retired_bytes'] / GB:.1f} GB)"
+    return text
@@ -0,0 +1,155 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image
+
+from media_store import update_meta
+from thumbnails import get_thumbnail
+
+# Perceptual fingerprints for spotting near-identical frames: hover shots, bursts, a drone
+# holding position. Both hashes are 64-bit and computed at ingest from the 128 px thumbnail.
+# Frames within the Hamming threshold of a cluster's representative on both hashes are
+# analysed once, through the representative, and share its result.
+FINGERPRINT_LEVEL = 128
+HASH_SIZE = 8
+PHASH_SIZE = 32
+DEFAULT_HAMMING = 6
+MAX_HAMMING = 20
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def _bits(mask: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(mask.ravel()).tobytes(), 'big')
+
+
+def dhash(gray: Image.Image) -> int:
+    """Brighter-than-right-neighbour bits of a 9x8 reduction"""
+    pixels = np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR), dtype=np.float32)
+    return _bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(gray: Image.Image) -> int:
+    """Low 8x8 DCT frequencies of a 32x32 reduction against their median, DC term left out"""
+    pixels = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.BILINEAR), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    return _bits(low > np.median(low.ravel()[1:]))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def compute_fingerprint(sha256: str, source_path: str) -> Optional[Dict]:
+    """dHash and pHash of one image as hex strings, stored on its media record"""
+    thumb_path = get_thumbnail(sha256, source_path, FINGERPRINT_LEVEL)
+    if not thumb_path:
+        return None
+    with Image.open(thumb_path) as img:
+        gray = img.convert('L')
+    fingerprint = {'dhash': f"{dhash(gray):016x}", 'phash': f"{phash(gray):016x}"}
+    update_meta(sha256, fingerprint=fingerprint)
+    return fingerprint
+
+
+class BKTree:
+    """Metric tree over 64-bit hashes; a radius search only visits subtrees the triangle inequality allows"""
+
+    def __init__(self):
+        # Node: [hash, payloads, {distance: child}]
+        self.root: Optional[list] = None
+        self.size = 0
+
+    def add(self, value: int, payload):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [payload], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(payload)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [payload], {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, object]]:
+        """(distance, payload) for every stored hash within radius, nearest first"""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, payload) for payload in node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        found.sort(key=lambda match: match[0])
+        return found
+
+
+def _hashes(file_info: Dict) -> Optional[Tuple[int, int]]:
+    if not str(file_info.get('type', '')).startswith('image') or not file_info.get('sha256'):
+        return None
+    fingerprint = file_info.get('fingerprint')
+    if not fingerprint:
+        # Media ingested before fingerprints existed get one on first use
+        fingerprint = compute_fingerprint(file_info['sha256'], file_info['path'])
+        if not fingerprint:
+            return None
+        file_info['fingerprint'] = fingerprint
+    return int(fingerprint['phash'], 16), int(fingerprint['dhash'], 16)
+
+
+def cluster_near_duplicates(file_infos: Sequence[Dict], threshold: int = DEFAULT_HAMMING) -> Dict[int, List[Tuple[int, int]]]:
+    """{representative index: [(member index, pHash distance), ...]} for every cluster with members
+
+    Leader clustering in input order: a frame joins the nearest earlier representative within
+    the threshold on both hashes, or becomes a representative itself. Every member is
+    therefore close to its own representative, not merely chained to it through others.
+    """
+    tree = BKTree()
+    clusters: Dict[int, List[Tuple[int, int]]] = {}
+    for i, file_info in enumerate(file_infos):
+        try:
+            hashes = _hashes(file_info)
+        except Exception:
+            hashes = None
+        if hashes is None:
+            continue
+        p, d = hashes
+        leader = next((
+            (distance, rep) for distance, (rep, rep_d) in tree.search(p, threshold)
+            if hamming(d, rep_d) <= threshold
+        ), None)
+        if leader is None:
+            tree.add(p, (i, d))
+        else:
+            clusters.setdefault(leader[1], []).append((i, leader[0]))
+    return clusters
+
+
+def format_duplicate_stats(stats: Dict) -> str:
+    """'14 near-duplicate frame(s) took the result of 3 representative(s) (Hamming <= 6)'"""
+    return (
+        f"{stats['linked']} near-duplicate frame(s) took the result of {stats['clusters']} "
+        f"representative(s) (Hamming <= {stats['threshold']})"
+    )
+
+
+def duplicate_caption(result: Dict) -> Optional[str]:
+    if not result.get('duplicate_of'):
+        return None
+    return f"🧬 Near-duplicate of {result['duplicate_of']} (Hamming {result['duplicate_distance']}); result shared"
@@ -0,0 +1,257 @@
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+
+from detectors import defect_info
+
+# Box post-processing on arrays. Boxes are (K, 4) float arrays of x1, y1, x2, y2. Rather than
+# a dense K x K IoU matrix, boxes are sorted on x1 and only pairs whose x extents overlap are
+# scored, giving a sparse IoU matrix in (i, j, iou) form; thousands of boxes per image take
+# milliseconds.
+NMS_IOU = 0.5
+FUSION_IOU = 0.55
+
+
+def to_arrays(detections: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(boxes, scores, class ids) where class ids index the sorted set of model names"""
+    if not detections:
+        return np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=np.int64)
+    boxes = np.array([d['bbox'] for d in detections], dtype=np.float64)
+    scores = np.array([d['confidence'] for d in detections], dtype=np.float64)
+    _, labels = np.unique([d['model'] for d in detections], return_inverse=True)
+    return boxes, scores, labels
+
+
+def _areas(boxes: np.ndarray) -> np.ndarray:
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def overlapping_pairs(boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(i, j, intersection area) for every unordered pair of boxes that intersect"""
+    n = len(boxes)
+    order = np.argsort(boxes[:, 0], kind='stable')
+    x1 = boxes[order, 0]
+    # Boxes later in x1 order that start before this one ends
+    start = np.arange(1, n + 1)
+    counts = np.maximum(np.searchsorted(x1, boxes[order, 2], side='left') - start, 0)
+    first = np.repeat(np.arange(n), counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    i, j = order[first], order[np.repeat(start, counts) + within]
+    iw = np.minimum(boxes[i, 2], boxes[j, 2]) - np.maximum(boxes[i, 0], boxes[j, 0])
+    ih = np.minimum(boxes[i, 3], boxes[j, 3]) - np.maximum(boxes[i, 1], boxes[j, 1])
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    hit = inter > 0
+    return i[hit], j[hit], inter[hit]
+
+
+def pair_iou(boxes: np.ndarray, i: np.ndarray, j: np.ndarray, inter: np.ndarray) -> np.ndarray:
+    areas = _areas(boxes)
+    return inter / np.maximum(areas[i] + areas[j] - inter, 1e-9)
+
+
+def _suppressed(scores: np.ndarray, i: np.ndarray, j: np.ndarray, over: np.ndarray) -> np.ndarray:
+    """True for boxes that a higher-scored partner overlaps past the threshold (`over` per pair)"""
+    suppressed = np.zeros(len(scores), dtype=bool)
+    # Ties go to the lower index, matching a stable sort on descending score
+    i_wins = (scores[i] > scores[j]) | ((scores[i] == scores[j]) & (i < j))
+    suppressed[np.where(i_wins, j, i)[over]] = True
+    return suppressed
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, labels: np.ndarray, iou_threshold: float = NMS_IOU) -> np.ndarray:
+    """Indices kept by per-class non-maximum suppression, highest score first
+
+    A box is dropped when any higher-scored box of its class overlaps it past the threshold,
+    decided for all pairs at once rather than in a sequential greedy pass.
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    i, j, inter = overlapping_pairs(boxes)
+    over = (labels[i] == labels[j]) & (pair_iou(boxes, i, j, inter) > iou_threshold)
+    keep = np.nonzero(~_suppressed(scores, i, j, over))[0]
+    return keep[np.argsort(-scores[keep], kind='stable')]
+
+
+def fuse_boxes(boxes: np.ndarray, scores: np.ndarray,
+               iou_threshold: float = FUSION_IOU) -> Tuple[np.ndarray, Dict[int, np.ndarray]]:
+    """Weighted box fusion: (cluster head per box, fused box per head)
+
+    Heads are boxes no higher-scored box overlaps; every other box joins the head it overlaps
+    most, and each cluster's box is the score-weighted mean of its members.
+    """
+    n = len(boxes)
+    i, j, inter = overlapping_pairs(boxes)
+    ious = pair_iou(boxes, i, j, inter)
+    over = ious > iou_threshold
+    is_head = ~_suppressed(scores, i, j, over)
+    # Both directions of every close pair, keeping only member -> head links
+    member = np.concatenate([i[over], j[over]])
+    head = np.concatenate([j[over], i[over]])
+    link_iou = np.concatenate([ious[over], ious[over]])
+    link = ~is_head[member] & is_head[head]
+    member, head, link_iou = member[link], head[link], link_iou[link]
+    cluster = np.arange(n)
+    if len(member):
+        # Best head per member: sorted by member then IoU descending, the first entry wins
+        by_iou = np.lexsort((-link_iou, member))
+        first = np.unique(member[by_iou], return_index=True)[1]
+        cluster[member[by_iou][first]] = head[by_iou][first]
+    # A box whose close neighbours were all absorbed themselves keeps its own cluster
+    heads = np.unique(cluster)
+    sums = np.zeros((n, 4))
+    np.add.at(sums, cluster, boxes * scores[:, None])
+    totals = np.zeros(n)
+    np.add.at(totals, cluster, scores)
+    fused = sums[heads] / totals[heads, None]
+    return cluster, dict(zip(heads.tolist(), fused))
+
+
+def _fuse_same_type(detections: List[Dict], fusion_iou: float) -> List[Dict]:
+    """Weighted box fusion within one defect type, scored as WBF does
+
+    A cluster's confidence is the mean of its members' scores scaled by model agreement: the
+    share of the models reporting this defect type that put a box in the cluster.
+    """
+    boxes, scores, labels = to_arrays(detections)
+    cluster, fused = fuse_boxes(boxes, scores, fusion_iou)
+    n_models = int(labels.max()) + 1
+    totals = np.bincount(cluster, weights=scores, minlength=len(detections))
+    sizes = np.bincount(cluster, minlength=len(detections))
+    results = []
+    for head, box in fused.items():
+        det = detections[head]
+        members = np.nonzero(cluster == head)[0]
+        agreeing = len(np.unique(labels[members]))
+        confidence = float(totals[head] / sizes[head]) * agreeing / n_models
+        if sizes[head] > 1:
+            det = dict(det)
+            det['bbox'] = [int(round(v)) for v in box]
+            det['fused_models'] = sorted({detections[m]['model'] for m in members.tolist()})
+        if confidence != det['confidence']:
+            det = dict(det)
+            det['confidence'] = confidence
+            det['severity'] = defect_info(det['model'], confidence)['severity']
+        results.append(det)
+    return results
+
+
+def suppress_and_fuse(detections: List[Dict], iou_threshold: float = NMS_IOU,
+                      fusion_iou: float = FUSION_IOU, fuse: bool = True) -> List[Dict]:
+    """Per-model NMS, then weighted fusion of same-type boxes models put on the same region"""
+    if len(detections) < 2:
+        return detections
+    boxes, scores, labels = to_arrays(detections)
+    keep = nms(boxes, scores, labels, iou_threshold)
+    kept = [detections[i] for i in keep]
+    if not fuse or len(kept) < 2:
+        return kept
+    # Boxes of different defect types are never fused, however much they overlap
+    by_type = {}
+    for det in kept:
+        by_type.setdefault(det['defect_type'], []).append(det)
+    results = []
+    for group in by_type.values():
+        results.extend(_fuse_same_type(group, fusion_iou) if len(group) > 1 else group)
+    results.sort(key=lambda d: -d['confidence'])
+    return results
+
+
+def merge_augmented(views: List[List[Dict]], confidence_threshold: float,
+                    iou_threshold: float = FUSION_IOU) -> List[Dict]:
+    """Test-time augmentation: fuse one model's detections from several views of the same input
+
+    Boxes are fused across views and scored by their mean confidence over all views, a view
+    that found nothing there counting as zero; regions that fall under the threshold are dropped.
+    """
+    detections = [det for view in views for det in view]
+    if not detections:
+        return []
+    boxes, scores, _ = to_arrays(detections)
+    cluster, fused = fuse_boxes(boxes, scores, iou_threshold)
+    totals = np.bincount(cluster, weights=scores, minlength=len(detections))
+    results = []
+    for head, box in fused.items():
+        confidence = float(totals[head] / len(views))
+        if confidence < confidence_threshold:
+            continue
+        det = dict(detections[head])
+        det['bbox'] = [int(round(v)) for v in box]
+        det['confidence'] = confidence
+        det['severity'] = defect_info(det['model'], confidence)['severity']
+        results.append(det)
+    return results
+
+
+def fuse_frames(detections: List[Dict], iou_threshold: float = NMS_IOU,
+                fusion_iou: float = FUSION_IOU, fuse: bool = True) -> List[Dict]:
+    """suppress_and_fuse over detections gathered model by model; video frames are handled separately"""
+    frames = {}
+    for det in detections:
+        frames.setdefault(det.get('frame_index'), []).append(det)
+    if len(frames) < 2:
+        return suppress_and_fuse(detections, iou_threshold, fusion_iou, fuse)
+    results = []
+    for frame in sorted(frames, key=lambda f: -1 if f is None else f):
+        results.extend(suppress_and_fuse(frames[frame], iou_threshold, fusion_iou, fuse))
+    return results
+
+
+def seam_bands(origins: Sequence[Tuple[int, int]], tile_size: int, axis: int) -> List[Tuple[int, int]]:
+    """(start, end) of the strips neighbouring tiles share along one axis (0: x, 1: y)"""
+    starts = sorted({origin[axis] for origin in origins})
+    return [(start, end + tile_size) for end, start in zip(starts, starts[1:])]
+
+
+def _seam_links(boxes: np.ndarray, labels: np.ndarray, bands: List[Tuple[int, int]],
+                axis: int, min_overlap: float) -> Tuple[np.ndarray, np.ndarray]:
+    across = 1 - axis
+    links_i, links_j = [], []
+    for start, end in bands:
+        near = np.nonzero((boxes[:, axis] <= end) & (boxes[:, axis + 2] >= start))[0]
+        if len(near) < 2:
+            continue
+        a, b = np.triu_indices(len(near), 1)
+        i, j = near[a], near[b]
+        # The pieces meet across the seam...
+        meet = np.minimum(boxes[i, axis + 2], boxes[j, axis + 2]) >= np.maximum(boxes[i, axis], boxes[j, axis])
+        # ...and line up along it
+        inter = np.minimum(boxes[i, across + 2], boxes[j, across + 2]) - np.maximum(boxes[i, across], boxes[j, across])
+        union = np.maximum(boxes[i, across + 2], boxes[j, across + 2]) - np.minimum(boxes[i, across], boxes[j, across])
+        aligned = np.clip(inter, 0, None) / np.maximum(union, 1e-9) >= min_overlap
+        linked = (labels[i] == labels[j]) & meet & aligned
+        links_i.append(i[linked])
+        links_j.append(j[linked])
+    if not links_i:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(links_i), np.concatenate(links_j)
+
+
+def merge_seams(detections: List[Dict], origins: Sequence[Tuple[int, int]], tile_size: int,
+                min_overlap: float) -> List[Dict]:
+    """Collapse same-model boxes cut by tile seams into their union, keeping the highest confidence
+
+    Two boxes are pieces of one defect when both reach into the same seam band, meet across
+    it and line up along it: the 1-D IoU of their extents along the seam is at least
+    min_overlap. Unlike an area criterion this holds however far a crack runs past the band.
+    """
+    if len(detections) < 2:
+        return detections
+    boxes, scores, labels = to_arrays(detections)
+    vertical = _seam_links(boxes, labels, seam_bands(origins, tile_size, 0), 0, min_overlap)
+    horizontal = _seam_links(boxes, labels, seam_bands(origins, tile_size, 1), 1, min_overlap)
+    i, j = np.concatenate([vertical[0], horizontal[0]]), np.concatenate([vertical[1], horizontal[1]])
+    # Connected components by label propagation: a crack crossing several seams becomes one box
+    component = np.arange(len(boxes))
+    while len(i):
+        low = np.minimum(component[i], component[j])
+        if np.array_equal(low, component[i]) and np.array_equal(low, component[j]):
+            break
+        np.minimum.at(component, i, low)
+        np.minimum.at(component, j, low)
+    merged = []
+    for root in np.unique(component):
+        group = np.nonzero(component == root)[0]
+        det = detections[group[np.argmax(scores[group])]]
+        det['bbox'] = [int(boxes[group, 0].min()), int(boxes[group, 1].min()),
+                       int(boxes[group, 2].max()), int(boxes[group, 3].max())]
+        merged.append(det)
+    return merged
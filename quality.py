@@ -0,0 +1,75 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+from media_store import update_meta
+from thumbnails import get_thumbnail
+
+# Metrics are computed on this pyramid level, never on the full-resolution original
+QUALITY_LEVEL = 512
+BLUR_GOOD = 100.0
+BLUR_OK = 50.0
+
+# Shared across sessions; OpenCV and NumPy release the GIL for the heavy lifting
+_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix='quality')
+
+
+def _laplacian_var(gray: np.ndarray) -> float:
+    if CV2_AVAILABLE:
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    g = gray.astype(np.float64)
+    lap = g[1:-1, :-2] + g[1:-1, 2:] + g[:-2, 1:-1] + g[2:, 1:-1] - 4.0 * g[1:-1, 1:-1]
+    return float(lap.var())
+
+
+def compute_quality(sha256: str, source_path: str) -> Optional[Dict]:
+    """Blur (Laplacian variance) and brightness of one image, stored on its media record"""
+    thumb_path = get_thumbnail(sha256, source_path, QUALITY_LEVEL)
+    if not thumb_path:
+        return None
+    with Image.open(thumb_path) as img:
+        gray = np.asarray(img.convert('L'))
+    blur_score = _laplacian_var(gray)
+    quality = {
+        'blur_score': blur_score,
+        'brightness': float(gray.mean()),
+        'blur_quality': "Good" if blur_score > BLUR_GOOD else ("OK" if blur_score > BLUR_OK else "Blurry"),
+        'level': QUALITY_LEVEL,
+    }
+    update_meta(sha256, quality=quality)
+    return quality
+
+
+def compute_quality_batch(file_infos: List[Dict]) -> int:
+    """Fill in file_info['quality'] for every image that lacks it, across the worker pool"""
+    pending = [
+        f for f in file_infos
+        if f.get('sha256') and 'quality' not in f and str(f.get('type', '')).startswith('image')
+    ]
+    futures = [(f, _POOL.submit(compute_quality, f['sha256'], f['path'])) for f in pending]
+    for file_info, future in futures:
+        try:
+            quality = future.result()
+        except Exception:
+            quality = None
+        # An empty dict marks a failed decode so reruns do not retry it
+        file_info['quality'] = quality or {}
+    return len(pending)
+
+
+def quality_caption(file_info: Dict) -> Optional[str]:
+    quality = file_info.get('quality')
+    if not quality:
+        return None
+    return (
+        f"Blur score: {quality['blur_score']:.1f} ({quality['blur_quality']}) | "
+        f"Brightness: {quality['brightness']:.0f}/255"
+    )
@@ -0,0 +1,122 @@
+import io
+from datetime import datetime
+from typing import Dict, List, Tuple
+import numpy as np
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
+from reportlab.lib.styles import getSampleStyleSheet
+
+from thumbnails import get_thumbnail
+from detection_table import DetectionTable, SEVERITIES
+
+# Mapping, CSV and PDF outputs built from a DetectionTable. Nothing here reads session
+# state, so the pages and the workload replay in workload.py run the same code.
+
+
+def fault_locations(table: DetectionTable) -> Tuple[List[Dict], int]:
+    """Map points for every geotagged detection, plus the number of detections without a GPS fix"""
+    mapped = table.geotagged()
+    rows = table.rows[mapped]
+    altitude = rows['altitude'].astype(object)
+    altitude[np.isnan(rows['altitude'])] = None
+    columns = {
+        "lat": rows['lat'].tolist(),
+        "lon": rows['lon'].tolist(),
+        "altitude": altitude.tolist(),
+        "file": table.files['name'].to_numpy()[rows['file']].tolist(),
+        "fault": np.array(table.classes, dtype=object)[rows['cls']].tolist(),
+        "severity": np.array(SEVERITIES, dtype=object)[rows['severity']].tolist(),
+        "confidence": rows['confidence'].tolist(),
+    }
+    # Marker popups need one record per point; columns are zipped rather than rows walked
+    keys = list(columns)
+    locations = [dict(zip(keys, values)) for values in zip(*columns.values())]
+    return locations, int(len(table) - mapped.sum())
+
+
+def detections_csv(table: DetectionTable) -> str:
+    """One CSV row per detection; empty when there are none"""
+    if not len(table):
+        return ""
+    return table.to_frame()[['File', 'Defect Type', 'Confidence', 'Severity', 'Model']].to_csv(index=False)
+
+
+def build_pdf_report(table: DetectionTable) -> bytes:
+    """Build a PDF report from a detection table and return bytes."""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=36, leftMargin=36, topMargin=36, bottomMargin=36)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Title
+    story.append(Paragraph("FLYSCOPE Inspection Report", styles['Title']))
+    story.append(Spacer(1, 12))
+    story.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
+    story.append(Spacer(1, 12))
+
+    # Summary metrics
+    total_files = table.n_files
+    total_detections = len(table)
+    files_with_defects = table.files_with_detections()
+
+    data = [["Metric", "Value"], ["Total Files Analyzed", str(total_files)], ["Files with Defects", str(files_with_defects)], ["Total Detections", str(total_detections)]]
+    summary = Table(data, colWidths=[200, 300])
+    summary.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2563eb')),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+        ('GRID', (0,0), (-1,-1), 0.25, colors.grey),
+        ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f3f4f6')),
+    ]))
+    story.append(summary)
+    story.append(Spacer(1, 18))
+
+    # Every detection row's cells formatted at once, then sliced per file
+    rows = table.rows
+    cells = np.empty((len(rows), 5), dtype=object)
+    if len(rows):
+        cells[:, 0] = np.array(table.classes, dtype=object)[rows['cls']]
+        cells[:, 1] = np.array(SEVERITIES, dtype=object)[rows['severity']]
+        cells[:, 2] = np.char.mod('%.2f', rows['confidence'])
+        cells[:, 3] = np.array(table.models, dtype=object)[rows['model']]
+        cells[:, 4] = np.array(table.descriptions, dtype=object)[rows['cls']]
+    order, starts = table.file_ranges()
+
+    # Per-file sections
+    for index, res in enumerate(table.files.itertuples(index=False)):
+        story.append(Paragraph(f"File: {res.name}", styles['Heading3']))
+        story.append(Spacer(1, 6))
+        # Thumbnail if image
+        try:
+            # Reuse the cached 512 px pyramid level instead of re-encoding the original per report
+            thumb_path = get_thumbnail(res.sha256, res.path, 512)
+            if thumb_path:
+                with Image.open(thumb_path) as thumb:
+                    thumb_w, thumb_h = thumb.size
+                story.append(RLImage(thumb_path, width=200, height=200*thumb_h/thumb_w))
+                story.append(Spacer(1, 6))
+        except Exception:
+            pass
+
+        file_rows = order[starts[index]:starts[index + 1]]
+        if len(file_rows):
+            det_data = [["Type", "Severity", "Confidence", "Model", "Description"]] + cells[file_rows].tolist()
+            det_table = Table(det_data, colWidths=[120, 70, 70, 100, 240])
+            det_table.setStyle(TableStyle([
+                ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#111827')),
+                ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
+                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+                ('GRID', (0,0), (-1,-1), 0.25, colors.grey),
+                ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f8fafc')),
+            ]))
+            story.append(det_table)
+        else:
+            story.append(Paragraph("No defects detected.", styles['Italic']))
+        story.append(Spacer(1, 18))
+
+    doc.build(story)
+    buffer.seek(0)
+    return buffer.getvalue()
@@ -0,0 +1,123 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from media_store import STORE_ROOT
+
+# Persistent per-model analysis results. Media are content-addressed, so a file's SHA-256
+# plus everything that can change one model's output identifies that output exactly; a
+# re-run with unchanged inputs never touches the models. Bumping a detector's `version`
+# invalidates its entries.
+CACHE_PATH = os.path.join(STORE_ROOT, 'results.db')
+
+
+class CacheKey(NamedTuple):
+    sha256: str
+    model: str
+    model_version: str
+    confidence_threshold: float
+    sensitivity: str
+    # The selected analysis mode plus any per-model execution settings (tiling, NMS, video
+    # sampling) that change what the model reports
+    analysis_mode: str
+
+
+def cache_key(sha256: str, model: str, model_version: str, confidence_threshold: float,
+              sensitivity: str, analysis_mode: str) -> CacheKey:
+    # Slider values arrive as floats; rounding keeps 0.7 and 0.7000000001 on the same entry
+    return CacheKey(sha256, model, str(model_version), round(float(confidence_threshold), 4),
+                    sensitivity, analysis_mode)
+
+
+def get_conn():
+    conn = sqlite3.connect(CACHE_PATH, check_same_thread=False, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_cache():
+    os.makedirs(STORE_ROOT, exist_ok=True)
+    conn = get_conn()
+    cur = conn.cursor()
+    # Job workers write entries while the UI process reads them
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS results (
+            sha256 TEXT NOT NULL,
+            model TEXT NOT NULL,
+            model_version TEXT NOT NULL,
+            confidence_threshold REAL NOT NULL,
+            sensitivity TEXT NOT NULL,
+            analysis_mode TEXT NOT NULL,
+            detections TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (sha256, model, model_version, confidence_threshold, sensitivity, analysis_mode)
+        );
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+def lookup(keys: Iterable[CacheKey]) -> Dict[CacheKey, List[Dict]]:
+    """Cached detections for whichever of the keys have an entry; an empty list is a cached 'nothing found'"""
+    keys = set(keys)
+    if not keys:
+        return {}
+    found = {}
+    conn = get_conn()
+    # One query per file rather than per (file, model)
+    for sha256 in {key.sha256 for key in keys}:
+        rows = conn.execute("SELECT * FROM results WHERE sha256 = ?", (sha256,)).fetchall()
+        for row in rows:
+            key = CacheKey(row['sha256'], row['model'], row['model_version'], row['confidence_threshold'],
+                           row['sensitivity'], row['analysis_mode'])
+            if key in keys:
+                found[key] = json.loads(row['detections'])
+    conn.close()
+    return found
+
+
+def store(entries: Dict[CacheKey, List[Dict]]):
+    if not entries:
+        return
+    now = datetime.utcnow().isoformat()
+    conn = get_conn()
+    conn.executemany(
+        "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(*key, json.dumps(detections), now) for key, detections in entries.items()],
+    )
+    conn.commit()
+    conn.close()
+
+
+def purge(sha256: Optional[str] = None) -> int:
+    """Drop the entries of one blob, or every entry; returns the number removed"""
+    conn = get_conn()
+    if sha256 is None:
+        removed = conn.execute("DELETE FROM results").rowcount
+    else:
+        removed = conn.execute("DELETE FROM results WHERE sha256 = ?", (sha256,)).rowcount
+    conn.commit()
+    conn.close()
+    return removed
+
+
+def cache_size() -> int:
+    conn = get_conn()
+    count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    conn.close()
+    return count
+
+
+def format_cache_stats(stats: Dict) -> str:
+    hits, misses = stats.get('hits', 0), stats.get('misses', 0)
+    total = hits + misses
+    rate = hits / total * 100 if total else 0.0
+    return f"{hits} cached, {misses} computed ({rate:.0f}% hit rate, per file and model)"
+
+
+init_cache()
@@ -0,0 +1,207 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+import streamlit as st
+
+from media_store import (
+    OBJECTS_DIR, STAGING_DIR, get_conn, object_path, heartbeat, current_session_id,
+)
+from thumbnails import THUMBS_DIR, THUMB_SIZES, thumbnail_path, track_crops
+from result_cache import purge as purge_results
+
+# Lifecycle policy for the shared media store
+GB = 1024 ** 3
+GLOBAL_QUOTA_BYTES = int(float(os.environ.get('FLYSCOPE_STORE_QUOTA_GB', 50)) * GB)
+SESSION_QUOTA_BYTES = int(float(os.environ.get('FLYSCOPE_SESSION_QUOTA_GB', 10)) * GB)
+# A session that has not rerun for this long is treated as ended and its references released
+SESSION_TTL = timedelta(hours=6)
+# Never touch files younger than this: they may belong to an ingest that is still running
+GRACE_PERIOD = timedelta(minutes=15)
+SWEEP_INTERVAL = 300
+HEARTBEAT_INTERVAL = 60
+
+_sweeper_lock = threading.Lock()
+_sweeper_thread = None
+
+
+def store_usage() -> int:
+    conn = get_conn()
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM media").fetchone()[0]
+    conn.close()
+    return total
+
+
+def session_usage(session_id: str) -> int:
+    conn = get_conn()
+    total = conn.execute(
+        "SELECT COALESCE(SUM(m.size), 0) FROM refs r JOIN media m ON m.sha256 = r.sha256 WHERE r.session_id = ?",
+        (session_id,),
+    ).fetchone()[0]
+    conn.close()
+    return total
+
+
+def check_session_quota(session_id: str, incoming_bytes: int) -> Tuple[bool, str]:
+    used = session_usage(session_id)
+    if used + incoming_bytes > SESSION_QUOTA_BYTES:
+        return False, (
+            f"Session storage quota exceeded: {used / GB:.2f} GB used, "
+            f"{incoming_bytes / GB:.2f} GB requested, limit {SESSION_QUOTA_BYTES / GB:.0f} GB"
+        )
+    return True, 'OK'
+
+
+def _unlink(path: str) -> int:
+    try:
+        size = os.path.getsize(path)
+        os.unlink(path)
+        return size
+    except OSError:
+        return 0
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.unlink(path)
+        return True
+    except OSError:
+        return False
+
+
+def delete_blob(sha256: str, ext: str) -> int:
+    """Remove a blob, its thumbnails and track crops, its index row and its cached results; returns bytes freed on disk"""
+    freed = _unlink(object_path(sha256, ext))
+    for size in THUMB_SIZES:
+        freed += _unlink(thumbnail_path(sha256, size))
+    for path in track_crops(sha256):
+        freed += _unlink(path)
+    conn = get_conn()
+    conn.execute("DELETE FROM media WHERE sha256 = ?", (sha256,))
+    conn.commit()
+    conn.close()
+    purge_results(sha256)
+    return freed
+
+
+def expire_sessions(now: datetime) -> int:
+    """Release references held by sessions that stopped sending heartbeats"""
+    cutoff = (now - SESSION_TTL).isoformat()
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT session_id FROM sessions WHERE last_seen < ?", (cutoff,))
+    expired = [row['session_id'] for row in cur.fetchall()]
+    for session_id in expired:
+        cur.execute("DELETE FROM refs WHERE session_id = ?", (session_id,))
+        cur.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    # References from sessions that never sent a heartbeat at all
+    cur.execute(
+        "DELETE FROM refs WHERE session_id NOT IN (SELECT session_id FROM sessions) AND created_at < ?",
+        (cutoff,),
+    )
+    conn.commit()
+    conn.close()
+    return len(expired)
+
+
+def evict_lru(now: datetime, quota: int = GLOBAL_QUOTA_BYTES) -> Tuple[int, int]:
+    """Delete least-recently-used unreferenced blobs until the store fits its quota"""
+    usage = store_usage()
+    if usage <= quota:
+        return 0, 0
+    conn = get_conn()
+    candidates = conn.execute(
+        "SELECT sha256, ext, size FROM media "
+        "WHERE sha256 NOT IN (SELECT sha256 FROM refs) AND last_access < ? "
+        "ORDER BY last_access ASC",
+        ((now - GRACE_PERIOD).isoformat(),),
+    ).fetchall()
+    conn.close()
+    evicted = freed = 0
+    for row in candidates:
+        if usage <= quota:
+            break
+        delete_blob(row['sha256'], row['ext'])
+        usage -= row['size']
+        freed += row['size']
+        evicted += 1
+    return evicted, freed
+
+
+def _older_than(path: str, cutoff: float) -> bool:
+    try:
+        return os.path.getmtime(path) < cutoff
+    except OSError:
+        return False
+
+
+def sweep_orphans() -> int:
+    """Remove staging leftovers, unindexed objects/thumbnails and index rows without a file"""
+    cutoff = time.time() - GRACE_PERIOD.total_seconds()
+    removed = 0
+
+    for name in os.listdir(STAGING_DIR):
+        path = os.path.join(STAGING_DIR, name)
+        if _older_than(path, cutoff):
+            removed += _remove(path)
+
+    conn = get_conn()
+    rows = conn.execute("SELECT sha256, ext FROM media").fetchall()
+    conn.close()
+    indexed = {row['sha256'] for row in rows}
+    for row in rows:
+        if not os.path.exists(object_path(row['sha256'], row['ext'])):
+            delete_blob(row['sha256'], row['ext'])
+            indexed.discard(row['sha256'])
+            removed += 1
+
+    for base in (OBJECTS_DIR, THUMBS_DIR):
+        if not os.path.isdir(base):
+            continue
+        for dirpath, _, filenames in os.walk(base):
+            for name in filenames:
+                sha256 = name.split('.', 1)[0].split('_', 1)[0]
+                path = os.path.join(dirpath, name)
+                if sha256 not in indexed and _older_than(path, cutoff):
+                    removed += _remove(path)
+    return removed
+
+
+def sweep() -> Dict:
+    """One lifecycle pass: expire dead sessions, clean orphans, then evict down to quota"""
+    now = datetime.utcnow()
+    expired = expire_sessions(now)
+    orphans = sweep_orphans()
+    evicted, freed = evict_lru(now)
+    return {'expired_sessions': expired, 'orphans': orphans, 'evicted': evicted, 'freed_bytes': freed}
+
+
+def _sweeper_loop():
+    while True:
+        try:
+            sweep()
+        except Exception:
+            # The sweeper must outlive transient errors such as a locked index
+            pass
+        time.sleep(SWEEP_INTERVAL)
+
+
+def start_sweeper():
+    """Start the process-wide background sweeper once"""
+    global _sweeper_thread
+    with _sweeper_lock:
+        if _sweeper_thread is None or not _sweeper_thread.is_alive():
+            _sweeper_thread = threading.Thread(target=_sweeper_loop, name="store-sweeper", daemon=True)
+            _sweeper_thread.start()
+
+
+# Streamlit helpers
+
+def track_session():
+    """Keep this session's references alive and make sure the sweeper is running"""
+    start_sweeper()
+    now = time.time()
+    if now - st.session_state.get('store_heartbeat', 0) > HEARTBEAT_INTERVAL:
+        heartbeat(current_session_id())
+        st.session_state.store_heartbeat = now
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The store modules read FLYSCOPE_STORE_DIR when they are imported, so tests get a scratch
+# store before any of them is
+os.environ['FLYSCOPE_STORE_DIR'] = tempfile.mkdtemp(prefix='flyscope-tests-')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,144 @@
+import io
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import analysis_jobs as jobs
+from media_store import file_info_for, put_bytes
+
+SETTINGS = {'models': ['Crack Detection'], 'confidence_threshold': 0.5, 'mode': 'Quick Scan'}
+
+
+def _files(count, seed=0):
+    files = []
+    for i in range(count):
+        pixels = np.random.default_rng([seed, i]).integers(0, 255, size=(64, 80, 3), dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(pixels).save(buf, 'PNG')
+        name = f'job{seed}_{i}.png'
+        files.append(file_info_for(put_bytes(buf.getvalue(), name, 'image/png'), name, 'image/png'))
+    return files
+
+
+def _wait(job_id, statuses, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get_job(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.2)
+    pytest.fail(f"job {job_id} still {jobs.get_job(job_id)['status']}")
+
+
+def _kill_workers():
+    for process in list(jobs._executor._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def shutdown_workers():
+    yield
+    if jobs._executor is not None:
+        jobs._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def test_job_runs_in_a_worker_and_records_per_file_results():
+    files = _files(3)
+    job_id = jobs.submit_job(files, SETTINGS, 'session-a')
+    job = _wait(job_id, jobs.FINISHED)
+    assert job['status'] == jobs.DONE, job['error']
+    assert (job['session_id'], job['done'], job['total']) == ('session-a', 3, 3)
+    results = jobs.job_results(job_id)
+    assert [r['file_name'] for r in results] == [f['name'] for f in files]
+    assert all(hasattr(r['analysis_time'], 'isoformat') for r in results)
+    assert job['stats']['images'] == 3
+
+
+def test_a_dead_worker_fails_its_job_and_the_next_job_gets_a_fresh_pool():
+    slow = dict(SETTINGS, mode='Comprehensive Report')
+    job_id = jobs.submit_job(_files(24, seed=1), slow, 'session-b')
+    _wait(job_id, (jobs.RUNNING,) + jobs.FINISHED)
+    broken = jobs._executor
+    _kill_workers()
+    job = _wait(job_id, jobs.FINISHED, timeout=30)
+    assert job['status'] == jobs.FAILED
+    assert jobs._executor is not broken
+
+    job_id = jobs.submit_job(_files(2, seed=2), SETTINGS, 'session-b')
+    assert _wait(job_id, jobs.FINISHED)['status'] == jobs.DONE
+
+
+def test_a_pool_that_broke_while_idle_is_replaced_on_submit():
+    _wait(jobs.submit_job(_files(1, seed=3), SETTINGS, 'session-c'), jobs.FINISHED)
+    _kill_workers()
+    time.sleep(1)
+    job_id = jobs.submit_job(_files(1, seed=4), SETTINGS, 'session-c')
+    assert _wait(job_id, jobs.FINISHED)['status'] == jobs.DONE
+
+
+def _reattach_script():
+    import streamlit as st
+    from analysis_jobs import active_job_id
+    from media_store import current_session_id
+
+    st.session_state.session_seen = current_session_id()
+    st.session_state.job_seen = active_job_id()
+
+
+def _insert_job(session_id):
+    job_id = f"refresh-{session_id[:8]}"
+    conn = jobs.get_conn()
+    conn.execute(
+        "INSERT INTO jobs (job_id, session_id, status, total, settings, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (job_id, session_id, jobs.QUEUED, 1, '{}', '2026-01-01T00:00:00'),
+    )
+    conn.commit()
+    conn.close()
+    return job_id
+
+
+def test_a_refresh_reattaches_to_the_job_this_session_started():
+    from streamlit.testing.v1 import AppTest
+
+    first = AppTest.from_function(_reattach_script).run()
+    session_id = first.session_state.session_seen
+    assert first.query_params['sid'] == session_id
+    job_id = _insert_job(session_id)
+
+    # A refresh: fresh session_state, same URL
+    refreshed = AppTest.from_function(_reattach_script)
+    refreshed.query_params['sid'] = session_id
+    refreshed.query_params['job'] = job_id
+    refreshed.run()
+    assert refreshed.session_state.session_seen == session_id
+    assert refreshed.session_state.job_seen == job_id
+
+
+def test_a_job_from_another_session_is_not_taken_up():
+    from streamlit.testing.v1 import AppTest
+
+    job_id = _insert_job('f' * 32)
+    other = AppTest.from_function(_reattach_script)
+    # An unknown session id from the URL is replaced, not adopted
+    other.query_params['sid'] = 'e' * 32
+    other.query_params['job'] = job_id
+    other.run()
+    assert other.session_state.session_seen != 'e' * 32
+    assert other.session_state.job_seen is None
+    assert 'job' not in other.query_params
+
+
+def test_a_job_cancelled_with_its_pool_is_marked_failed():
+    from concurrent.futures import Future
+
+    job_id = _insert_job('c' * 32)
+    future = Future()
+    future.cancel()
+    jobs._on_done(job_id, None, future)
+    job = jobs.get_job(job_id)
+    assert (job['status'], job['error']) == (jobs.FAILED, "Analysis workers restarted")
+    assert job['finished_at']
@@ -0,0 +1,51 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from analysis_plans import COMPREHENSIVE, DEFAULT_MODE, QUICK_SCAN, resolve_plan
+from analysis_runner import analyze_media, pending_media
+from inference_engine import AUG_HFLIP, InferenceEngine
+from media_store import file_info_for, put_bytes
+
+MODELS = ['Crack Detection', 'Corrosion Detection']
+
+
+def test_plans_resolve_tiled_models_and_budget():
+    assert resolve_plan({'models': MODELS, 'mode': COMPREHENSIVE})['tiled_models'] == MODELS
+    assert resolve_plan({'models': MODELS, 'mode': QUICK_SCAN, 'tiling': {'models': MODELS}})['tiled_models'] == []
+    detailed = resolve_plan({'models': MODELS, 'tiling': {'models': ['Crack Detection', 'Thermal Anomaly']}})
+    assert detailed['mode'] == DEFAULT_MODE
+    assert detailed['tiled_models'] == ['Crack Detection']
+    assert resolve_plan({'models': MODELS, 'mode': 'No such mode'})['mode'] == DEFAULT_MODE
+    assert resolve_plan({'models': MODELS, 'mode': QUICK_SCAN, 'latency_budget_ms': 20})['latency_budget_ms'] == 20.0
+
+
+def test_engine_reports_the_batches_run_without_augmentation():
+    engine = InferenceEngine(['Crack Detection'], augmentations=(AUG_HFLIP,), latency_budget=1e-9, batch_size=1)
+    image = np.zeros((64, 64, 3), dtype=np.uint8)
+    engine.infer([image])
+    # The batch that went over budget still ran with its flipped view
+    assert not engine.degraded and engine.augmentations_dropped_after == 1
+    engine.infer([image])
+    assert engine.degraded
+
+
+def _stored(seed):
+    pixels = np.random.default_rng(seed).integers(0, 255, size=(96, 128, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, 'PNG')
+    name = f'plan{seed}.png'
+    return file_info_for(put_bytes(buf.getvalue(), name, 'image/png'), name, 'image/png')
+
+
+def test_results_without_the_plans_augmentation_are_never_cached():
+    files = [_stored(seed) for seed in range(4)]
+    settings = {'models': MODELS, 'mode': COMPREHENSIVE, 'latency_budget_ms': 1e-6, 'batch_size': 1}
+    results, stats = analyze_media(files, settings)
+    assert stats['degraded'] == 3
+    assert [bool(r.get('degraded')) for r in results] == [False, True, True, True]
+    assert pending_media(files, results, settings) == files[1:]
+    again, again_stats = analyze_media(files, settings)
+    assert again_stats['cache']['hits'] == len(MODELS)
+    assert not again[0].get('degraded')
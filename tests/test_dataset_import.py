@@ -0,0 +1,67 @@
+import os
+import zipfile
+
+import pytest
+
+from dataset_import import IMPORT_ROOT, directory_items, items_for_source, resolve_import_path, zip_items
+
+
+@pytest.fixture
+def root(tmp_path):
+    dataset = tmp_path / 'root' / 'mission'
+    (dataset / 'day1').mkdir(parents=True)
+    (dataset / 'day1' / 'a.jpg').write_bytes(b'a')
+    (dataset / 'b.PNG').write_bytes(b'bb')
+    (dataset / '.hidden.jpg').write_bytes(b'x')
+    (dataset / 'notes.txt').write_bytes(b'x')
+    with zipfile.ZipFile(tmp_path / 'root' / 'mission.zip', 'w') as archive:
+        archive.writestr('mission/a.jpg', b'a')
+        archive.writestr('__MACOSX/mission/._a.jpg', b'x')
+        archive.writestr('mission/clip.mp4', b'clip')
+    return tmp_path / 'root'
+
+
+def test_directory_walk_keeps_media_only(root):
+    items = directory_items(str(root / 'mission'))
+    assert sorted(item['name'] for item in items) == ['b.PNG', os.path.join('day1', 'a.jpg')]
+    assert {item['source_size'] for item in items} == {1, 2}
+
+
+def test_symlinks_do_not_lead_out_of_the_tree(root, tmp_path):
+    outside = tmp_path / 'secret.jpg'
+    outside.write_bytes(b'secret')
+    (root / 'mission' / 'link.jpg').symlink_to(outside)
+    (root / 'mission' / 'linkdir').symlink_to(tmp_path, target_is_directory=True)
+    assert 'link.jpg' not in {item['name'] for item in directory_items(str(root / 'mission'))}
+
+
+def test_server_paths_must_resolve_below_the_import_root(root):
+    assert resolve_import_path('mission', str(root)) == os.path.realpath(root / 'mission')
+    assert resolve_import_path(str(root / 'mission.zip'), str(root)) == os.path.realpath(root / 'mission.zip')
+    for path in ('../', '/etc', 'mission/../../', str(root) + '-other'):
+        with pytest.raises(ValueError):
+            resolve_import_path(path, str(root))
+    with pytest.raises(ValueError, match='disabled'):
+        resolve_import_path('mission', None)
+
+
+def test_zip_members_stream_until_the_archive_is_closed(root):
+    with zip_items(str(root / 'mission.zip')) as items:
+        assert [item['name'] for item in items] == ['mission/a.jpg', 'mission/clip.mp4']
+        with items[1]['open']() as stream:
+            assert stream.read() == b'clip'
+    with pytest.raises(ValueError):
+        items[0]['open']()
+
+
+def test_uploaded_archives_need_no_import_root(root):
+    with open(root / 'mission.zip', 'rb') as upload:
+        with items_for_source(upload) as items:
+            assert len(items) == 2
+
+
+@pytest.mark.skipif(bool(IMPORT_ROOT), reason="FLYSCOPE_IMPORT_ROOT is set")
+def test_server_paths_are_refused_without_an_import_root():
+    with pytest.raises(ValueError, match='disabled'):
+        with items_for_source('mission'):
+            pass
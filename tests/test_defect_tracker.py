@@ -0,0 +1,68 @@
+import numpy as np
+
+from defect_tracker import CROP_SIZE, DefectTracker
+
+
+def _det(bbox, confidence=0.8, model='Crack Detection'):
+    return {'bbox': list(bbox), 'confidence': confidence, 'model': model, 'defect_type': 'Crack'}
+
+
+def _run(tracker, frames):
+    for index, detections in enumerate(frames):
+        tracker.update(index * 10, index / 3.0, detections)
+    return tracker.finish()
+
+
+def test_overlapping_sightings_become_one_track_reported_at_the_best_frame():
+    tracks = _run(DefectTracker(), [
+        [_det((100, 100, 200, 200), 0.7)],
+        [_det((110, 100, 210, 200), 0.9)],
+        [_det((120, 100, 220, 200), 0.8)],
+    ])
+    assert len(tracks) == 1
+    track = tracks[0]
+    assert (track['first_frame'], track['last_frame'], track['track_frames']) == (0, 20, 3)
+    assert track['frame_index'] == 10 and track['confidence'] == 0.9
+    assert track['bbox'] == [110, 100, 210, 200]
+
+
+def test_centroid_distance_continues_a_track_whose_boxes_no_longer_overlap():
+    # A thin vertical crack shifted sideways by more than its width: IoU 0, centres 0.12 diagonals apart
+    frames = [[_det((0, 0, 20, 200))], [_det((25, 0, 45, 200))]]
+    assert len(_run(DefectTracker(), frames)) == 1
+    assert len(_run(DefectTracker(centroid_threshold=0.1), frames)) == 2
+
+
+def test_models_never_share_a_track():
+    tracks = _run(DefectTracker(), [[_det((0, 0, 50, 50)), _det((0, 0, 50, 50), model='Corrosion Detection')]] * 2)
+    assert sorted(t['model'] for t in tracks) == ['Corrosion Detection', 'Crack Detection']
+
+
+def test_gap_closing_bridges_short_misses_only():
+    box = _det((0, 0, 50, 50))
+    # Missed on two keyframes: still within max_gap, so the track continues
+    assert len(_run(DefectTracker(max_gap=2), [[box], [], [], [dict(box)]])) == 1
+    # Missed on three: the first track closed before the defect came back
+    tracks = _run(DefectTracker(max_gap=2), [[box], [], [], [], [dict(box)]])
+    assert [(t['first_frame'], t['last_frame']) for t in tracks] == [(0, 0), (40, 40)]
+
+
+def test_stale_tracks_are_closed_while_running_and_handed_on():
+    seen = []
+    tracker = DefectTracker(max_gap=1, on_track=lambda det, crop: seen.append((det['track_id'], crop.shape)))
+    frame = np.zeros((1000, 1000, 3), dtype=np.uint8)
+    tracker.update(0, 0.0, [_det((0, 0, 800, 400))], frame)
+    tracker.update(1, 0.1, [], frame)
+    tracker.update(2, 0.2, [], frame)
+    assert tracker.open == [] and seen == [(0, (80, CROP_SIZE, 3))]
+    assert tracker.stats() == {'raw_detections': 1, 'tracks': 1}
+
+
+def test_each_detection_matches_at_most_one_track():
+    frames = [
+        [_det((0, 0, 100, 100)), _det((300, 0, 400, 100))],
+        [_det((5, 0, 105, 100)), _det((295, 0, 395, 100)), _det((600, 0, 700, 100))],
+    ]
+    tracks = _run(DefectTracker(), frames)
+    assert [t['track_frames'] for t in tracks] == [2, 2, 1]
+    assert [t['track_id'] for t in tracks] == [0, 1, 2]
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import numpy as np
+
+from detection_table import DetectionTable
+
+
+def _det(model, defect_type, confidence, severity, bbox=(0, 0, 10, 10)):
+    return {'model': model, 'defect_type': defect_type, 'confidence': confidence, 'severity': severity,
+            'bbox': list(bbox), 'description': f'{defect_type} found'}
+
+
+RESULTS = [
+    {'file_name': 'a.jpg', 'file_path': '/a.jpg', 'sha256': 'a', 'analysis_time': datetime(2024, 5, 1),
+     'geo': {'lat': 52.5, 'lon': 13.4, 'altitude': 80.0, 'relative_altitude': 35.0},
+     'detections': [_det('Crack Detection', 'Crack', 0.9, 'High', (1, 2, 3, 4)),
+                    _det('Corrosion Detection', 'Corrosion', 0.6, 'Low')]},
+    {'file_name': 'b.jpg', 'file_path': '/b.jpg', 'sha256': 'b', 'analysis_time': datetime(2024, 5, 2),
+     'detections': []},
+    {'file_name': 'c.jpg', 'file_path': '/c.jpg', 'sha256': 'c', 'analysis_time': datetime(2024, 5, 3),
+     'geo': None, 'detections': [_det('Crack Detection', 'Crack', 0.75, 'Critical', (5, 6, 7, 8))]},
+]
+
+
+def test_round_trip_back_to_readable_rows():
+    table = DetectionTable.from_results(RESULTS)
+    assert len(table) == 3 and table.n_files == 3
+    frame = table.to_frame()
+    assert frame['File'].tolist() == ['a.jpg', 'a.jpg', 'c.jpg']
+    assert frame['Defect Type'].tolist() == ['Crack', 'Corrosion', 'Crack']
+    assert frame['Model'].tolist() == ['Crack Detection', 'Corrosion Detection', 'Crack Detection']
+    assert frame['Severity'].tolist() == ['High', 'Low', 'Critical']
+    assert frame['Confidence'].tolist() == [0.9, 0.6, 0.75]
+    assert frame[['x1', 'y1', 'x2', 'y2']].values.tolist() == [[1, 2, 3, 4], [0, 0, 10, 10], [5, 6, 7, 8]]
+    # Relative altitude wins over absolute; no fix is NaN
+    assert frame['Altitude'].tolist()[:2] == [35.0, 35.0]
+    assert np.isnan(frame['Latitude'][2])
+    assert table.descriptions == ['Crack found', 'Corrosion found']
+    assert table.files['sha256'].tolist() == ['a', 'b', 'c']
+
+
+def test_kpis():
+    table = DetectionTable.from_results(RESULTS)
+    assert table.counts_per_file().tolist() == [2, 0, 1]
+    assert table.files_with_detections() == 2
+    assert table.mean_confidence() == (0.9 + 0.6 + 0.75) / 3
+    assert table.severity_counts() == {'Critical': 1, 'High': 1, 'Medium': 0, 'Low': 1}
+    assert table.class_counts() == {'Crack': 2, 'Corrosion': 1}
+
+
+def test_filters_share_categories_with_the_full_table():
+    table = DetectionTable.from_results(RESULTS)
+    cracks = table.where(models=['Crack Detection'])
+    assert len(cracks) == 2 and cracks.models == table.models and cracks.n_files == 3
+    assert len(table.where(severities=['Critical', 'High'], min_confidence=0.8)) == 1
+    assert table.where(geotagged=True).to_frame()['File'].tolist() == ['a.jpg', 'a.jpg']
+    assert len(table.where(models=['Thermal Anomaly'])) == 0
+    assert table.where(models=[]).mean_confidence() == 0.0
+
+
+def test_file_ranges_group_rows_by_file():
+    table = DetectionTable.from_results(RESULTS[::-1])
+    order, starts = table.file_ranges()
+    assert starts.tolist() == [0, 1, 1, 3]
+    assert sorted(table.rows['file'][order[starts[2]:starts[3]]].tolist()) == [2, 2]
+
+
+def test_empty_results():
+    table = DetectionTable.from_results([])
+    assert len(table) == 0 and table.n_files == 0
+    assert table.to_frame().empty
+    assert table.severity_counts() == {'Critical': 0, 'High': 0, 'Medium': 0, 'Low': 0}
@@ -0,0 +1,89 @@
+import io
+import struct
+
+import pytest
+from PIL import Image
+from PIL.TiffImagePlugin import IFDRational
+
+from exif_meta import XMP_HEADER, geo_from_meta, parse_dji_xmp, read_header, read_jpeg_header
+
+
+def _jpeg(exif=None, xmp: bytes = b'', size=(64, 48)) -> bytes:
+    buf = io.BytesIO()
+    Image.new('RGB', size).save(buf, 'JPEG', **({'exif': exif} if exif is not None else {}))
+    data = buf.getvalue()
+    if xmp:
+        payload = XMP_HEADER + xmp
+        # APP1 straight after SOI, where DJI writes it
+        data = data[:2] + b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload + data[2:]
+    return data
+
+
+def _gps_exif(lat_ref='S', lon_ref='E') -> Image.Exif:
+    exif = Image.Exif()
+    exif[0x010F] = 'DJI'
+    exif[0x0110] = 'M3T'
+    exif[0x0132] = '2024:05:01 10:00:00'
+    exif[0x8825] = {
+        1: lat_ref, 2: (IFDRational(33), IFDRational(51), IFDRational(36)),
+        3: lon_ref, 4: (IFDRational(151), IFDRational(12), IFDRational(0)),
+        5: b'\x00', 6: IFDRational(121, 2),
+    }
+    return exif
+
+
+def test_jpeg_header_reads_dimensions_camera_and_signed_gps():
+    header = read_jpeg_header(io.BytesIO(_jpeg(_gps_exif())))
+    assert (header['width'], header['height']) == (64, 48)
+    exif = header['exif']
+    assert exif['make'] == 'DJI' and exif['model'] == 'M3T'
+    assert exif['timestamp'] == '2024-05-01T10:00:00'
+    assert exif['lat'] == pytest.approx(-33.86)
+    assert exif['lon'] == pytest.approx(151.2)
+    assert exif['altitude'] == pytest.approx(60.5)
+
+
+def test_west_longitude_is_negative():
+    exif = read_jpeg_header(io.BytesIO(_jpeg(_gps_exif(lat_ref='N', lon_ref='W'))))['exif']
+    assert exif['lat'] > 0 and exif['lon'] < 0
+
+
+def test_dji_xmp_attributes_and_elements():
+    packet = (b'<rdf:Description drone-dji:GpsLatitude="52.5" drone-dji:GpsLongtitude="13.4" '
+              b'drone-dji:RelativeAltitude="+35.2"/>'
+              b'<drone-dji:GimbalPitchDegree>-90.0</drone-dji:GimbalPitchDegree>'
+              b'<drone-dji:Unknown>1</drone-dji:Unknown><drone-dji:GimbalYawDegree>n/a</drone-dji:GimbalYawDegree>')
+    assert parse_dji_xmp(packet) == {'lat': 52.5, 'lon': 13.4, 'relative_altitude': 35.2, 'gimbal_pitch': -90.0}
+
+
+def test_xmp_position_wins_over_exif():
+    xmp = b'drone-dji:GpsLatitude="-33.8601" drone-dji:GpsLongitude="151.2001"'
+    exif = read_jpeg_header(io.BytesIO(_jpeg(_gps_exif(), xmp=xmp)))['exif']
+    assert exif['lat'] == pytest.approx(-33.8601)
+    assert exif['lon'] == pytest.approx(151.2001)
+    assert exif['make'] == 'DJI'
+
+
+def test_read_header_by_magic(tmp_path):
+    jpeg = tmp_path / 'a.jpg'
+    jpeg.write_bytes(_jpeg(size=(30, 20)))
+    png = tmp_path / 'b.png'
+    Image.new('RGB', (7, 5)).save(png)
+    junk = tmp_path / 'c.bin'
+    junk.write_bytes(b'not an image')
+    assert read_header(str(jpeg))['width'] == 30
+    assert read_header(str(png)) == {'format': 'PNG', 'width': 7, 'height': 5, 'exif': {}}
+    assert read_header(str(junk)) is None
+
+
+def test_truncated_exif_segment_is_dropped_not_raised(tmp_path):
+    path = tmp_path / 'cut.jpg'
+    path.write_bytes(_jpeg(_gps_exif())[:100])
+    assert read_header(str(path)) == {'format': 'JPEG', 'exif': {}}
+
+
+def test_geo_from_meta_needs_a_fix():
+    assert geo_from_meta({'exif': {'make': 'DJI'}}) is None
+    assert geo_from_meta({}) is None
+    geo = geo_from_meta({'exif': {'lat': 1.0, 'lon': 2.0, 'gimbal_pitch': -90.0, 'make': 'DJI'}})
+    assert geo == {'lat': 1.0, 'lon': 2.0, 'gimbal_pitch': -90.0}
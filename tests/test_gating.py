@@ -0,0 +1,56 @@
+import numpy as np
+
+from detectors import create_detector
+from gating import combine_gating, frame_features, textured
+from inference_engine import InferenceEngine
+from workload import SyntheticWorkload
+
+MODELS = ['Crack Detection', 'Corrosion Detection', 'Thermal Anomaly', 'Vegetation Risk', 'Structural Damage']
+
+
+def _planar(rgb: np.ndarray) -> np.ndarray:
+    return (rgb.astype(np.float32) / 255.0).transpose(2, 0, 1)[None]
+
+
+def _flat(value=(135, 175, 225), size=128) -> np.ndarray:
+    return np.broadcast_to(np.array(value, dtype=np.uint8), (size, size, 3)).copy()
+
+
+def test_flat_frame_is_untextured_and_declined_by_every_gate():
+    features = frame_features(_planar(_flat()))
+    assert features['entropy'][0] == 0.0 and features['edge_density'][0] == 0.0
+    assert not textured(features)[0]
+    for model in MODELS:
+        assert not create_detector(model).gate(features)[0], model
+
+
+def test_colour_cues_open_their_gates():
+    green = _flat((40, 160, 40))
+    hot = _flat((60, 60, 60))
+    hot[50:60, 50:60] = (255, 250, 240)
+    features = frame_features(np.concatenate([_planar(green), _planar(hot)]))
+    assert features['green_share'].tolist() == [1.0, 0.0]
+    assert features['hot_share'][1] > 0
+    assert create_detector('Vegetation Risk').gate(features).tolist() == [True, False]
+    assert create_detector('Thermal Anomaly').gate(features).tolist() == [False, True]
+
+
+def test_gates_skip_work_but_never_detections():
+    workload = SyntheticWorkload(6, (640, 480), detections_per_image=4, seed=3)
+    images = [workload.image(i) for i in range(workload.items)] + [_flat(size=480), _flat((40, 160, 40), 480)]
+    plain = InferenceEngine(MODELS, confidence_threshold=0.3).infer(images)
+    gated_engine = InferenceEngine(MODELS, confidence_threshold=0.3, gating=True)
+    assert gated_engine.infer(images) == plain
+    stats = gated_engine.gating_stats()
+    assert sum(counts['skipped'] for counts in stats['models'].values()) > 0
+    assert all(counts['run'] + counts['skipped'] == len(images) for counts in stats['models'].values())
+
+
+def test_combined_gating_stats_add_up():
+    a = {'seconds': 0.1, 'saved_seconds': 1.0, 'models': {'Vegetation Risk': {'run': 2, 'skipped': 3}}}
+    b = {'seconds': 0.2, 'saved_seconds': 0.5, 'models': {'Vegetation Risk': {'run': 1, 'skipped': 1},
+                                                           'Crack Detection': {'run': 4, 'skipped': 0}}}
+    combined = combine_gating([a, b, {}])
+    assert combined['models'] == {'Vegetation Risk': {'run': 3, 'skipped': 4}, 'Crack Detection': {'run': 4, 'skipped': 0}}
+    assert combined['seconds'] == a['seconds'] + b['seconds']
+    assert combined['saved_seconds'] == 1.5
@@ -0,0 +1,70 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import ingest_pipeline
+from ingest_pipeline import IngestPipeline, STAGES
+from media_store import lookup
+
+
+def _png(seed) -> bytes:
+    pixels = np.random.default_rng(seed).integers(0, 255, size=(40, 60, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def _item(name, data):
+    return {'name': name, 'mime': 'image/png', 'open': lambda: io.BytesIO(data), 'source_size': len(data)}
+
+
+def _missing(name):
+    return {'name': name, 'mime': 'image/png', 'open': lambda: open('/nonexistent/file.png', 'rb'), 'source_size': 1}
+
+
+def test_every_stage_runs_and_items_keep_their_order():
+    items = [_item(f'{i}.png', _png(100 + i)) for i in range(6)]
+    pipeline = IngestPipeline(workers={'thumbnail': 2})
+    out = pipeline.run(items)
+    assert out == items
+    assert pipeline.completed == {stage: 6 for stage in STAGES}
+    record = lookup(out[3]['record']['sha256'])
+    assert {'header', 'quality', 'fingerprint'} <= set(record['meta'])
+    assert not any('error' in item or item.get('ingest_errors') for item in out)
+
+
+def test_only_persist_and_hash_failures_drop_a_file(monkeypatch):
+    def broken(item):
+        raise RuntimeError("decoder crashed")
+
+    monkeypatch.setitem(ingest_pipeline.STAGE_FUNCS, 'thumbnail', broken)
+    data = _png(200)
+    kept, dropped = IngestPipeline().run([_item('kept.png', data), _missing('gone.png')])
+    assert dropped['error'].startswith('persist:')
+    assert 'error' not in kept
+    assert kept['ingest_errors'] == {'thumbnail': 'decoder crashed'}
+    # Later stages still ran, and the failure is on the stored record
+    record = lookup(kept['record']['sha256'])
+    assert 'fingerprint' in record['meta']
+    assert record['meta']['ingest_errors'] == {'thumbnail': 'decoder crashed'}
+
+    monkeypatch.undo()
+    again = IngestPipeline().run([_item('kept.png', data)])[0]
+    assert not again.get('ingest_errors')
+    assert lookup(again['record']['sha256'])['meta']['ingest_errors'] == {}
+
+
+def test_empty_input():
+    assert IngestPipeline().run([]) == []
+
+
+@pytest.mark.parametrize('stage', ['persist', 'hash'])
+def test_fatal_stages(monkeypatch, stage):
+    def broken(item):
+        raise OSError("disk full")
+
+    monkeypatch.setitem(ingest_pipeline.STAGE_FUNCS, stage, broken)
+    item = IngestPipeline().run([_item('x.png', _png(300))])[0]
+    assert item['error'] == f"{stage}: disk full"
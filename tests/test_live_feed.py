@@ -0,0 +1,127 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from live_feed import FrameRing, LiveIngest, open_stream
+
+
+class ListSource:
+    """Frames from memory, delivered as fast as the capture thread asks"""
+
+    name = 'memory'
+
+    def __init__(self, count):
+        self.frames = [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(count)]
+        self.closed = False
+
+    def open(self):
+        pass
+
+    def read(self):
+        if not self.frames:
+            return False, None, time.perf_counter()
+        return True, self.frames.pop(0), time.perf_counter()
+
+    def close(self):
+        self.closed = True
+
+
+def test_full_ring_drops_its_oldest_frame():
+    ring = FrameRing(3)
+    for i in range(5):
+        ring.put(i)
+    assert ring.dropped == 2
+    assert [ring.get(0) for _ in range(3)] == [2, 3, 4]
+    assert ring.get(0) is None
+
+
+def test_closed_ring_drains_before_reporting_done():
+    ring = FrameRing(2)
+    ring.put('a')
+    ring.close()
+    assert not ring.drained()
+    assert ring.get(0) == 'a'
+    assert ring.drained()
+    # A closed, empty ring returns at once instead of waiting out the timeout
+    started = time.perf_counter()
+    assert ring.get(5) is None
+    assert time.perf_counter() - started < 1
+
+
+def test_get_wakes_on_put():
+    ring = FrameRing(1)
+    threading.Timer(0.05, ring.put, args=('late',)).start()
+    assert ring.get(2) == 'late'
+
+
+def test_slow_detector_sees_fresh_frames_and_every_frame_is_accounted_for():
+    seen = []
+
+    def detect(frame):
+        seen.append(int(frame[0, 0, 0]))
+        time.sleep(0.01)
+        return [{'bbox': [0, 0, 1, 1], 'confidence': 0.9, 'model': 'Crack Detection'}]
+
+    detect.close = lambda: seen.append('closed')
+    ingest = LiveIngest(ListSource(200), detect, buffer_size=2, idle_timeout=0).start()
+    ingest.wait(10)
+    stats = ingest.stats()
+    assert stats['captured'] == 200
+    assert stats['processed'] + stats['dropped'] == 200
+    assert stats['dropped'] > 0
+    frames = [i for i in seen if i != 'closed']
+    assert frames == sorted(frames) and frames[-1] == 199
+    assert seen[-1] == 'closed'
+    assert ingest.source.closed
+    assert set(stats['latency_ms']) == {'p50', 'p95', 'p99', 'max'}
+
+
+def test_unwatched_feed_stops_itself():
+    class Endless(ListSource):
+        def read(self):
+            time.sleep(0.005)
+            return True, np.zeros((4, 4, 3), dtype=np.uint8), time.perf_counter()
+
+    ingest = LiveIngest(Endless(0), lambda frame: [], idle_timeout=0.2).start()
+    ingest.wait(5)
+    assert not ingest.running
+    assert 'without a viewer' in ingest.stats()['error']
+
+
+@pytest.mark.parametrize('url', ['/etc/passwd', 'file:///etc/passwd', 'video.mp4'])
+def test_only_stream_urls_open(url):
+    with pytest.raises(ValueError):
+        open_stream(url)
+
+
+def test_stream_url_is_accepted():
+    assert open_stream('  rtsp://10.0.0.1/live ').url == 'rtsp://10.0.0.1/live'
+
+
+def test_panel_reads_are_safe_while_detection_runs():
+    class Endless(ListSource):
+        def read(self):
+            return True, np.zeros((4, 4, 3), dtype=np.uint8), time.perf_counter()
+
+    def detect(frame):
+        return [{'bbox': [0, 0, 1, 1], 'confidence': 0.9, 'defect_type': 'Crack', 'severity': 'Low',
+                 'model': 'Crack Detection'} for _ in range(20)]
+
+    ingest = LiveIngest(Endless(0), detect, idle_timeout=0).start()
+    try:
+        deadline = time.perf_counter() + 1.0
+        reads = 0
+        while time.perf_counter() < deadline:
+            # What the live panel does on every refresh
+            recent, latencies = ingest.snapshot()
+            rows = [(d['frame_index'], d['defect_type']) for d in reversed(recent)]
+            stats = ingest.stats()
+            assert len(rows) == len(recent) <= 200
+            assert len(latencies) <= 2000
+            reads += 1
+        assert reads and stats['processed'] > 0 and 'latency_ms' in stats
+    finally:
+        ingest.stop()
+    assert ingest.error is None
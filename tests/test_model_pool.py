@@ -0,0 +1,95 @@
+import gc
+
+import numpy as np
+import pytest
+
+from detectors import Detector, register_detector
+from inference_engine import InferenceEngine
+from model_pool import ModelPool, model_pool
+
+BACKEND = 'pool-test'
+MB = 1024 ** 2
+UNLOADED = []
+
+
+class _Weights(Detector):
+    def load(self):
+        self.weights = np.zeros(100 * MB, dtype=np.uint8)
+
+    def unload(self):
+        UNLOADED.append(self.name)
+        self.weights = None
+
+
+for _name in ('A', 'B', 'C'):
+    register_detector(_name, BACKEND)(type(f'Weights{_name}', (_Weights,), {}))
+
+
+@pytest.fixture
+def pool():
+    UNLOADED.clear()
+    return ModelPool(budget_bytes=250 * MB)
+
+
+def test_least_recently_used_idle_model_is_unloaded(pool):
+    for name in ('A', 'B', 'A', 'C'):
+        pool.acquire(name, BACKEND)
+        pool.release(name, BACKEND)
+    stats = pool.stats()
+    assert stats['resident'] == ['A', 'C']
+    assert (stats['loads'], stats['hits'], stats['evictions']) == (3, 1, 1)
+    assert UNLOADED == ['B']
+    assert stats['resident_bytes'] <= stats['budget_bytes']
+
+
+def test_leased_model_is_unloaded_only_on_its_last_release(pool):
+    held = pool.acquire('A', BACKEND)
+    pool.acquire('A', BACKEND)
+    pool.acquire('B', BACKEND)
+    pool.acquire('C', BACKEND)
+    assert pool.stats()['retired'] == ['A'] and UNLOADED == []
+    assert held.weights is not None
+    pool.release('A', BACKEND)
+    assert UNLOADED == []
+    pool.release('A', BACKEND)
+    assert UNLOADED == ['A'] and pool.stats()['retired'] == []
+
+
+def test_idle_models_go_before_leased_ones(pool):
+    pool.acquire('A', BACKEND)
+    pool.acquire('B', BACKEND)
+    pool.release('B', BACKEND)
+    pool.acquire('C', BACKEND)
+    assert pool.stats()['resident'] == ['A', 'C'] and UNLOADED == ['B']
+
+
+def test_retired_model_is_taken_back_without_a_reload(pool):
+    held = pool.acquire('A', BACKEND)
+    pool.acquire('B', BACKEND)
+    pool.acquire('C', BACKEND)
+    assert pool.stats()['retired'] == ['A']
+    assert pool.acquire('A', BACKEND) is held
+    stats = pool.stats()
+    assert stats['loads'] == 3 and 'A' in stats['resident'] and 'A' not in stats['retired']
+
+
+def test_shrinking_the_budget_evicts_idle_models(pool):
+    pool.acquire('A', BACKEND)
+    pool.release('A', BACKEND)
+    pool.acquire('B', BACKEND)
+    pool.budget_bytes = 150 * MB
+    pool.acquire('C', BACKEND)
+    assert UNLOADED == ['A'] and pool.stats()['retired'] == ['B']
+
+
+def test_engines_lease_until_closed_or_collected():
+    shared = model_pool()
+    with InferenceEngine(['Crack Detection']) as engine:
+        assert 'Crack Detection' in shared.stats()['leased']
+        scaled = InferenceEngine(['Crack Detection'], input_scale=0.5)
+        # The scaled copy shares the pooled weights but not the input size
+        assert scaled.detectors[0].input_size < engine.detectors[0].input_size
+    assert 'Crack Detection' in shared.stats()['leased']
+    del scaled
+    gc.collect()
+    assert 'Crack Detection' not in shared.stats()['leased']
@@ -0,0 +1,65 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from media_store import file_info_for, put_bytes
+from near_duplicates import BKTree, cluster_near_duplicates, dhash, hamming, phash
+
+
+def test_bk_tree_radius_search_matches_a_linear_scan():
+    rng = np.random.default_rng(0)
+    values = [int(v) for v in rng.integers(0, 2 ** 63, size=500, dtype=np.int64)]
+    # Near copies so that small radii have something to find
+    values += [v ^ (1 << int(bit)) for v, bit in zip(values[:100], rng.integers(0, 63, size=100))]
+    tree = BKTree()
+    for index, value in enumerate(values):
+        tree.add(value, index)
+    assert tree.size == len(values)
+    for query in values[:20] + [12345]:
+        for radius in (0, 1, 3, 10):
+            found = tree.search(query, radius)
+            expected = sorted((hamming(query, v), i) for i, v in enumerate(values) if hamming(query, v) <= radius)
+            assert sorted(found) == expected
+            assert [d for d, _ in found] == sorted(d for d, _ in found)
+
+
+def test_identical_hashes_share_a_node():
+    tree = BKTree()
+    tree.add(7, 'a')
+    tree.add(7, 'b')
+    assert tree.search(7, 0) == [(0, 'a'), (0, 'b')]
+    assert BKTree().search(7, 64) == []
+
+
+def _gray(seed, noise=0.0):
+    rng = np.random.default_rng(seed)
+    base = np.kron(rng.uniform(0, 255, size=(8, 8)), np.ones((16, 16)))
+    if noise:
+        base = base + np.random.default_rng(seed + 1000).normal(0, noise, size=base.shape)
+    return Image.fromarray(np.clip(base, 0, 255).astype(np.uint8), 'L')
+
+
+def test_hashes_are_stable_under_noise_and_differ_between_scenes():
+    for fn in (dhash, phash):
+        assert hamming(fn(_gray(1)), fn(_gray(1, noise=3))) <= 6
+        assert hamming(fn(_gray(1)), fn(_gray(2))) > 12
+
+
+def _stored(seed, noise=0.0):
+    buf = io.BytesIO()
+    _gray(seed, noise).convert('RGB').save(buf, 'PNG')
+    name = f'{seed}-{noise}.png'
+    return file_info_for(put_bytes(buf.getvalue(), name, 'image/png'), name, 'image/png')
+
+
+def test_near_identical_frames_cluster_behind_the_first_of_them():
+    files = [_stored(1), _stored(2), _stored(1, noise=2), _stored(1, noise=3), _stored(3),
+             {'name': 'clip.mp4', 'path': '/nowhere.mp4', 'type': 'video/mp4', 'sha256': 'v'}]
+    clusters = cluster_near_duplicates(files, threshold=6)
+    assert list(clusters) == [0]
+    assert [member for member, _ in clusters[0]] == [2, 3]
+    assert all(distance <= 6 for _, distance in clusters[0])
+    # Fingerprints computed on first use are kept on the file info
+    assert 'fingerprint' in files[0]
+    assert cluster_near_duplicates([_stored(4), _stored(4), _stored(5)], threshold=0) == {0: [(1, 0)]}
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from postprocess import (
+    fuse_boxes, merge_augmented, nms, overlapping_pairs, pair_iou, suppress_and_fuse, to_arrays,
+)
+
+
+def _det(bbox, confidence, model='Crack Detection', defect_type='Crack'):
+    return {'bbox': list(bbox), 'confidence': confidence, 'model': model, 'defect_type': defect_type}
+
+
+def _random_boxes(rng, n, extent=500):
+    xy = rng.uniform(0, extent, size=(n, 2))
+    wh = rng.uniform(5, 80, size=(n, 2))
+    return np.hstack([xy, xy + wh])
+
+
+def _dense_iou(boxes):
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / (areas[:, None] + areas[None, :] - inter)
+
+
+def test_sparse_pairs_match_dense_iou():
+    boxes = _random_boxes(np.random.default_rng(0), 300)
+    i, j, inter = overlapping_pairs(boxes)
+    dense = _dense_iou(boxes)
+    expected = {(a, b) for a, b in zip(*np.nonzero(np.triu(dense > 0, k=1)))}
+    assert {tuple(sorted(pair)) for pair in zip(i.tolist(), j.tolist())} == expected
+    np.testing.assert_allclose(pair_iou(boxes, i, j, inter), dense[i, j])
+
+
+def test_fast_nms_drops_exactly_the_boxes_a_better_same_class_box_overlaps():
+    rng = np.random.default_rng(1)
+    boxes = _random_boxes(rng, 400)
+    scores = rng.uniform(size=400)
+    labels = rng.integers(0, 3, size=400)
+    keep = nms(boxes, scores, labels, 0.4)
+    dense = _dense_iou(boxes)
+    beaten = (dense > 0.4) & (labels[:, None] == labels[None, :]) & (scores[None, :] > scores[:, None])
+    assert set(keep.tolist()) == set(np.nonzero(~beaten.any(axis=1))[0].tolist())
+    assert np.all(np.diff(scores[keep]) <= 0)
+
+
+def test_nms_keeps_other_classes_and_breaks_ties_by_index():
+    boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10], [1, 1, 10, 10]], dtype=float)
+    scores = np.array([0.9, 0.9, 0.8])
+    assert nms(boxes, scores, np.array([0, 0, 1])).tolist() == [0, 2]
+    assert nms(np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=np.int64)).tolist() == []
+
+
+def test_fused_box_is_the_score_weighted_mean():
+    boxes = np.array([[0, 0, 10, 10], [2, 0, 12, 10], [100, 100, 110, 110]], dtype=float)
+    scores = np.array([0.75, 0.25, 0.5])
+    cluster, fused = fuse_boxes(boxes, scores, 0.5)
+    assert cluster.tolist() == [0, 0, 2]
+    np.testing.assert_allclose(fused[0], [0.5, 0, 10.5, 10])
+    np.testing.assert_allclose(fused[2], boxes[2])
+
+
+def test_suppress_and_fuse_never_fuses_across_defect_types():
+    detections = [
+        _det((0, 0, 100, 100), 0.9),
+        _det((2, 0, 100, 100), 0.6),
+        _det((4, 2, 104, 100), 0.8, model='Corrosion Detection', defect_type='Corrosion'),
+        _det((300, 300, 340, 340), 0.7),
+    ]
+    results = suppress_and_fuse(detections)
+    assert [(d['defect_type'], d['confidence']) for d in results] == [('Crack', 0.9), ('Corrosion', 0.8), ('Crack', 0.7)]
+    assert not any('fused_models' in d for d in results)
+    # Without fusion only per-model NMS runs
+    assert len(suppress_and_fuse(detections, fuse=False)) == 3
+
+
+def test_fused_confidence_is_the_mean_scaled_by_model_agreement():
+    detections = [
+        _det((0, 0, 100, 100), 0.9),
+        _det((4, 2, 104, 100), 0.7, model='Crack Detection (thin)'),
+        # Only one of the two crack models found this one
+        _det((300, 300, 340, 340), 0.8),
+    ]
+    fused, alone = suppress_and_fuse(detections)
+    assert fused['confidence'] == pytest.approx(0.8)
+    assert fused['fused_models'] == ['Crack Detection', 'Crack Detection (thin)']
+    assert fused['bbox'] == [2, 1, 102, 100]
+    assert alone['confidence'] == pytest.approx(0.4)
+    assert alone['severity'] == 'Medium' and 'fused_models' not in alone
+    # The inputs are left as they were
+    assert detections[2]['confidence'] == 0.8
+
+
+def test_same_model_boxes_nms_let_through_are_fused_to_their_mean():
+    detections = [_det((0, 0, 100, 100), 0.9), _det((0, 0, 100, 70), 0.5)]
+    # IoU 0.7: kept by NMS at 0.8, fused at 0.55; one model, so agreement is full
+    fused, = suppress_and_fuse(detections, iou_threshold=0.8)
+    assert fused['confidence'] == pytest.approx(0.7)
+    assert fused['fused_models'] == ['Crack Detection']
+
+
+def test_merge_augmented_averages_over_views():
+    plain = [_det((0, 0, 50, 50), 0.9), _det((200, 200, 220, 220), 0.8)]
+    flipped = [_det((2, 0, 52, 50), 0.7)]
+    merged = merge_augmented([plain, flipped], confidence_threshold=0.5)
+    # The region only one view saw scores 0.8 / 2 and is dropped
+    assert len(merged) == 1
+    assert merged[0]['confidence'] == pytest.approx(0.8)
+    assert merged[0]['bbox'] == [1, 0, 51, 50]
+    assert merge_augmented([[], []], 0.5) == []
+
+
+def test_to_arrays_labels_by_model():
+    _, _, labels = to_arrays([_det((0, 0, 1, 1), 0.5, model='B'), _det((0, 0, 1, 1), 0.5, model='A')])
+    assert labels.tolist() == [1, 0]
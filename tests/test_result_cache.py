@@ -0,0 +1,67 @@
+import io
+import uuid
+
+import numpy as np
+from PIL import Image
+
+from analysis_runner import analyze_media, result_keys
+from media_store import file_info_for, put_bytes
+from result_cache import cache_key, lookup, purge, store
+
+
+def _key(sha256=None, **overrides):
+    fields = dict(model='Crack Detection', model_version='1', confidence_threshold=0.7,
+                  sensitivity='Medium', analysis_mode='Detailed Analysis')
+    fields.update(overrides)
+    return cache_key(sha256 or uuid.uuid4().hex, **fields)
+
+
+def _image(seed: int) -> dict:
+    pixels = np.random.default_rng(seed).integers(0, 255, size=(96, 128, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, 'PNG')
+    return file_info_for(put_bytes(buf.getvalue(), f'img{seed}.png', 'image/png'), f'img{seed}.png', 'image/png')
+
+
+def test_threshold_is_rounded_into_one_key():
+    sha256 = uuid.uuid4().hex
+    assert _key(sha256, confidence_threshold=0.7) == _key(sha256, confidence_threshold=0.70000000001)
+    assert _key(sha256, confidence_threshold=0.7) != _key(sha256, confidence_threshold=0.71)
+    assert _key(sha256, model_version=2).model_version == '2'
+
+
+def test_store_and_lookup_round_trip_including_empty_results():
+    found, empty, absent = _key(), _key(), _key()
+    detections = [{'bbox': [1, 2, 3, 4], 'confidence': 0.9, 'model': 'Crack Detection'}]
+    store({found: detections, empty: []})
+    assert lookup([found, empty, absent]) == {found: detections, empty: []}
+    assert lookup([]) == {}
+    assert purge(found.sha256) == 1
+    assert lookup([found]) == {}
+
+
+def test_result_keys_follow_every_output_setting():
+    file_info = {'sha256': uuid.uuid4().hex, 'type': 'image/png'}
+    settings = {'models': ['Crack Detection', 'Corrosion Detection'], 'confidence_threshold': 0.7}
+    keys = result_keys(file_info, settings)
+    assert set(keys) == set(settings['models'])
+    assert keys == result_keys(file_info, dict(settings))
+    for change in ({'confidence_threshold': 0.6}, {'sensitivity': 'High'}, {'mode': 'Quick Scan'},
+                   {'postprocessing': {'nms_iou': 0.3}}):
+        assert result_keys(file_info, dict(settings, **change)) != keys
+    # Tiling only matters for the models that run tiled
+    tiled = result_keys(file_info, dict(settings, tiling={'models': ['Crack Detection'], 'tile_size': 512}))
+    assert tiled['Crack Detection'] != keys['Crack Detection']
+    assert tiled['Corrosion Detection'] == keys['Corrosion Detection']
+    assert result_keys({'type': 'image/png'}, settings) == {}
+
+
+def test_second_run_is_served_from_the_cache():
+    files = [_image(seed) for seed in range(3)]
+    settings = {'models': ['Crack Detection', 'Corrosion Detection'], 'confidence_threshold': 0.3}
+    first, first_stats = analyze_media(files, settings)
+    second, second_stats = analyze_media(files, settings)
+    assert first_stats['cache'] == {'hits': 0, 'misses': 6}
+    assert second_stats['cache'] == {'hits': 6, 'misses': 0}
+    assert all(result['cached'] for result in second)
+    assert [r['detections'] for r in second] == [r['detections'] for r in first]
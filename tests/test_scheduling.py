@@ -0,0 +1,56 @@
+from analysis_runner import analysis_signature, merge_results, pending_media
+
+SETTINGS = {'models': ['Crack Detection', 'Corrosion Detection'], 'confidence_threshold': 0.7}
+
+
+def _file(sha256):
+    return {'name': f'{sha256}.jpg', 'path': f'/store/{sha256}.jpg', 'sha256': sha256}
+
+
+def _result(sha256, settings=SETTINGS, **extra):
+    return dict({'file_path': f'/store/{sha256}.jpg', 'sha256': sha256,
+                 'analysis_signature': analysis_signature(settings), 'detections': []}, **extra)
+
+
+def test_signature_ignores_model_order_and_tracks_output_settings():
+    reordered = dict(SETTINGS, models=list(reversed(SETTINGS['models'])))
+    assert analysis_signature(reordered) == analysis_signature(SETTINGS)
+    for change in ({'models': ['Crack Detection']}, {'confidence_threshold': 0.5}, {'sensitivity': 'Low'},
+                   {'mode': 'Comprehensive Report'}, {'video_sampling': {'stride': 10}}):
+        assert analysis_signature(dict(SETTINGS, **change)) != analysis_signature(SETTINGS)
+
+
+def test_signature_ignores_tiling_unless_a_model_runs_tiled():
+    tiling = {'tile_size': 512, 'overlap': 64}
+    assert analysis_signature(dict(SETTINGS, tiling=tiling)) == analysis_signature(SETTINGS)
+    tiled = dict(SETTINGS, tiling=dict(tiling, models=['Crack Detection']))
+    assert analysis_signature(tiled) != analysis_signature(SETTINGS)
+    assert analysis_signature(dict(tiled, tiling=dict(tiled['tiling'], overlap=128))) != analysis_signature(tiled)
+
+
+def test_pending_media_skips_only_current_successful_results():
+    files = [_file(name) for name in ('new', 'done', 'stale', 'failed', 'degraded')]
+    results = [
+        _result('done'),
+        _result('stale', settings=dict(SETTINGS, confidence_threshold=0.5)),
+        _result('failed', error='decode failed'),
+        _result('degraded', degraded=True),
+    ]
+    pending = pending_media(files, results, SETTINGS)
+    assert [f['sha256'] for f in pending] == ['new', 'stale', 'failed', 'degraded']
+    assert pending_media(files, results, dict(SETTINGS, models=['Crack Detection'])) == files
+
+
+def test_pending_media_falls_back_to_paths_without_hashes():
+    file_info = {'name': 'a.jpg', 'path': '/tmp/a.jpg'}
+    result = {'file_path': '/tmp/a.jpg', 'analysis_signature': analysis_signature(SETTINGS)}
+    assert pending_media([file_info], [result], SETTINGS) == []
+
+
+def test_merge_results_replaces_in_place_and_appends_new_media():
+    existing = [_result('a', detections=[1]), _result('b', detections=[2])]
+    merged = merge_results(existing, [_result('b', detections=[3]), _result('c', detections=[4])])
+    assert [(r['sha256'], r['detections']) for r in merged] == [('a', [1]), ('b', [3]), ('c', [4])]
+    assert [r['detections'] for r in existing] == [[1], [2]]
+    # The same media twice in one run keeps the later result
+    assert [r['detections'] for r in merge_results([], [_result('d', detections=[5]), _result('d', detections=[6])])] == [[6]]
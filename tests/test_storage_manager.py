@@ -0,0 +1,37 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from media_store import lookup, object_path, put_bytes
+from result_cache import cache_key, lookup as cached, store
+from storage_manager import delete_blob
+from thumbnails import build_thumbnails, crop_path, save_crop, thumbnail_path, track_crops, THUMB_SIZES
+
+
+def test_delete_blob_removes_every_derived_file():
+    data = np.random.default_rng(9).integers(0, 255, size=(50, 70, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(data).save(buf, 'PNG')
+    record = put_bytes(buf.getvalue(), 'frame.png', 'image/png')
+    sha256 = record['sha256']
+    build_thumbnails(sha256, record['path'])
+    crops = [save_crop(sha256, track_id, data[:10, :10]) for track_id in (0, 7, 12)]
+    key = cache_key(sha256, 'Crack Detection', '1', 0.7, 'Medium', 'Detailed Analysis')
+    store({key: []})
+    assert sorted(track_crops(sha256)) == sorted(crops) == sorted(crop_path(sha256, t) for t in (0, 7, 12))
+
+    on_disk = sum(os.path.getsize(p) for p in [record['path'], *crops, *(thumbnail_path(sha256, s) for s in THUMB_SIZES)])
+    assert delete_blob(sha256, record['ext']) == on_disk
+    assert not os.path.exists(object_path(sha256, record['ext']))
+    assert track_crops(sha256) == []
+    assert not any(os.path.exists(thumbnail_path(sha256, size)) for size in THUMB_SIZES)
+    assert lookup(sha256) is None
+    assert cached([key]) == {}
+
+
+def test_crops_of_other_blobs_are_left_alone():
+    keep = save_crop('ab' + '1' * 62, 3, np.zeros((4, 4, 3), dtype=np.uint8))
+    delete_blob('ab' + '2' * 62, '.mp4')
+    assert os.path.exists(keep)
@@ -0,0 +1,160 @@
+import io
+import struct
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from tiled_reader import PilRasterReader, TiffRasterReader, is_large_raster, open_raster
+
+
+@pytest.fixture(scope='module')
+def pixels():
+    return np.random.default_rng(4).integers(0, 255, size=(300, 410, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('compression', ['raw', 'tiff_adobe_deflate'])
+def test_tiff_windows_match_the_full_decode(tmp_path, pixels, compression):
+    path = tmp_path / f'{compression}.tif'
+    Image.fromarray(pixels).save(path, compression=compression)
+    with open_raster(str(path)) as reader:
+        assert isinstance(reader, TiffRasterReader)
+        assert (reader.width, reader.height) == (410, 300)
+        np.testing.assert_array_equal(reader.read_window(37, 101, 200, 150), pixels[101:251, 37:237])
+        # Windows hanging over the edge are clipped, not padded
+        assert reader.read_window(400, 290, 64, 64).shape == (10, 10, 3)
+        assert reader.read_window(500, 0, 10, 10).shape == (0, 0, 3)
+        np.testing.assert_array_equal(reader.overview(100), pixels[::5, ::5])
+
+
+@pytest.mark.parametrize('compression,options', [
+    ('tiff_lzw', {}), ('tiff_lzw', {'tiffinfo': {317: 2}}), ('packbits', {}),
+])
+def test_codec_strips_are_decoded_one_at_a_time(tmp_path, pixels, compression, options):
+    path = tmp_path / f'{compression}.tif'
+    Image.fromarray(pixels).save(path, compression=compression, **options)
+    with open_raster(str(path)) as reader:
+        assert isinstance(reader, TiffRasterReader) and reader.chunk_h < reader.height
+        np.testing.assert_array_equal(reader.read_window(37, 101, 200, 150), pixels[101:251, 37:237])
+        assert reader.read_window(400, 290, 64, 64).shape == (10, 10, 3)
+
+
+def test_jpeg_in_tiff_strips_are_decoded_one_at_a_time(tmp_path, pixels):
+    path = tmp_path / 'jpeg.tif'
+    Image.fromarray(pixels).save(path, compression='jpeg', quality=95)
+    with open_raster(str(path)) as reader:
+        assert isinstance(reader, TiffRasterReader)
+        window = reader.read_window(37, 101, 200, 150).astype(int)
+        assert np.abs(window - pixels[101:251, 37:237]).mean() < 4
+
+
+def _tiled_lzw_tiff(path, pixels, tile):
+    """A tiled LZW TIFF, each tile compressed by Pillow as a one-strip image"""
+    height, width = pixels.shape[:2]
+    tiles = []
+    for y in range(0, height, tile):
+        for x in range(0, width, tile):
+            padded = np.zeros((tile, tile, 3), dtype=np.uint8)
+            part = pixels[y:y + tile, x:x + tile]
+            padded[:part.shape[0], :part.shape[1]] = part
+            buf = io.BytesIO()
+            Image.fromarray(padded).save(buf, 'TIFF', compression='tiff_lzw', strip_size=1 << 30)
+            with Image.open(io.BytesIO(buf.getvalue())) as img:
+                offset, count = img.tag_v2[273][0], img.tag_v2[279][0]
+            tiles.append(buf.getvalue()[offset:offset + count])
+    data_at = 8
+    offsets = []
+    for data in tiles:
+        offsets.append(data_at)
+        data_at += len(data)
+    bits_at = data_at
+    offsets_at = bits_at + 6
+    counts_at = offsets_at + 4 * len(tiles)
+    ifd_at = counts_at + 4 * len(tiles)
+    entries = [
+        (256, 4, 1, struct.pack('<I', width)), (257, 4, 1, struct.pack('<I', height)),
+        (258, 3, 3, struct.pack('<I', bits_at)), (259, 3, 1, struct.pack('<HH', 5, 0)),
+        (262, 3, 1, struct.pack('<HH', 2, 0)), (277, 3, 1, struct.pack('<HH', 3, 0)),
+        (284, 3, 1, struct.pack('<HH', 1, 0)), (322, 4, 1, struct.pack('<I', tile)),
+        (323, 4, 1, struct.pack('<I', tile)), (324, 4, len(tiles), struct.pack('<I', offsets_at)),
+        (325, 4, len(tiles), struct.pack('<I', counts_at)),
+    ]
+    with open(path, 'wb') as fh:
+        fh.write(b'II' + struct.pack('<HI', 42, ifd_at))
+        fh.write(b''.join(tiles))
+        fh.write(struct.pack('<HHH', 8, 8, 8))
+        fh.write(struct.pack(f'<{len(tiles)}I', *offsets))
+        fh.write(struct.pack(f'<{len(tiles)}I', *(len(t) for t in tiles)))
+        fh.write(struct.pack('<H', len(entries)))
+        for tag, ftype, count, value in entries:
+            fh.write(struct.pack('<HHI', tag, ftype, count) + value)
+        fh.write(b'\x00' * 4)
+
+
+def test_tiled_lzw_reads_only_the_tiles_a_window_touches(tmp_path, pixels):
+    path = tmp_path / 'tiled.tif'
+    _tiled_lzw_tiff(path, pixels, 128)
+    with open_raster(str(path)) as reader:
+        assert isinstance(reader, TiffRasterReader) and (reader.chunk_w, reader.chunk_h) == (128, 128)
+        np.testing.assert_array_equal(reader.read_window(100, 100, 60, 60), pixels[100:160, 100:160])
+        assert sorted(reader._cache) == [0, 1, 4, 5]
+        # Edge tiles are stored whole and cropped on read
+        np.testing.assert_array_equal(reader.read_window(380, 250, 64, 64), pixels[250:, 380:])
+        np.testing.assert_array_equal(reader.overview(100), pixels[::5, ::5])
+
+
+def test_other_formats_fall_back_to_pil(tmp_path, pixels):
+    path = tmp_path / 'ortho.png'
+    Image.fromarray(pixels).save(path)
+    with open_raster(str(path)) as reader:
+        assert isinstance(reader, PilRasterReader)
+        np.testing.assert_array_equal(reader.read_window(10, 20, 30, 40), pixels[20:60, 10:40])
+
+
+def test_pil_reader_opens_rasters_over_the_bomb_limit(tmp_path, pixels, monkeypatch):
+    path = tmp_path / 'huge.png'
+    Image.fromarray(pixels).save(path)
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(path)
+
+    def read():
+        for _ in range(20):
+            with PilRasterReader(str(path)) as reader:
+                assert reader.width == 410
+                assert reader.overview(64).shape[1] <= 64
+                assert reader.read_window(0, 0, 8, 8).shape == (8, 8, 3)
+
+    threads = [threading.Thread(target=read) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Every reader put the limit back, whatever order the threads finished in
+    assert Image.MAX_IMAGE_PIXELS == 1000
+
+
+def test_pixels_are_decoded_with_the_limit_back_in_place(tmp_path, pixels, monkeypatch):
+    import tiled_reader
+
+    path = tmp_path / 'huge.png'
+    Image.fromarray(pixels).save(path)
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    seen = []
+    load = Image.Image.load
+
+    def recording_load(img):
+        seen.append((Image.MAX_IMAGE_PIXELS, tiled_reader._PIXEL_LIMIT_LOCK.locked()))
+        return load(img)
+
+    monkeypatch.setattr(Image.Image, 'load', recording_load)
+    with PilRasterReader(str(path)) as reader:
+        reader.read_window(0, 0, 8, 8)
+    assert seen and set(seen) == {(1000, False)}
+
+
+def test_large_raster_threshold():
+    assert is_large_raster({'width': 10000, 'height': 10000})
+    assert not is_large_raster({'width': 4000, 'height': 3000})
+    assert not is_large_raster(None) and not is_large_raster({'width': None, 'height': 5})
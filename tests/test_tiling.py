@@ -0,0 +1,81 @@
+import numpy as np
+from PIL import Image
+
+from inference_engine import tile_origins
+from postprocess import merge_seams
+from tiled_reader import open_raster
+
+
+def _det(bbox, confidence, model='Crack Detection'):
+    return {'bbox': list(bbox), 'confidence': confidence, 'model': model}
+
+
+def test_tile_origins_cover_the_image_without_padding():
+    origins = tile_origins(2500, 1000, 1024, 128)
+    xs = sorted({x for x, _ in origins})
+    assert xs == [0, 896, 1476]
+    assert {y for _, y in origins} == {0}
+    assert tile_origins(500, 400, 1024, 128) == [(0, 0)]
+
+
+# Tiles of 1024 px overlapping by 128 px across a 2500 x 1000 raster: seam bands at x 896..1024 and 1476..1920
+ORIGINS = tile_origins(2500, 1000, 1024, 128)
+
+
+def test_seam_merge_joins_a_box_cut_across_several_tiles():
+    pieces = [
+        _det((900, 10, 1024, 40), 0.6),
+        _det((896, 10, 1600, 40), 0.8),
+        _det((1476, 12, 1700, 38), 0.7),
+        _det((900, 10, 1024, 40), 0.9, model='Corrosion Detection'),
+        _det((3000, 10, 3050, 40), 0.5),
+    ]
+    merged = merge_seams(pieces, ORIGINS, 1024, 0.5)
+    crack = [d for d in merged if d['model'] == 'Crack Detection']
+    assert len(merged) == 3
+    assert sorted(d['bbox'] for d in crack) == [[896, 10, 1700, 40], [3000, 10, 3050, 40]]
+    assert max(d['confidence'] for d in crack) == 0.8
+
+
+def test_seam_merge_leaves_boxes_away_from_seams_apart():
+    pieces = [_det((0, 0, 100, 100), 0.9), _det((95, 0, 200, 100), 0.8)]
+    assert len(merge_seams(pieces, ORIGINS, 1024, 0.5)) == 2
+
+
+def test_seam_merge_joins_a_crack_three_times_the_overlap_long():
+    # A 392 px crack centred on the 128 px band: each tile sees 260 px of it, so the pieces
+    # share less than half of either box, yet they line up exactly along the seam
+    pieces = [_det((764, 500, 1024, 520), 0.7), _det((896, 501, 1156, 520), 0.8)]
+    merged = merge_seams(pieces, ORIGINS, 1024, 0.5)
+    assert [d['bbox'] for d in merged] == [[764, 500, 1156, 520]]
+    # Much longer still, across both seams
+    pieces = [_det((100, 500, 1024, 520), 0.7), _det((896, 500, 1920, 520), 0.8), _det((1476, 500, 2490, 520), 0.6)]
+    assert [d['bbox'] for d in merge_seams(pieces, ORIGINS, 1024, 0.5)] == [[100, 500, 2490, 520]]
+
+
+def test_seam_merge_works_across_horizontal_seams():
+    origins = tile_origins(600, 2000, 1024, 128)
+    pieces = [_det((300, 200, 330, 1024), 0.7), _det((302, 976, 330, 1900), 0.8)]
+    assert [d['bbox'] for d in merge_seams(pieces, origins, 1024, 0.5)] == [[300, 200, 330, 1900]]
+
+
+def test_seam_merge_needs_pieces_that_line_up_and_meet():
+    # Different rows along the seam
+    offset = [_det((764, 500, 1024, 520), 0.7), _det((896, 600, 1156, 620), 0.8)]
+    assert len(merge_seams(offset, ORIGINS, 1024, 0.5)) == 2
+    # Same row, both in the band, but a gap between them
+    apart = [_det((700, 500, 900, 520), 0.7), _det((1000, 500, 1300, 520), 0.8)]
+    assert len(merge_seams(apart, ORIGINS, 1024, 0.5)) == 2
+
+
+def test_raster_tiles_overlap_and_reach_the_far_edges(tmp_path):
+    path = tmp_path / 'ortho.png'
+    pixels = np.random.default_rng(0).integers(0, 255, size=(700, 900, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path)
+    with open_raster(str(path)) as reader:
+        tiles = list(reader.iter_tiles(400, 100))
+    # The last tile on each axis is pulled back inside the raster, the way the engine tiles
+    assert [(x, y) for x, y, _ in tiles] == [(x, y) for y in (0, 300) for x in (0, 300, 500)]
+    assert {tile.shape for _, _, tile in tiles} == {(400, 400, 3)}
+    x, y, tile = tiles[-1]
+    np.testing.assert_array_equal(tile, pixels[300:700, 500:900])
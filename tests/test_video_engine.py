@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+
+from video_engine import SAMPLING_SCENE, VideoAnalysisEngine
+
+
+@pytest.fixture(scope='module')
+def video(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('video') / 'clip.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25.0, (64, 48))
+    for i in range(50):
+        # Two scenes: dark for the first 25 frames, bright after
+        writer.write(np.full((48, 64, 3), 20 if i < 25 else 220, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def _recorder(calls):
+    def detect_batch(frames):
+        calls.append(len(frames))
+        return [[{'bbox': [0, 0, 4, 4], 'confidence': 0.9, 'model': 'Crack Detection'}] for _ in frames]
+    return detect_batch
+
+
+def test_keyframes_reach_the_detector_in_batches(video):
+    calls = []
+    result = VideoAnalysisEngine(stride=5).run(video, _recorder(calls), batch_size=4)
+    assert calls == [4, 4, 2]
+    stats = result['stats']
+    assert (stats['decoded'], stats['keyframes']) == (50, 10)
+    assert [det['frame_index'] for det in result['detections']] == list(range(0, 50, 5))
+    assert result['detections'][1]['timestamp'] == 0.2
+
+
+def test_batch_size_one_runs_frame_by_frame(video):
+    calls = []
+    VideoAnalysisEngine(stride=10).run(video, _recorder(calls), batch_size=1)
+    assert calls == [1] * 5
+
+
+def test_scene_sampling_keeps_the_cuts(video):
+    calls = []
+    result = VideoAnalysisEngine(mode=SAMPLING_SCENE, scene_threshold=0.25).run(video, _recorder(calls))
+    assert [det['frame_index'] for det in result['detections']] == [0, 25]
+    assert calls == [2]
+
+
+def test_unreadable_video_reports_an_error(tmp_path):
+    calls = []
+    result = VideoAnalysisEngine().run(str(tmp_path / 'missing.mp4'), _recorder(calls))
+    assert 'error' in result['stats'] and calls == []
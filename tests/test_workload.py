@@ -0,0 +1,85 @@
+import io
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from exif_meta import read_jpeg_header
+from workload import SyntheticWorkload, replay
+
+SMALL = (320, 240)
+
+
+def test_items_depend_only_on_seed_and_index():
+    small = SyntheticWorkload(3, SMALL, seed=7)
+    large = SyntheticWorkload(1000, SMALL, seed=7)
+    for i in range(3):
+        assert small.detections(i) == large.detections(i)
+        assert small.geo(i) == large.geo(i)
+        np.testing.assert_array_equal(small.image(i), large.image(i))
+    assert small.jpeg(2) == SyntheticWorkload(3, SMALL, seed=7).jpeg(2)
+
+
+def test_seeds_and_indices_differ():
+    workload = SyntheticWorkload(2, SMALL, seed=1)
+    assert workload.detections(0) != workload.detections(1)
+    assert workload.detections(0) != SyntheticWorkload(2, SMALL, seed=2).detections(0)
+    assert workload.name(1) == 'synthetic_1_000001.jpg'
+
+
+def test_ground_truth_lies_inside_the_image():
+    workload = SyntheticWorkload(20, SMALL, detections_per_image=4)
+    for i in range(workload.items):
+        detections = workload.detections(i)
+        assert len(detections) == 4
+        for det in detections:
+            x1, y1, x2, y2 = det['bbox']
+            assert 0 <= x1 < x2 <= SMALL[0] and 0 <= y1 < y2 <= SMALL[1]
+            assert 0.5 <= det['confidence'] <= 0.99
+
+
+def test_jpeg_carries_the_workload_position():
+    workload = SyntheticWorkload(60, SMALL)
+    # Item 55 is on the second, reversed row of the serpentine grid
+    header = read_jpeg_header(io.BytesIO(workload.jpeg(55)))
+    geo = workload.geo(55)
+    assert (header['width'], header['height']) == SMALL
+    assert header['exif']['lat'] == pytest.approx(geo['lat'], abs=1e-6)
+    assert header['exif']['lon'] == pytest.approx(geo['lon'], abs=1e-6)
+    # The second row starts above where the first ended and runs back towards the origin
+    assert workload.geo(50)['lon'] == workload.geo(49)['lon']
+    assert workload.geo(50)['lat'] > workload.geo(49)['lat']
+    assert geo['lon'] < workload.geo(50)['lon']
+
+
+def test_replay_without_models_tabulates_the_ground_truth():
+    workload = SyntheticWorkload(5, SMALL, detections_per_image=3)
+    report = replay(workload, stages=('mapping',))
+    assert report['tabulate']['items'] == 15
+    assert report['mapping']['items'] == 5
+
+
+def test_replay_rejects_impossible_stage_lists():
+    workload = SyntheticWorkload(1, SMALL)
+    with pytest.raises(ValueError):
+        replay(workload, stages=('bogus',))
+    with pytest.raises(ValueError):
+        replay(workload, stages=('generate',))
+    with pytest.raises(ValueError):
+        replay(workload, stages=('analysis',), workdir='/tmp')
+
+
+def test_cli_runs_with_no_arguments_and_keeps_the_store_in_the_workdir(tmp_path):
+    env = {k: v for k, v in os.environ.items() if k != 'FLYSCOPE_STORE_DIR'}
+    env['TMPDIR'] = str(tmp_path)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run(
+        [sys.executable, 'workload.py', '--items', '2', '--resolution', '160x120', '--stages', 'generate,ingest'],
+        cwd=root, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert out.returncode == 0, out.stderr
+    workdir, = [p for p in tmp_path.iterdir() if p.name.startswith('flyscope-workload-')]
+    assert (workdir / 'store' / 'index.db').exists()
+    assert 'ingest' in out.stdout
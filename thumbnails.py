@@ -0,0 +1,89 @@
+import os
+import glob
+import tempfile
+from PIL import Image
+from typing import Dict, List, Optional
+from media_store import STORE_ROOT
+from exif_meta import read_header
+from tiled_reader import open_raster, is_large_raster
+
+# Persistent thumbnail pyramid, keyed by content hash: <THUMBS_DIR>/<aa>/<sha256>_<size>.jpg
+THUMBS_DIR = os.path.join(STORE_ROOT, 'thumbs')
+THUMB_SIZES = (1024, 512, 128)
+THUMB_QUALITY = 85
+
+
+def thumbnail_path(sha256: str, size: int) -> str:
+    return os.path.join(THUMBS_DIR, sha256[:2], f"{sha256}_{size}.jpg")
+
+
+def crop_path(sha256: str, track_id: int) -> str:
+    """Best-frame crop of a video defect track; lives beside the thumbnails so the orphan sweep covers it"""
+    return os.path.join(THUMBS_DIR, sha256[:2], f"{sha256}_track{track_id}.jpg")
+
+
+def track_crops(sha256: str) -> List[str]:
+    """Every track crop saved for a video"""
+    return glob.glob(os.path.join(THUMBS_DIR, sha256[:2], f"{glob.escape(sha256)}_track*.jpg"))
+
+
+def has_thumbnails(sha256: str) -> bool:
+    return all(os.path.exists(thumbnail_path(sha256, size)) for size in THUMB_SIZES)
+
+
+def _save_atomic(img: Image.Image, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    os.close(fd)
+    try:
+        img.save(tmp_path, format='JPEG', quality=THUMB_QUALITY)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def save_crop(sha256: str, track_id: int, rgb) -> str:
+    path = crop_path(sha256, track_id)
+    _save_atomic(Image.fromarray(rgb), path)
+    return path
+
+
+def build_thumbnails(sha256: str, source_path: str) -> Dict[int, str]:
+    """Decode the original once and write every pyramid level, largest first"""
+    if has_thumbnails(sha256):
+        return {size: thumbnail_path(sha256, size) for size in THUMB_SIZES}
+
+    if is_large_raster(read_header(source_path)):
+        # Orthomosaics are decimated window by window rather than decoded whole
+        with open_raster(source_path) as reader:
+            level = Image.fromarray(reader.overview(THUMB_SIZES[0]))
+    else:
+        with Image.open(source_path) as img:
+            # For JPEGs, let the decoder scale down by 1/2..1/8 instead of decoding every pixel
+            img.draft('RGB', (THUMB_SIZES[0], THUMB_SIZES[0]))
+            level = img.convert('RGB')
+
+    paths = {}
+    for size in THUMB_SIZES:
+        # Each level is resized from the previous one, not from the original; reducing_gap
+        # box-reduces first so bilinear filtering only touches a small intermediate
+        level.thumbnail((size, size), Image.BILINEAR, reducing_gap=3.0)
+        path = thumbnail_path(sha256, size)
+        _save_atomic(level, path)
+        paths[size] = path
+    return paths
+
+
+def get_thumbnail(sha256: Optional[str], source_path: str, size: int = 128) -> Optional[str]:
+    """Path of the cached thumbnail level covering `size`, building the pyramid if it is missing"""
+    if not sha256:
+        return None
+    level = min((s for s in THUMB_SIZES if s >= size), default=THUMB_SIZES[0])
+    path = thumbnail_path(sha256, level)
+    if not os.path.exists(path):
+        try:
+            build_thumbnails(sha256, source_path)
+        except Exception:
+            return None
+    return path
@@ -0,0 +1,370 @@
+import io
+import mmap
+import zlib
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+from exif_meta import TiffReader
+
+# Rasters above this many pixels are never decoded whole; analysis, thumbnails and
+# reports read them window by window instead.
+LARGE_RASTER_PIXELS = 40_000_000
+DEFAULT_TILE = 1024
+CHUNK_CACHE_SIZE = 32
+
+TAG_WIDTH = 256
+TAG_HEIGHT = 257
+TAG_BITS = 258
+TAG_COMPRESSION = 259
+TAG_PHOTOMETRIC = 262
+TAG_STRIP_OFFSETS = 273
+TAG_SAMPLES = 277
+TAG_ROWS_PER_STRIP = 278
+TAG_STRIP_BYTES = 279
+TAG_PLANAR = 284
+TAG_PREDICTOR = 317
+TAG_TILE_WIDTH = 322
+TAG_TILE_LENGTH = 323
+TAG_TILE_OFFSETS = 324
+TAG_TILE_BYTES = 325
+TAG_EXTRA_SAMPLES = 338
+TAG_SAMPLE_FORMAT = 339
+TAG_JPEG_TABLES = 347
+TAG_YCBCR_SUBSAMPLING = 530
+
+COMPRESSION_NONE = 1
+COMPRESSION_DEFLATE = (8, 32946)
+# Decoded one strip or tile at a time by libtiff, through Pillow
+COMPRESSION_CODEC = {5: 'LZW', 7: 'JPEG', 32773: 'PackBits'}
+
+# Tags a lone strip or tile needs to be decoded the way it was encoded, with their TIFF types
+CHUNK_TAGS = (
+    (TAG_BITS, 3), (TAG_COMPRESSION, 3), (TAG_PHOTOMETRIC, 3), (TAG_SAMPLES, 3), (TAG_PLANAR, 3),
+    (TAG_PREDICTOR, 3), (TAG_EXTRA_SAMPLES, 3), (TAG_SAMPLE_FORMAT, 3), (TAG_JPEG_TABLES, 7),
+    (TAG_YCBCR_SUBSAMPLING, 3),
+)
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def _chunk_tiff(endian: str, width: int, rows: int, fields: Dict[int, Tuple[int, object]], data: bytes) -> bytes:
+    """A classic single-strip TIFF holding one compressed chunk of a larger one"""
+    entries = dict(fields)
+    entries.update({
+        TAG_WIDTH: (4, width), TAG_HEIGHT: (4, rows), TAG_ROWS_PER_STRIP: (4, rows),
+        TAG_STRIP_OFFSETS: (4, 8), TAG_STRIP_BYTES: (4, len(data)),
+    })
+    ifd_offset = 8 + len(data) + (len(data) & 1)
+    extra_offset = ifd_offset + 2 + 12 * len(entries) + 4
+    ifd, extra = [struct.pack(endian + 'H', len(entries))], []
+    for tag in sorted(entries):
+        ftype, value = entries[tag]
+        if ftype == 7:
+            raw, count = bytes(value), len(value)
+        else:
+            values = _as_list(value)
+            raw, count = struct.pack(endian + ('H' if ftype == 3 else 'I') * len(values), *values), len(values)
+        if len(raw) <= 4:
+            payload = raw.ljust(4, b'\x00')
+        else:
+            payload = struct.pack(endian + 'I', extra_offset + sum(len(e) for e in extra))
+            extra.append(raw + b'\x00' * (len(raw) & 1))
+        ifd.append(struct.pack(endian + 'HHI', tag, ftype, count) + payload)
+    ifd.append(b'\x00' * 4)
+    head = (b'II' if endian == '<' else b'MM') + struct.pack(endian + 'HI', 42, ifd_offset)
+    return head + data + b'\x00' * (len(data) & 1) + b''.join(ifd) + b''.join(extra)
+
+
+def _axis_origins(length: int, tile: int, step: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    origins = list(range(0, length - tile, step))
+    # The last window is pulled back inside the image instead of being padded
+    origins.append(length - tile)
+    return origins
+
+
+def tile_origins(width: int, height: int, tile_size: int, overlap: int) -> List[Tuple[int, int]]:
+    """Top-left corners of overlapping windows covering the image, row-major"""
+    step = max(1, tile_size - overlap)
+    return [(x, y) for y in _axis_origins(height, tile_size, step) for x in _axis_origins(width, tile_size, step)]
+
+
+def _to_rgb8(arr: np.ndarray) -> np.ndarray:
+    if arr.dtype == np.uint16:
+        arr = (arr >> 8).astype(np.uint8)
+    if arr.ndim == 2:
+        arr = arr[:, :, None]
+    if arr.shape[2] == 1:
+        return np.repeat(arr, 3, axis=2)
+    # Alpha and extra bands are not used by the detectors
+    return arr[:, :, :3]
+
+
+class RasterReader:
+    """Windowed access to a raster: read_window, iter_tiles and overview never need the whole image"""
+
+    width = 0
+    height = 0
+
+    def _read(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def read_window(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        """RGB uint8 array for a window, clipped to the raster bounds"""
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return np.zeros((0, 0, 3), dtype=np.uint8)
+        return self._read(x0, y0, x1 - x0, y1 - y0)
+
+    def iter_tiles(self, tile_size: int = DEFAULT_TILE, overlap: int = 0) -> Iterator[Tuple[int, int, np.ndarray]]:
+        """Yield (x, y, tile) at tile_origins, in row-major order
+
+        Neighbouring tiles share at least `overlap` pixels and every tile is full-size unless
+        the raster itself is smaller, so tiles batch together like the engine's own.
+        """
+        for x, y in tile_origins(self.width, self.height, tile_size, overlap):
+            yield x, y, self.read_window(x, y, tile_size, tile_size)
+
+    def overview(self, max_side: int) -> np.ndarray:
+        """Decimated copy whose longer side is at most max_side, built one row band at a time"""
+        step = max(1, -(-max(self.width, self.height) // max_side))
+        rows = []
+        band = step * max(1, DEFAULT_TILE // step)
+        for y in range(0, self.height, band):
+            rows.append(self.read_window(0, y, self.width, band)[::step, ::step])
+        return np.concatenate(rows, axis=0)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TiffRasterReader(RasterReader):
+    """Strip- or tile-organised TIFF/BigTIFF read one chunk at a time
+
+    Uncompressed chunks are memory-mapped and deflate chunks inflated here; LZW, JPEG and
+    PackBits chunks are each wrapped in a one-strip TIFF and decoded by libtiff.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fh = open(path, 'rb')
+        try:
+            tiff = TiffReader(self.fh)
+            tags = tiff.read_ifd(tiff.first_ifd)
+        except Exception:
+            self.fh.close()
+            raise
+        self.width = int(tags[TAG_WIDTH])
+        self.height = int(tags[TAG_HEIGHT])
+        self.samples = int(tags.get(TAG_SAMPLES, 1))
+        bits = _as_list(tags.get(TAG_BITS, 8))[0]
+        self.compression = int(tags.get(TAG_COMPRESSION, COMPRESSION_NONE))
+        self.predictor = int(tags.get(TAG_PREDICTOR, 1))
+        if int(tags.get(TAG_PLANAR, 1)) != 1 or bits not in (8, 16):
+            self.fh.close()
+            raise ValueError("Only chunky 8/16-bit TIFFs are supported for windowed reads")
+        if (self.compression != COMPRESSION_NONE and self.compression not in COMPRESSION_DEFLATE
+                and self.compression not in COMPRESSION_CODEC):
+            self.fh.close()
+            raise ValueError(f"TIFF compression {self.compression} is not supported for windowed reads")
+        self.dtype = np.dtype(np.uint8 if bits == 8 else (tiff.endian + 'u2'))
+        self.endian = tiff.endian
+        self._chunk_fields = {tag: (ftype, tags[tag]) for tag, ftype in CHUNK_TAGS if tag in tags}
+
+        if TAG_TILE_OFFSETS in tags:
+            self.chunk_w = int(tags[TAG_TILE_WIDTH])
+            self.chunk_h = int(tags[TAG_TILE_LENGTH])
+            self.offsets = _as_list(tags[TAG_TILE_OFFSETS])
+            self.byte_counts = _as_list(tags[TAG_TILE_BYTES])
+        else:
+            self.chunk_w = self.width
+            self.chunk_h = int(tags.get(TAG_ROWS_PER_STRIP, self.height))
+            self.offsets = _as_list(tags[TAG_STRIP_OFFSETS])
+            self.byte_counts = _as_list(tags[TAG_STRIP_BYTES])
+        self.across = -(-self.width // self.chunk_w)
+        self._cache = OrderedDict()
+        self._map = None
+        self._mmap = None
+        self._full = None
+        if self.compression == COMPRESSION_NONE:
+            self._map = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mmap = np.frombuffer(self._map, dtype=np.uint8)
+            self._full = self._contiguous_view()
+
+    def _contiguous_view(self) -> Optional[np.ndarray]:
+        """Zero-copy (H, W, C) view when uncompressed strips are laid out back to back"""
+        if self.chunk_w != self.width:
+            return None
+        row_bytes = self.width * self.samples * self.dtype.itemsize
+        start = self.offsets[0]
+        expected = start
+        for offset, count in zip(self.offsets, self.byte_counts):
+            if offset != expected:
+                return None
+            expected += count
+        if expected - start < row_bytes * self.height:
+            return None
+        flat = self._mmap[start:start + row_bytes * self.height]
+        return flat.view(self.dtype).reshape(self.height, self.width, self.samples)
+
+    def _chunk(self, index: int) -> np.ndarray:
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+        offset, count = self.offsets[index], self.byte_counts[index]
+        rows = self.chunk_h
+        if self.chunk_w == self.width:
+            # The last strip may be short
+            rows = min(self.chunk_h, self.height - (index * self.chunk_h))
+        shape = (rows, self.chunk_w, self.samples)
+        if self.compression == COMPRESSION_NONE:
+            # A view into the mapping; nothing to cache
+            raw = self._mmap[offset:offset + count]
+            return raw[:int(np.prod(shape)) * self.dtype.itemsize].view(self.dtype).reshape(shape)
+        self.fh.seek(offset)
+        if self.compression in COMPRESSION_CODEC:
+            chunk = self._decode_chunk(self.fh.read(count), shape)
+        else:
+            raw = zlib.decompress(self.fh.read(count))
+            chunk = np.frombuffer(raw, dtype=self.dtype)[:int(np.prod(shape))].reshape(shape)
+            if self.predictor == 2:
+                # Horizontal differencing: undo with a running sum along each row
+                chunk = np.cumsum(chunk, axis=1, dtype=self.dtype)
+        self._cache[index] = chunk
+        if len(self._cache) > CHUNK_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return chunk
+
+    def _decode_chunk(self, data: bytes, shape: Tuple[int, int, int]) -> np.ndarray:
+        rows = shape[0]
+        with Image.open(io.BytesIO(_chunk_tiff(self.endian, self.chunk_w, rows, self._chunk_fields, data))) as img:
+            if img.mode in ('RGB', 'RGBA') and self.dtype.itemsize == 2:
+                # Pillow keeps only the high byte of 16-bit colour; widen it back
+                chunk = np.asarray(img).astype(self.dtype) << 8
+            else:
+                chunk = np.asarray(img).astype(self.dtype, copy=False)
+        return chunk.reshape(rows, self.chunk_w, -1)
+
+    def read_window(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        window = np.array(super().read_window(x, y, w, h))
+        if self._map is not None and hasattr(mmap, 'MADV_DONTNEED'):
+            # Drop the mapped pages we just copied from, so resident memory stays at one window
+            self._map.madvise(mmap.MADV_DONTNEED)
+        return window
+
+    def _read(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        if self._full is not None:
+            return _to_rgb8(self._full[y:y + h, x:x + w])
+        out = np.empty((h, w, self.samples), dtype=self.dtype)
+        for cy in range(y // self.chunk_h, (y + h - 1) // self.chunk_h + 1):
+            for cx in range(x // self.chunk_w, (x + w - 1) // self.chunk_w + 1):
+                chunk = self._chunk(cy * self.across + cx)
+                gx0, gy0 = cx * self.chunk_w, cy * self.chunk_h
+                sx0, sy0 = max(x, gx0), max(y, gy0)
+                sx1 = min(x + w, gx0 + chunk.shape[1], self.width)
+                sy1 = min(y + h, gy0 + chunk.shape[0], self.height)
+                out[sy0 - y:sy1 - y, sx0 - x:sx1 - x] = chunk[sy0 - gy0:sy1 - gy0, sx0 - gx0:sx1 - gx0]
+        return _to_rgb8(out)
+
+    def close(self):
+        self._cache.clear()
+        self._full = None
+        self._mmap = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self.fh.close()
+
+
+# Pillow's decompression-bomb limit is a module global; every reader that lifts it does so
+# under this lock, so concurrent readers cannot restore each other's value out of order
+_PIXEL_LIMIT_LOCK = threading.Lock()
+
+
+@contextmanager
+def _open_unlimited(path: str):
+    """Image.open without the decompression-bomb limit
+
+    Pillow only checks the limit while parsing the header, so it is lifted for that alone;
+    the lock is released and the limit back in place before any pixels are decoded.
+    """
+    with _PIXEL_LIMIT_LOCK:
+        previous = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            img = Image.open(path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = previous
+    with img:
+        yield img
+
+
+class PilRasterReader(RasterReader):
+    """Fallback for formats without random access: decoded once, lazily
+
+    PNG and baseline JPEG are sequential streams, so a window still costs a decode of the
+    whole raster; so do TIFFs that TiffRasterReader turns down (planar, float or
+    CCITT/LZMA/ZSTD-compressed). Only overview() avoids it, for JPEG, through draft mode.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with _open_unlimited(path) as img:
+            self.width, self.height = img.size
+        self._pixels = None
+
+    def _load(self) -> np.ndarray:
+        if self._pixels is None:
+            with _open_unlimited(self.path) as img:
+                self._pixels = np.asarray(img.convert('RGB'))
+        return self._pixels
+
+    def _read(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        return self._load()[y:y + h, x:x + w]
+
+    def overview(self, max_side: int) -> np.ndarray:
+        if self._pixels is None:
+            with _open_unlimited(self.path) as img:
+                # JPEG draft mode decodes at 1/2..1/8 scale without touching full resolution
+                img.draft('RGB', (max_side, max_side))
+                small = img.convert('RGB')
+                small.thumbnail((max_side, max_side))
+                return np.asarray(small)
+        return super().overview(max_side)
+
+    def close(self):
+        self._pixels = None
+
+
+def open_raster(path: str) -> RasterReader:
+    """Windowed reader for a raster, memory-mapped or chunk-decoded where the format allows"""
+    with open(path, 'rb') as fh:
+        magic = fh.read(4)
+    if magic in (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+'):
+        try:
+            return TiffRasterReader(path)
+        except (ValueError, KeyError):
+            pass
+    return PilRasterReader(path)
+
+
+def is_large_raster(header: Optional[Dict]) -> bool:
+    """True when ingest-time header dimensions say the image should not be decoded whole"""
+    if not header or not header.get('width') or not header.get('height'):
+        return False
+    return header['width'] * header['height'] > LARGE_RASTER_PIXELS
@@ -0,0 +1,170 @@
+import time
+import queue
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import cv2
+
+# Keyframe sampling strategies
+SAMPLING_STRIDE = 'stride'
+SAMPLING_SCENE = 'scene'
+
+DEFAULT_STRIDE = 30
+DEFAULT_SCENE_THRESHOLD = 0.25
+FRAME_QUEUE_SIZE = 8
+# Keyframes are handed to the detector this many at a time
+KEYFRAME_BATCH_SIZE = 8
+# Scene scores are computed on a tiny grayscale copy of each frame
+SCENE_PROBE_SIZE = (64, 36)
+
+_DONE = object()
+
+
+def scene_score(prev: Optional[np.ndarray], probe: np.ndarray) -> float:
+    """Mean absolute difference of two grayscale probes, scaled to 0..1"""
+    if prev is None:
+        return 1.0
+    return float(np.mean(cv2.absdiff(prev, probe))) / 255.0
+
+
+def _probe(frame: np.ndarray) -> np.ndarray:
+    small = cv2.resize(frame, SCENE_PROBE_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+
+class VideoAnalysisEngine:
+    """Decodes on a background thread and feeds batches of sampled keyframes to a detector through a bounded queue"""
+
+    def __init__(self, mode: str = SAMPLING_STRIDE, stride: int = DEFAULT_STRIDE,
+                 scene_threshold: float = DEFAULT_SCENE_THRESHOLD, min_gap: int = 5,
+                 max_keyframes: Optional[int] = None, queue_size: int = FRAME_QUEUE_SIZE):
+        self.mode = mode
+        self.stride = max(1, int(stride))
+        self.scene_threshold = scene_threshold
+        self.min_gap = min_gap
+        self.max_keyframes = max_keyframes
+        self.queue_size = queue_size
+
+    def _decode(self, path: str, frames: queue.Queue, stats: Dict, stop: threading.Event):
+        cap = cv2.VideoCapture(path)
+        try:
+            if not cap.isOpened():
+                stats['error'] = f"Could not open video {path}"
+                return
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            stats['source_fps'] = fps
+            stats['frame_count'] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            index = -1
+            last_key = -self.min_gap
+            prev_probe = None
+            sampled = 0
+            while not stop.is_set():
+                # grab() demuxes without converting to BGR, so skipped frames stay cheap
+                if not cap.grab():
+                    break
+                index += 1
+                stats['decoded'] = index + 1
+                if self.mode == SAMPLING_STRIDE:
+                    if index % self.stride:
+                        continue
+                    ok, frame = cap.retrieve()
+                    if not ok:
+                        continue
+                    score = None
+                else:
+                    ok, frame = cap.retrieve()
+                    if not ok:
+                        continue
+                    probe = _probe(frame)
+                    score = scene_score(prev_probe, probe)
+                    prev_probe = probe
+                    if score < self.scene_threshold or index - last_key < self.min_gap:
+                        continue
+                last_key = index
+                timestamp = index / fps if fps else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                # Blocks when the detector falls behind, which bounds memory to queue_size frames
+                frames.put((index, timestamp, frame, score))
+                sampled += 1
+                if self.max_keyframes and sampled >= self.max_keyframes:
+                    break
+        finally:
+            cap.release()
+            frames.put(_DONE)
+
+    def _batches(self, frames: queue.Queue, batch_size: int) -> Iterator[List[Tuple]]:
+        """Keyframes from the queue in lists of up to batch_size; a short list only at the end"""
+        batch = []
+        while True:
+            item = frames.get()
+            if item is _DONE:
+                break
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run(self, path: str, detect_batch: Callable[[List[np.ndarray]], List[List[Dict]]],
+            on_progress: Optional[Callable[[Dict], None]] = None, tracker=None,
+            batch_size: int = KEYFRAME_BATCH_SIZE) -> Dict:
+        """Analyse a video; returns {'detections': [...], 'stats': {...}}
+
+        detect_batch gets a list of BGR keyframes and returns their detections in the same order.
+        With a DefectTracker, keyframe detections are fed to it as they arrive and the result
+        holds one detection per track instead of one per keyframe sighting.
+        """
+        frames = queue.Queue(maxsize=self.queue_size)
+        stats = {'decoded': 0, 'keyframes': 0, 'mode': self.mode}
+        stop = threading.Event()
+        decoder = threading.Thread(target=self._decode, args=(path, frames, stats, stop), name="video-decode", daemon=True)
+        started = time.perf_counter()
+        decoder.start()
+        detections = []
+        detect_seconds = 0.0
+        try:
+            for batch in self._batches(frames, max(1, int(batch_size))):
+                t0 = time.perf_counter()
+                batch_detections = detect_batch([frame for _, _, frame, _ in batch])
+                for (index, timestamp, frame, score), frame_detections in zip(batch, batch_detections):
+                    for det in frame_detections:
+                        det['frame_index'] = index
+                        det['timestamp'] = round(timestamp, 3)
+                        if score is not None:
+                            det['scene_score'] = round(score, 3)
+                    if tracker is not None:
+                        tracker.update(index, timestamp, frame_detections, frame)
+                    else:
+                        detections.extend(frame_detections)
+                detect_seconds += time.perf_counter() - t0
+                stats['keyframes'] += len(batch)
+                if on_progress:
+                    on_progress(stats)
+        finally:
+            stop.set()
+            # Unblock the decoder if it is waiting on a full queue
+            while decoder.is_alive():
+                try:
+                    frames.get_nowait()
+                except queue.Empty:
+                    decoder.join(0.05)
+        if tracker is not None:
+            detections = tracker.finish()
+            stats.update(tracker.stats())
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        stats['elapsed'] = elapsed
+        stats['decode_fps'] = stats['decoded'] / elapsed
+        stats['keyframe_fps'] = stats['keyframes'] / elapsed
+        stats['detect_seconds'] = detect_seconds
+        return {'detections': detections, 'stats': stats}
+
+
+def format_video_stats(stats: Dict) -> str:
+    text = (
+        f"{stats['decoded']} frames decoded at {stats['decode_fps']:.1f} frames/s, "
+        f"{stats['keyframes']} keyframes analysed ({stats['keyframe_fps']:.1f} frames/s, "
+        f"{stats['mode']} sampling)"
+    )
+    if 'tracks' in stats:
+        text += f"; {stats['raw_detections']} keyframe detections collapsed into {stats['tracks']} track(s)"
+    return text
@@ -0,0 +1,343 @@
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image
+
+from detectors import DEFECT_INFO, defect_info
+
+# Seeded synthetic inspection workloads for benchmarking. Item i of a workload depends only on
+# (seed, i), never on how many items are generated, so the first 10 items of a 100k workload
+# are the 10-item workload. Each image is painted with exactly the defects listed as its
+# ground-truth detections, at the listed boxes, in colours the reference detectors respond to.
+DEFAULT_SEED = 0
+DEFAULT_RESOLUTION = (1920, 1080)
+DEFAULT_DETECTIONS = 5
+BENCHMARK_SIZES = (10, 1000, 100000)
+REPLAY_STAGES = ('generate', 'ingest', 'analysis', 'mapping', 'reporting')
+# Building the detection table is timed on its own whenever mapping or reporting runs
+STAGE_TABULATE = 'tabulate'
+
+# Images are laid out on a serpentine flight grid starting here
+MISSION_ORIGIN = (11.1271, 78.6569)
+MISSION_START = datetime(2024, 1, 1, 9, 0, 0)
+GRID_STEP_DEG = 0.0002
+GRID_ROW = 50
+SHOT_INTERVAL = timedelta(seconds=2)
+
+# Independent random streams per item, so box layout does not depend on pixel painting
+_LAYOUT = 0
+_PIXELS = 1
+
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_DATETIME = 0x0132
+TAG_GPS_IFD = 0x8825
+
+
+def _dms(value: float) -> Tuple[float, float, float]:
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    return float(degrees), float(minutes), round((value - degrees - minutes / 60) * 3600, 4)
+
+
+def _paint_crack(img: np.ndarray, box: Sequence[int], rng: np.random.Generator):
+    """Dark wandering line from one side of the box to the other"""
+    x1, y1, x2, y2 = box
+    vertical = rng.random() < 0.5
+    along, across = ((y1, y2), (x1, x2)) if vertical else ((x1, x2), (y1, y2))
+    steps = np.arange(along[0], along[1])
+    centre = (across[0] + across[1]) / 2
+    path = centre + np.cumsum(rng.normal(0.0, 0.7, len(steps)))
+    path = np.clip(path, across[0], across[1] - 1).astype(np.int64)
+    width = max(1, (across[1] - across[0]) // 40)
+    for offset in range(width):
+        line = np.clip(path + offset, across[0], across[1] - 1)
+        if vertical:
+            img[steps, line] = (35, 32, 30)
+        else:
+            img[line, steps] = (35, 32, 30)
+
+
+def _ellipse(box: Sequence[int]) -> Tuple[slice, slice, np.ndarray]:
+    x1, y1, x2, y2 = box
+    yy, xx = np.ogrid[y1:y2, x1:x2]
+    cx, cy, rx, ry = (x1 + x2 - 1) / 2, (y1 + y2 - 1) / 2, max((x2 - x1) / 2, 1), max((y2 - y1) / 2, 1)
+    return slice(y1, y2), slice(x1, x2), ((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1.0
+
+
+def _paint_patch(colour: Tuple[int, int, int], jitter: int) -> Callable:
+    def paint(img, box, rng):
+        rows, cols, mask = _ellipse(box)
+        noise = rng.integers(-jitter, jitter + 1, (int(mask.sum()), 3))
+        img[rows, cols][mask] = np.clip(np.array(colour) + noise, 0, 255)
+    return paint
+
+
+def _paint_spalling(img: np.ndarray, box: Sequence[int], rng: np.random.Generator):
+    """Broken surface: random dark and bright blocks"""
+    x1, y1, x2, y2 = box
+    block = max(2, (x2 - x1) // 12)
+    gh, gw = -(-(y2 - y1) // block), -(-(x2 - x1) // block)
+    levels = rng.choice(np.array([20, 235], dtype=np.uint8), (gh, gw))
+    img[y1:y2, x1:x2] = np.kron(levels, np.ones((block, block), dtype=np.uint8))[:y2 - y1, :x2 - x1, None]
+
+
+PAINTERS = {
+    "Crack Detection": _paint_crack,
+    "Corrosion Detection": _paint_patch((170, 85, 40), 12),
+    "Thermal Anomaly": _paint_patch((255, 235, 210), 0),
+    "Vegetation Risk": _paint_patch((60, 150, 50), 15),
+    "Structural Damage": _paint_spalling,
+}
+
+
+class SyntheticWorkload:
+    """N deterministic images of a given resolution, each with M ground-truth detections"""
+
+    def __init__(self, items: int, resolution: Tuple[int, int] = DEFAULT_RESOLUTION,
+                 detections_per_image: int = DEFAULT_DETECTIONS, seed: int = DEFAULT_SEED,
+                 models: Optional[Sequence[str]] = None):
+        self.items = int(items)
+        self.width, self.height = (int(v) for v in resolution)
+        self.detections_per_image = int(detections_per_image)
+        self.seed = int(seed)
+        self.models = list(models or DEFECT_INFO)
+
+    def _rng(self, index: int, stream: int) -> np.random.Generator:
+        return np.random.default_rng([self.seed, index, stream])
+
+    def name(self, index: int) -> str:
+        return f"synthetic_{self.seed}_{index:06d}.jpg"
+
+    def geo(self, index: int) -> Dict:
+        row, col = divmod(index, GRID_ROW)
+        if row % 2:
+            col = GRID_ROW - 1 - col
+        rng = self._rng(index, _LAYOUT)
+        return {
+            'lat': round(MISSION_ORIGIN[0] + row * GRID_STEP_DEG, 7),
+            'lon': round(MISSION_ORIGIN[1] + col * GRID_STEP_DEG, 7),
+            'altitude': round(40.0 + rng.normal(0.0, 0.5), 2),
+            'timestamp': (MISSION_START + index * SHOT_INTERVAL).isoformat(),
+        }
+
+    def detections(self, index: int) -> List[Dict]:
+        """Ground truth for one image, in that image's pixel coordinates"""
+        rng = self._rng(index, _LAYOUT)
+        rng.normal()  # the altitude draw in geo()
+        detections = []
+        for _ in range(self.detections_per_image):
+            model = self.models[rng.integers(len(self.models))]
+            bw = max(8, int(self.width * rng.uniform(0.04, 0.12)))
+            bh = max(8, int(self.height * rng.uniform(0.04, 0.12)))
+            x1 = int(rng.integers(0, max(1, self.width - bw)))
+            y1 = int(rng.integers(0, max(1, self.height - bh)))
+            confidence = round(float(rng.uniform(0.5, 0.99)), 3)
+            info = defect_info(model, confidence)
+            detections.append({
+                'model': model,
+                'defect_type': info['type'],
+                'confidence': confidence,
+                'bbox': [x1, y1, min(self.width, x1 + bw), min(self.height, y1 + bh)],
+                'severity': info['severity'],
+                'description': info['description'],
+            })
+        return detections
+
+    def image(self, index: int) -> np.ndarray:
+        """(H, W, 3) uint8: concrete-like background with every ground-truth defect painted in"""
+        rng = self._rng(index, _PIXELS)
+        h, w = self.height, self.width
+        # Low-frequency shading plus fine grain, kept well clear of the detectors' cues
+        coarse = rng.normal(128.0, 10.0, (h // 64 + 1, w // 64 + 1))
+        shading = np.kron(coarse, np.ones((64, 64)))[:h, :w]
+        grain = rng.integers(-6, 7, (h, w))
+        img = np.repeat(np.clip(shading + grain, 0, 255).astype(np.uint8)[:, :, None], 3, axis=2)
+        for det in self.detections(index):
+            PAINTERS[det['model']](img, det['bbox'], rng)
+        return img
+
+    def jpeg(self, index: int, quality: int = 90) -> bytes:
+        """The image as a JPEG carrying GPS, altitude and capture time in EXIF, like a drone photo"""
+        geo = self.geo(index)
+        exif = Image.Exif()
+        exif[TAG_MAKE] = "FLYSCOPE"
+        exif[TAG_MODEL] = "Synthetic Workload"
+        exif[TAG_DATETIME] = datetime.fromisoformat(geo['timestamp']).strftime('%Y:%m:%d %H:%M:%S')
+        gps = exif.get_ifd(TAG_GPS_IFD)
+        gps.update({
+            1: 'N' if geo['lat'] >= 0 else 'S', 2: _dms(abs(geo['lat'])),
+            3: 'E' if geo['lon'] >= 0 else 'W', 4: _dms(abs(geo['lon'])),
+            5: 0, 6: float(geo['altitude']),
+        })
+        buffer = io.BytesIO()
+        Image.fromarray(self.image(index)).save(buffer, format='JPEG', quality=quality, exif=exif)
+        return buffer.getvalue()
+
+    def pipeline_items(self) -> List[Dict]:
+        """Ingest pipeline items that encode each image only when the pipeline opens it"""
+        return [
+            {'name': self.name(i), 'mime': 'image/jpeg', 'open': lambda i=i: io.BytesIO(self.jpeg(i))}
+            for i in range(self.items)
+        ]
+
+    def write_files(self, directory: str, workers: int = os.cpu_count() or 1) -> int:
+        """Encode every image into a directory, as a dataset on disk; returns bytes written"""
+        os.makedirs(directory, exist_ok=True)
+
+        def write(index):
+            data = self.jpeg(index)
+            with open(os.path.join(directory, self.name(index)), 'wb') as fh:
+                fh.write(data)
+            return len(data)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return sum(pool.map(write, range(self.items)))
+
+    def results(self, file_infos: Optional[Sequence[Dict]] = None) -> List[Dict]:
+        """Analysis results holding the ground truth, for replaying mapping and reporting without the models
+
+        With file_infos (ingested items, in workload order) results point at the stored media.
+        """
+        results = []
+        for i in range(self.items):
+            info = file_infos[i] if file_infos else {}
+            results.append({
+                'file_name': info.get('name', self.name(i)),
+                'file_path': info.get('path', ''),
+                'sha256': info.get('sha256'),
+                'geo': self.geo(i),
+                'analysis_time': MISSION_START + i * SHOT_INTERVAL,
+                'detections': self.detections(i),
+            })
+        return results
+
+
+def replay(workload: SyntheticWorkload, stages: Sequence[str] = REPLAY_STAGES, workdir: Optional[str] = None,
+           settings: Optional[Dict] = None, on_stage: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Dict]:
+    """Run a workload through the chosen stages in pipeline order; returns per-stage items, seconds and rate
+
+    Ingest writes into the media store at FLYSCOPE_STORE_DIR, so point that at a scratch directory.
+    Mapping and reporting use the analysis results when analysis ran, otherwise the ground truth.
+    """
+    # Imported here so that generating a workload never opens the media store
+    from dataset_import import directory_items
+    from ingest_pipeline import IngestPipeline
+    from media_store import file_info_for
+    from analysis_runner import analyze_media
+    from reports import fault_locations, detections_csv, build_pdf_report
+    from detection_table import DetectionTable
+
+    unknown = set(stages) - set(REPLAY_STAGES)
+    if unknown:
+        raise ValueError(f"Unknown replay stage(s): {', '.join(sorted(unknown))}")
+    if ('generate' in stages or 'ingest' in stages) and not workdir:
+        raise ValueError("Generating or ingesting a workload needs a working directory")
+    if 'analysis' in stages and 'ingest' not in stages:
+        raise ValueError("Analysis replays ingested media; include the ingest stage")
+    report = {}
+    file_infos = None
+    results = None
+
+    def record(stage, items, started, **extra):
+        seconds = time.perf_counter() - started
+        report[stage] = {'items': items, 'seconds': seconds, 'items_per_s': items / max(seconds, 1e-9), **extra}
+        if on_stage:
+            on_stage(stage, report[stage])
+
+    if 'generate' in stages:
+        started = time.perf_counter()
+        written = workload.write_files(workdir)
+        record('generate', workload.items, started, megabytes=written / (1024 * 1024))
+
+    if 'ingest' in stages:
+        items = sorted(directory_items(workdir), key=lambda item: item['name'])
+        started = time.perf_counter()
+        IngestPipeline().run(items)
+        file_infos = [file_info_for(item['record'], item['name'], item['mime']) for item in items if 'error' not in item]
+        record('ingest', len(file_infos), started)
+
+    if 'analysis' in stages:
+        settings = dict(settings or {})
+        settings.setdefault('models', list(workload.models))
+        started = time.perf_counter()
+        results, stats = analyze_media(file_infos, settings)
+        record('analysis', len(results), started, engine=stats)
+
+    if results is None:
+        results = workload.results(file_infos)
+
+    if 'mapping' in stages or 'reporting' in stages:
+        started = time.perf_counter()
+        table = DetectionTable.from_results(results)
+        record(STAGE_TABULATE, len(table), started, files=table.n_files)
+
+    if 'mapping' in stages:
+        started = time.perf_counter()
+        locations, _ = fault_locations(table)
+        record('mapping', len(results), started, points=len(locations))
+
+    if 'reporting' in stages:
+        started = time.perf_counter()
+        csv = detections_csv(table)
+        pdf = build_pdf_report(table)
+        record('reporting', len(results), started, csv_bytes=len(csv), pdf_bytes=len(pdf))
+    return report
+
+
+def format_replay(report: Dict[str, Dict]) -> str:
+    lines = [f"{'stage':<10} {'items':>8} {'seconds':>9} {'items/s':>10}"]
+    for stage in REPLAY_STAGES[:3] + (STAGE_TABULATE,) + REPLAY_STAGES[3:]:
+        if stage in report:
+            row = report[stage]
+            lines.append(f"{stage:<10} {row['items']:>8} {row['seconds']:>9.2f} {row['items_per_s']:>10.1f}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay a seeded synthetic workload through the FLYSCOPE pipeline")
+    parser.add_argument('--items', type=int, nargs='+', default=list(BENCHMARK_SIZES))
+    parser.add_argument('--resolution', default=f"{DEFAULT_RESOLUTION[0]}x{DEFAULT_RESOLUTION[1]}", help="WIDTHxHEIGHT")
+    parser.add_argument('--detections', type=int, default=DEFAULT_DETECTIONS, help="ground-truth detections per image")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--stages', default=','.join(REPLAY_STAGES), help="comma-separated subset of " + ','.join(REPLAY_STAGES))
+    parser.add_argument('--workdir', default=None,
+                        help="where generated images and the scratch media store go (default: a new temporary directory)")
+    args = parser.parse_args(argv)
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix='flyscope-workload-')
+    # Ingest writes into the media store; keep it out of the real one. replay() imports the
+    # store modules, so this is set before any of them reads it.
+    os.environ.setdefault('FLYSCOPE_STORE_DIR', os.path.join(args.workdir, 'store'))
+    print(f"Working directory {args.workdir}, media store {os.environ['FLYSCOPE_STORE_DIR']}")
+    width, height = (int(v) for v in args.resolution.lower().split('x'))
+    stages = [s for s in args.stages.split(',') if s]
+    for n in args.items:
+        workload = SyntheticWorkload(n, (width, height), args.detections, args.seed)
+        workdir = os.path.join(args.workdir, f"{n}")
+        print(f"\n{n} item(s) at {width}x{height}, {args.detections} detection(s) each, seed {args.seed}")
+        print(format_replay(replay(workload, stages, workdir)))
+
+
+# Streamlit helpers
+
+def ingest_workload(workload: SyntheticWorkload) -> int:
+    """Ingest a synthetic workload into this session's media, with the usual per-stage progress"""
+    from ingest_pipeline import run_ingest_with_progress
+    from media_store import add_to_session
+
+    added = 0
+    for item in run_ingest_with_progress(workload.pipeline_items()):
+        if 'error' not in item and add_to_session(item['record'], item['name'], item['mime']):
+            added += 1
+    return added
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])